@@ -0,0 +1,221 @@
+"""
+Offline benchmarks of the scraping, scoring and serialization hot paths.
+
+Each benchmark is run on synthetic tweets (see synthetic.py) at every requested size: it is timed once and then run
+again under tracemalloc to measure its peak memory usage. Results are written as JSON, and can be compared with
+the results of another commit using --compare.
+
+Usage:
+    python benchmarks/run.py --sizes 1000 100000 1000000 --output benchmark.json
+    python benchmarks/run.py --sizes 1000 100000 --compare benchmark.json --output new.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from synthetic import GENERATORS  # noqa: E402
+
+from bsi_sentiment import __version__  # noqa: E402
+from bsi_sentiment.analyzers import ANALYZERS  # noqa: E402
+from bsi_sentiment.dedup import Deduplicator  # noqa: E402
+from bsi_sentiment.pipeline import iter_csv  # noqa: E402
+from bsi_sentiment.preprocess import TextNormalizer, normalize_tweets  # noqa: E402
+from bsi_sentiment.ratelimit import RateLimitScheduler  # noqa: E402
+from bsi_sentiment.replay import Replay, write_fixture  # noqa: E402
+from bsi_sentiment.twitter import NLPTweetList, search_tweets_sn, search_tweets_tweepy, sn_criteria, tweepy_query  # noqa: E402
+
+
+def _tweets(size, backend):
+    return NLPTweetList(GENERATORS[backend](size), quiet=True)
+
+
+def bench_construct(size, backend, workdir):
+    raw = list(GENERATORS[backend](size))
+    return lambda: NLPTweetList(raw, quiet=True)
+
+
+def bench_analyze(method):
+    def bench(size, backend, workdir):
+        tweets = _tweets(size, backend)
+        _warm_up(tweets, method)
+        return lambda: tweets.get_sentiment(method=method, quiet=True)
+    return bench
+
+
+def bench_normalize(**rules):
+    def bench(size, backend, workdir):
+        tweets = _tweets(size, backend)
+        normalizer = TextNormalizer(**rules)
+        return lambda: normalize_tweets(tweets.tweets, normalizer)
+    return bench
+
+
+def bench_dedup(dedup):
+    def bench(size, backend, workdir):
+        tweets = _tweets(size, backend)
+        # viral topic: each text is posted 4 times, half of the copies with an extra word
+        for i, tweet in enumerate(tweets):
+            tweet.text = tweets[i // 4].text + (" lol" if i % 2 else "")
+        _warm_up(tweets, 'vader')
+        if dedup is None:
+            return lambda: tweets.get_sentiment(method='vader', quiet=True)
+        return lambda: tweets.get_sentiment(method='vader', quiet=True, dedup=Deduplicator(near=dedup == 'near'))
+    return bench
+
+
+def _warm_up(tweets, method):
+    # create the analyzer engine (and e.g. train the Naive Bayes classifier) outside of the timed section
+    NLPTweetList(tweets[:1], quiet=True).get_sentiment(method=method, quiet=True)
+
+
+def bench_to_csv(suffix):
+    def bench(size, backend, workdir):
+        tweets = _tweets(size, backend)
+        return lambda: tweets.to_csv(workdir / f'to_csv{suffix}', quiet=True)
+    return bench
+
+
+def bench_from_csv(size, backend, workdir):
+    path = workdir / 'from_csv.csv'
+    _tweets(size, backend).to_csv(path, quiet=True)
+    return lambda: NLPTweetList.from_csv(path)
+
+
+def bench_iter_csv(size, backend, workdir):
+    # streaming read of the columns needed to score the tweets again, in bounded memory
+    path = workdir / 'iter_csv.csv'
+    _tweets(size, backend).to_csv(path, quiet=True)
+    return lambda: sum(len(batch) for batch in iter_csv(path, columns=['id', 'text']))
+
+
+def bench_search(size, backend, workdir):
+    # whole search, from the raw pages of Twitter's responses (replayed without delay) to an NLPTweetList
+    path = workdir / f'search_{backend}_{size}.jsonl.gz'
+    path.unlink(missing_ok=True)
+    if backend == 'sn':
+        args = {'since': '2020-08-01', 'until': '2020-08-02'}
+        write_fixture(path, GENERATORS[backend](size), backend, sn_criteria('benchmark', **args))
+        replay = Replay(path)
+        return lambda: search_tweets_sn('benchmark', scraper=replay.sn_scraper, quiet=True, **args)
+    write_fixture(path, GENERATORS[backend](size), backend, tweepy_query('benchmark'))
+    replay = Replay(path)
+    return lambda: search_tweets_tweepy('benchmark', max_tweets=size, quiet=True,
+                                        scheduler=RateLimitScheduler([replay.tweepy_api()], quiet=True))
+
+
+BENCHMARKS = {
+    'search': bench_search,
+    'construct': bench_construct,
+    'to_csv': bench_to_csv('.csv'),
+    'to_csv:gzip': bench_to_csv('.csv.gz'),
+    'to_csv:zstd': bench_to_csv('.csv.zst'),
+    'from_csv': bench_from_csv,
+    'iter_csv': bench_iter_csv,
+    'normalize': bench_normalize(),
+    'normalize:all': bench_normalize(url_token='URL', emoji='name', fold_whitespace=True),
+    'viral:vader': bench_dedup(None),
+    'viral:vader:exact': bench_dedup('exact'),
+    'viral:vader:near': bench_dedup('near'),
+}
+BENCHMARKS.update({f'analyze:{method}': bench_analyze(method) for method in ANALYZERS})
+
+
+def measure(fn, memory=True):
+    """
+    Time fn() and, if memory is True, measure its peak memory usage in a second run.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the throughput of each benchmark relative to a previous run, flagging slowdowns beyond threshold.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r['benchmark'], r['backend'], r['size']): r for r in json.load(f)['results']}
+    regressions = 0
+    for r in results:
+        old = baseline.get((r['benchmark'], r['backend'], r['size']))
+        if old is None or not old.get('tweets_per_sec') or not r.get('tweets_per_sec'):
+            continue
+        ratio = r['tweets_per_sec'] / old['tweets_per_sec']
+        flag = ''
+        if ratio < 1 - threshold:
+            flag = '  <-- regression'
+            regressions += 1
+        print(f"{r['benchmark']:>24} {r['backend']:>7} {r['size']:>9}: {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for bsi_sentiment.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000], help="Numbers of tweets. Default is 1000 100000 1000000.")
+    parser.add_argument("--backends", nargs="+", default=list(GENERATORS), choices=list(GENERATORS), help="Backends whose tweets are generated. Default is all.")
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS), metavar="BENCHMARK", help=f"Benchmarks to run, among {list(BENCHMARKS)}. Default is all.")
+    parser.add_argument("--no_memory", action="store_true", default=False, help="Do not measure peak memory usage, which requires running each benchmark twice.")
+    parser.add_argument("--output", type=str, default="benchmark.json", help="Output JSON file. Default is ./benchmark.json.")
+    parser.add_argument("--compare", type=str, metavar="BASELINE", help="JSON file written by a previous run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as a regression by --compare. Default is 0.1.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            for backend in args.backends:
+                for name in args.benchmarks:
+                    result = {'benchmark': name, 'backend': backend, 'size': size}
+                    try:
+                        seconds, peak = measure(BENCHMARKS[name](size, backend, Path(workdir)), memory=not args.no_memory)
+                    except Exception as e:  # e.g. missing NLTK corpora, recorded rather than aborting the whole run
+                        result['error'] = f"{type(e).__name__}: {str(e).strip()}".split('\n')[0]
+                    else:
+                        result.update({'seconds': seconds, 'tweets_per_sec': size / seconds if seconds else None,
+                                       'peak_memory_bytes': peak})
+                    results.append(result)
+                    print(json.dumps(result), flush=True)
+
+    report = {
+        'commit': git_commit(),
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.compare is not None:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
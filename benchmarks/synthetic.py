@@ -0,0 +1,74 @@
+"""
+Synthetic tweet generator for offline benchmarks.
+
+Tweets are built as real sntwitter.Tweet and tweepy.models.Status objects, so that NLPTweet handles them exactly as
+it handles search results, but their content is random (with a fixed seed) and no network access is needed.
+"""
+import datetime
+import random
+
+POSITIVE = ["good", "great", "love", "happy", "excellent", "amazing", "wonderful", "best", "nice", "win"]
+NEGATIVE = ["bad", "terrible", "hate", "sad", "awful", "worst", "horrible", "angry", "fail", "lose"]
+NEUTRAL = ["the", "a", "today", "election", "vote", "people", "city", "news", "market", "game", "team", "new",
+           "time", "about", "what", "is", "was", "not", "very", "really", "but", "and", "so", "just", "!", "?"]
+START = datetime.datetime(2020, 8, 1, tzinfo=datetime.timezone.utc)
+
+
+def random_text(rng):
+    words = rng.choices(NEUTRAL, k=rng.randint(5, 25)) + rng.choices(POSITIVE + NEGATIVE, k=rng.randint(0, 4))
+    rng.shuffle(words)
+    if rng.random() < 0.3:
+        words.insert(0, f"@user{rng.randint(0, 9999)}")
+    if rng.random() < 0.3:
+        words.append(f"#{rng.choice(NEUTRAL + POSITIVE)}")
+    if rng.random() < 0.2:
+        words.append(f"https://t.co/{rng.randint(0, 10 ** 8):x}")
+    if rng.random() < 0.1:
+        words.insert(0, "RT")
+    return ' '.join(words)
+
+
+def sn_tweets(n, seed=0):
+    """
+    Generate n sntwitter.Tweet objects, from the newest to the oldest.
+    """
+    import snscrape.modules.twitter as sntwitter
+
+    rng = random.Random(seed)
+    for i in range(n, 0, -1):
+        text = random_text(rng)
+        username = f"user{rng.randint(0, 9999)}"
+        yield sntwitter.Tweet(url=f"https://twitter.com/{username}/status/{i}",
+                              date=START + datetime.timedelta(seconds=i),
+                              content=text, renderedContent=text, id=i,
+                              user=sntwitter.User(username=username, id=i),
+                              replyCount=0, retweetCount=0, likeCount=0, quoteCount=0,
+                              conversationId=i, lang="en", source=None)
+
+
+def tweepy_tweets(n, seed=0):
+    """
+    Generate n tweepy.models.Status objects, from the newest to the oldest.
+    """
+    import tweepy as tw
+
+    rng = random.Random(seed)
+    for i in range(n, 0, -1):
+        text = random_text(rng)
+        created_at = START + datetime.timedelta(seconds=i)
+        yield tw.models.Status.parse(None, {
+            'id': i,
+            'id_str': str(i),
+            'full_text': text,
+            'user': {'screen_name': f"user{rng.randint(0, 9999)}"},
+            'in_reply_to_screen_name': None,
+            'created_at': created_at.strftime('%a %b %d %H:%M:%S +0000 %Y'),
+            'retweet_count': rng.randint(0, 100),
+            'favorite_count': rng.randint(0, 100),
+            'entities': {'user_mentions': [{'screen_name': word[1:]} for word in text.split() if word.startswith('@')],
+                         'hashtags': [{'text': word[1:]} for word in text.split() if word.startswith('#')]},
+            'geo': None,
+        })
+
+
+GENERATORS = {'sn': sn_tweets, 'tweepy': tweepy_tweets}
@@ -0,0 +1,270 @@
+"""
+Streaming aggregation of scored tweets.
+
+An Aggregator computes summary statistics of a metric (e.g. polarity) per time bucket, user or hashtag in a single
+pass over the tweets, without keeping them in memory: each group only stores its count, mean and sum of squared
+deviations (updated with Welford's algorithm, which is numerically stable), its extrema and a histogram of the
+values, from which quantiles are estimated. Tweets can come from an NLPTweetList, from the batches of a stream or
+from a .csv or .parquet file written by the other commands.
+"""
+import csv
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Union
+
+from tqdm import tqdm
+
+from .stats import record
+from .utils import check_path
+
+BY_CHOICES = ('hour', 'day', 'month', 'user', 'hashtag')
+_HASHTAG_REGEX = re.compile(r'#(\w+)')
+
+
+class RunningStats:
+    """
+    Count, mean, variance, extrema and approximate quantiles of a stream of values, in constant memory.
+
+    Quantiles are estimated from a histogram of equal bins over value_range, interpolating linearly within bins, so
+    their error is at most the width of a bin (0.01 by default). Quantiles are not estimated (None) once a value
+    outside of value_range has been added, since the histogram cannot place it.
+
+    Parameters
+    ----------
+    bins (int): number of bins of the histogram. Default is 200.
+    value_range (Tuple[float, float]): range of the histogram. Default is (-1, 1), the range of polarity.
+    """
+    __slots__ = ('count', 'mean', '_m2', 'min', 'max', '_histogram', '_lo', '_hi', '_width', '_bins', 'n_outside')
+
+    def __init__(self, bins=200, value_range=(-1.0, 1.0)):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        # only non-empty bins are stored
+        self._histogram = Counter()
+        self._lo, self._hi = value_range
+        # number of values outside of value_range, which are not counted in the histogram
+        self.n_outside = 0
+        self._width = (value_range[1] - value_range[0]) / bins
+        self._bins = bins
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if not self._lo <= value <= self._hi:
+            self.n_outside += 1
+            return
+        self._histogram[min(int((value - self._lo) // self._width), self._bins - 1)] += 1
+
+    @property
+    def variance(self):
+        """
+        Sample variance, or None if there are less than 2 values.
+        """
+        return self._m2 / (self.count - 1) if self.count > 1 else None
+
+    def quantile(self, q: float):
+        """
+        Approximate q-quantile, for q in [0, 1], or None if there are no values or some are outside of value_range.
+        """
+        if self.count == 0 or self.n_outside > 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i in sorted(self._histogram):
+            n = self._histogram[i]
+            if seen + n >= target:
+                value = self._lo + self._width * (i + (target - seen) / n)
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+
+def _to_float(value):
+    if value is None or value == '':
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+# fields read to group tweets, for each value of by
+_GROUP_FIELDS = {'hour': ('date', 'time'), 'day': ('date',), 'month': ('date',), 'user': ('username',),
+                 'hashtag': ('hashtags', 'text')}
+
+
+def _group_keys(tweet, by):
+    if by == 'day':
+        return (tweet.get('date'),)
+    if by == 'month':
+        date = tweet.get('date')
+        return (date[:7] if date else None,)
+    if by == 'hour':
+        date, time = tweet.get('date'), tweet.get('time')
+        return (f"{date} {time[:2]}:00" if date and time else None,)
+    if by == 'user':
+        return (tweet.get('username'),)
+    # hashtags are stored by Tweepy searches only, otherwise they are read from the text
+    hashtags = tweet.get('hashtags')
+    hashtags = hashtags.split() if hashtags else _HASHTAG_REGEX.findall(tweet.get('text') or '')
+    return tuple({hashtag.lower() for hashtag in hashtags})
+
+
+class Aggregator:
+    """
+    Summary statistics of a metric per group of tweets, computed in a single streaming pass.
+
+    Parameters
+    ----------
+    by (str): how tweets are grouped, among 'hour' and 'day' (UTC, from the 'date' and 'time' fields), 'month', 'user' and 'hashtag' (a tweet counts once for each of its distinct hashtags, lowercased). Default is 'day'.
+    metric (str): field whose statistics are computed, e.g. 'polarity', 'subjectivity' or 'vader_polarity'. Default is 'polarity'.
+    quantiles (Tuple[float]): quantiles reported for each group. Default is (0.25, 0.5, 0.75).
+    bins (int), value_range (Tuple[float, float]): histogram used to estimate quantiles, see RunningStats. The quantiles of a group with values outside of value_range are None.
+
+    Attributes
+    ----------
+    n_tweets (int): number of tweets added.
+    n_skipped (int): number of tweets that were not counted because their metric or group is missing (e.g. by='hour' on files written before the 'time' field was introduced).
+    n_outside (int): number of values outside of value_range, whose groups have no quantiles.
+    """
+    def __init__(self, by='day', metric='polarity', quantiles=(0.25, 0.5, 0.75), bins=200, value_range=(-1.0, 1.0)):
+        if by not in BY_CHOICES:
+            raise ValueError(f"by must be one of {list(BY_CHOICES)}, got '{by}'")
+        if any(not 0 <= q <= 1 for q in quantiles):
+            raise ValueError(f"quantiles must be between 0 and 1, got {list(quantiles)}")
+        if not value_range[0] < value_range[1]:
+            raise ValueError(f"value_range must be an increasing pair of values, got {list(value_range)}")
+        self.by = by
+        self.metric = metric
+        self.quantiles = tuple(quantiles)
+        self.bins = bins
+        self.value_range = value_range
+        self.n_tweets = 0
+        self.n_skipped = 0
+        self._groups: Dict[str, RunningStats] = dict()
+
+    def add(self, tweets: Iterable):
+        """
+        Add tweets to the statistics.
+
+        Parameters
+        ----------
+        tweets (Iterable[Union[NLPTweet, dict]]): tweets, or rows of a .csv file as dicts of strings.
+        """
+        groups = self._groups
+        for tweet in tweets:
+            self.n_tweets += 1
+            value = _to_float(tweet.get(self.metric))
+            keys = _group_keys(tweet, self.by)
+            if value is None or not keys or keys[0] is None:
+                self.n_skipped += 1
+                continue
+            for key in keys:
+                stats = groups.get(key)
+                if stats is None:
+                    stats = groups[key] = RunningStats(self.bins, self.value_range)
+                stats.add(value)
+        return self
+
+    @property
+    def n_outside(self) -> int:
+        return sum(stats.n_outside for stats in self._groups.values())
+
+    @property
+    def columns(self) -> List[str]:
+        return [self.by, 'count', 'mean', 'std', 'min', 'max'] + [f"q{q * 100:g}" for q in self.quantiles]
+
+    def results(self) -> Iterator[dict]:
+        """
+        Statistics of each group, sorted by group.
+
+        Yields
+        ------
+        row (dict): values of self.columns for a group. std is None for groups of a single tweet.
+        """
+        for key in sorted(self._groups):
+            stats = self._groups[key]
+            variance = stats.variance
+            row = {self.by: key, 'count': stats.count, 'mean': stats.mean,
+                   'std': math.sqrt(variance) if variance is not None else None, 'min': stats.min, 'max': stats.max}
+            row.update((f"q{q * 100:g}", stats.quantile(q)) for q in self.quantiles)
+            yield row
+
+    def to_csv(self, path: Union[str, Path], delimiter=','):
+        """
+        Write the statistics of each group to a .csv file, one group per row.
+        """
+        path = check_path(path, '.csv')
+        columns = self.columns
+        with path.open('w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(columns)
+            for row in self.results():
+                writer.writerow([row[col] for col in columns])
+
+
+def iter_file(path: Union[str, Path], columns: List[str] = None, delimiter=',') -> Iterator:
+    """
+    Lazily read the tweets of a .csv or .parquet file, one at a time.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the file.
+    columns (List[str]): columns to read. Default is all columns.
+    delimiter (str): field delimiter of .csv files. Default is ','.
+
+    Yields
+    ------
+    tweet (NLPTweet)
+    """
+    if Path(path).suffix == '.parquet':
+        from .parquet import iter_parquet
+        batches = iter_parquet(path, columns=columns)
+    else:
+        from .pipeline import iter_csv
+        batches = iter_csv(path, columns=columns, delimiter=delimiter)
+    for batch in batches:
+        yield from batch
+
+
+def file_columns(path: Union[str, Path]) -> List[str]:
+    """
+    Columns of a .csv or .parquet file, read from its header or schema only.
+    """
+    if Path(path).suffix == '.parquet':
+        from .parquet import _import_pyarrow
+        return _import_pyarrow().parquet.read_schema(str(path)).names
+    from .csvfile import check_csv_path
+    from .pipeline import read_csv_header
+    path = check_csv_path(path)
+    if not path.is_file():
+        raise FileNotFoundError(f"path '{str(path)}'is not valid")
+    return read_csv_header(path) or []
+
+
+def aggregate_file(path: Union[str, Path], by='day', metric='polarity', quantiles=(0.25, 0.5, 0.75), quiet=False, **kwargs) -> Aggregator:
+    """
+    Aggregate the tweets of a .csv or .parquet file in a single streaming pass. See Aggregator for the arguments.
+
+    Returns
+    -------
+    aggregator (Aggregator): statistics of each group, e.g. to be written with Aggregator.to_csv.
+    """
+    aggregator = Aggregator(by=by, metric=metric, quantiles=quantiles, **kwargs)
+    # only read the columns that are needed, among those of the file, e.g. the text only to find hashtags
+    names = file_columns(path)
+    columns = [col for col in _GROUP_FIELDS[by] + (metric,) if col in names]
+    tweets = iter_file(path, columns=columns)
+    with record('aggregate') as stage:
+        aggregator.add(tqdm(tweets, desc="Aggregating tweets", disable=quiet))
+        stage.items = aggregator.n_tweets
+    return aggregator
@@ -0,0 +1,133 @@
+"""
+Asynchronous search API, for use in asyncio applications.
+
+Snscrape and Tweepy are blocking libraries, so each search runs in its own background thread and hands tweets over
+to the event loop through an asyncio.Queue holding at most buffer_size tweets. Tweets can therefore be consumed with
+'async for' as soon as they are downloaded, while the event loop stays free to serve other tasks, including other
+searches.
+
+The queue provides backpressure: once buffer_size tweets are waiting to be consumed, the search thread stops
+downloading until the consumer catches up. Closing the iterator (with its aclose method) or cancelling the task
+consuming it stops the search thread after the request in progress, if any.
+"""
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Iterable
+
+from .twitter import NLPTweet, iter_tweets_sn, iter_tweets_tweepy
+
+_DONE = object()
+
+
+class _Producer:
+    """
+    Background thread consuming a blocking iterator and handing its items over to the event loop through a queue,
+    taking one of buffer_size slots per item. The last item put is _DONE, or the exception raised by the iterator.
+    """
+    def __init__(self, make_iterator, buffer_size, loop):
+        self.make_iterator = make_iterator
+        self.loop = loop
+        self.results = asyncio.Queue()
+        # free places in the queue, taken by the thread and released by the event loop
+        self.slots = threading.Semaphore(buffer_size)
+        self.stop = threading.Event()
+
+    def put(self, item):
+        while not self.slots.acquire(timeout=0.1):
+            if self.stop.is_set():
+                return False
+        if self.stop.is_set():
+            return False
+        try:
+            self.loop.call_soon_threadsafe(self.results.put_nowait, item)
+        except RuntimeError:  # the event loop was closed
+            return False
+        return True
+
+    def _put_all(self):
+        iterator = iter(self.make_iterator())
+        try:
+            for item in iterator:
+                if not self.put(item):
+                    return
+        finally:
+            # stop e.g. the threads of a sharded search, from the thread running the generator
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        self.put(_DONE)
+
+    def run(self):
+        try:
+            self._put_all()
+        except Exception as e:
+            self.put(e)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+
+async def _iter_in_thread(make_iterator: Callable[[], Iterable], buffer_size: int) -> AsyncIterator:
+    """
+    Consume a blocking iterator in a background thread, yielding its items in the event loop.
+
+    Parameters
+    ----------
+    make_iterator (Callable[[], Iterable]): function returning the iterator, called in the background thread.
+    buffer_size (int): maximum number of items produced but not consumed yet.
+    """
+    if buffer_size < 1:
+        raise ValueError(f"buffer_size must be a positive integer, got {buffer_size}")
+    producer = _Producer(make_iterator, buffer_size, asyncio.get_running_loop())
+    producer.start()
+    try:
+        while True:
+            item = await producer.results.get()
+            producer.slots.release()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.stop.set()
+
+
+def asearch_tweets_sn(q, buffer_size=1000, **kwargs) -> AsyncIterator[NLPTweet]:
+    """
+    Search tweets using snscrape without blocking the event loop, yielding each result as soon as it is scraped.
+    Arguments are the same as iter_tweets_sn, plus:
+
+    buffer_size (int): maximum number of tweets scraped ahead of the consumer. Default is 1000.
+
+    Returns
+    -------
+    tweets (AsyncIterator[NLPTweet]): asynchronous iterator of the tweets found, to be consumed with 'async for'.
+
+    Example
+    -------
+    tweets = asearch_tweets_sn("us elections", max_tweets=100)
+    try:
+        async for tweet in tweets:
+            tweet.get_sentiment(method="vader")
+            print(tweet.date, tweet.polarity)
+    finally:
+        await tweets.aclose()
+    """
+    return _iter_in_thread(lambda: iter_tweets_sn(q, **kwargs), buffer_size)
+
+
+def asearch_tweets_tweepy(q, buffer_size=1000, **kwargs) -> AsyncIterator[NLPTweet]:
+    """
+    Search tweets using Tweepy without blocking the event loop, yielding each result as soon as it is downloaded.
+    Arguments are the same as iter_tweets_tweepy, plus:
+
+    buffer_size (int): maximum number of tweets downloaded ahead of the consumer. Default is 1000.
+
+    Waiting for rate limits to reset happens in the background thread, so it does not block the event loop either.
+
+    Returns
+    -------
+    tweets (AsyncIterator[NLPTweet]): asynchronous iterator of the tweets found, to be consumed with 'async for'.
+    """
+    return _iter_in_thread(lambda: iter_tweets_tweepy(q, **kwargs), buffer_size)
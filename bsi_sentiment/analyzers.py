@@ -0,0 +1,256 @@
+"""
+Sentiment analyzer engines.
+
+Each analysis method is implemented by an engine class registered under the name used by
+NLPTweet.get_sentiment (e.g. 'vader'). Engines are instantiated lazily, the first time they are requested
+through get_analyzer, and the same instance is then reused for every tweet, so that expensive setup
+(loading the VADER lexicon, loading the Naive Bayes model) is paid at most once per process.
+New methods can be added by subclassing Analyzer and decorating the class with register_analyzer.
+
+Several methods can be requested at once by passing a list of names instead of a single one: their engines are
+then combined into a CombinedAnalyzer, which scores each text with all of them and prefixes the name of each
+metric with the name of its method (e.g. 'vader_polarity' and 'textblob_pa_polarity'), so that they do not
+overwrite each other.
+"""
+from typing import Dict, List, Tuple
+
+
+ANALYZERS = dict()
+_instances = dict()
+
+
+def register_analyzer(name):
+    """
+    Class decorator registering an Analyzer subclass under 'name'.
+
+    Parameters
+    ----------
+    name (str): name of the analysis method, as accepted by NLPTweet.get_sentiment and the --analyzer option.
+    """
+    def decorator(cls):
+        cls.name = name
+        ANALYZERS[name] = cls
+        return cls
+    return decorator
+
+
+def method_key(method):
+    """
+    Normalize a method, i.e. either the name of an analysis method or a list of names, to a hashable value:
+    a name if a single method is given, or a tuple of distinct names otherwise.
+    """
+    if isinstance(method, str):
+        return method
+    names = tuple(dict.fromkeys(method))
+    if not names:
+        raise ValueError("at least one method is required")
+    return names[0] if len(names) == 1 else names
+
+
+def column_prefix(name):
+    """
+    Prefix of the metrics of method 'name' when several methods are combined, e.g. 'textblob_pa_' for 'textblob-pa'.
+    """
+    return name.replace('-', '_') + '_'
+
+
+def analyzer_columns(method) -> Tuple[str, ...]:
+    """
+    Names of the metrics computed by method(s), as in the columns attribute of their engine, without creating it.
+    """
+    method = method_key(method)
+    names = method if isinstance(method, tuple) else (method,)
+    for name in names:
+        if name not in ANALYZERS:
+            raise ValueError(
+                f"method must be one of {list(ANALYZERS)}, got '{name}'")
+    if isinstance(method, tuple):
+        return tuple(column_prefix(name) + col for name in method for col in ANALYZERS[name].columns)
+    return ANALYZERS[method].columns
+
+
+def get_analyzer(name):
+    """
+    Return the shared engine registered under 'name', creating it on first use.
+
+    Parameters
+    ----------
+    name (Union[str, List[str]]): name of the analysis method, or list of names of methods to combine.
+
+    Returns
+    -------
+    analyzer (Analyzer): engine implementing the method(s).
+    """
+    name = method_key(name)
+    if name not in _instances:
+        if isinstance(name, tuple):
+            _instances[name] = CombinedAnalyzer(name)
+        elif name in ANALYZERS:
+            _instances[name] = ANALYZERS[name]()
+        else:
+            raise ValueError(
+                f"method must be one of {list(ANALYZERS)}, got '{name}'")
+    return _instances[name]
+
+
+class Analyzer:
+    """
+    Base class for sentiment analyzer engines.
+
+    Attributes
+    ----------
+    name (str): name under which the engine is registered.
+    columns (Tuple[str]): names of the metrics returned by score, in output order.
+    package (str): distribution providing the underlying model, whose version determines the scores.
+    """
+    name = None
+    columns: Tuple[str, ...] = ()
+    package = None
+
+    @classmethod
+    def version(cls):
+        """
+        Version of the engine, used to invalidate cached scores when the underlying model changes.
+        """
+        from importlib import metadata
+
+        if cls.package is None:
+            return '0'
+        return f"{cls.package}-{metadata.version(cls.package)}"
+
+    def score(self, text: str) -> Dict[str, object]:
+        """
+        Compute the sentiment metrics of an already preprocessed text.
+
+        Parameters
+        ----------
+        text (str): text to analyze.
+
+        Returns
+        -------
+        scores (dict): mapping from each of self.columns to its value.
+        """
+        raise NotImplementedError
+
+    def score_batch(self, texts: List[str]) -> List[Dict[str, object]]:
+        """
+        Compute the sentiment metrics of a batch of already preprocessed texts. Engines that can score many texts
+        faster than one at a time override this method.
+
+        Parameters
+        ----------
+        texts (List[str]): texts to analyze.
+
+        Returns
+        -------
+        scores (List[dict]): scores of each text, as returned by score.
+        """
+        return [self.score(text) for text in texts]
+
+
+@register_analyzer('vader')
+class VaderAnalyzer(Analyzer):
+    """
+    Give a sentiment intensity score to sentences, according to VADER sentiment analysis tool.
+    """
+    columns = ('polarity', 'pos_w', 'neu_w', 'neg_w')
+    package = 'nltk'
+
+    def __init__(self):
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        self._analyzer = SentimentIntensityAnalyzer()
+        try:
+            from .vader import BatchVader
+        except ImportError:  # numpy is not installed
+            self._batch = None
+        else:
+            self._batch = BatchVader(self._analyzer)
+
+    @staticmethod
+    def _columns(scores):
+        return {'polarity': scores['compound'],
+                'pos_w': scores['pos'],
+                'neu_w': scores['neu'],
+                'neg_w': scores['neg']}
+
+    def score(self, text):
+        return self._columns(self._analyzer.polarity_scores(text))
+
+    def score_batch(self, texts):
+        if self._batch is None:
+            return super().score_batch(texts)
+        return [self._columns(scores) for scores in self._batch.polarity_scores(texts)]
+
+
+@register_analyzer('textblob-pa')
+class PatternAnalyzer(Analyzer):
+    """
+    Use PatternAnalyzer from textblob to compute 'polarity' (in range [-1.0, 1.0]) and 'subjectivity' (in range [0.0,1.0]).
+    """
+    columns = ('polarity', 'subjectivity')
+    package = 'textblob'
+
+    def __init__(self):
+        from textblob.sentiments import PatternAnalyzer
+        self._analyzer = PatternAnalyzer()
+
+    def score(self, text):
+        sentiment = self._analyzer.analyze(text)
+        return {'polarity': sentiment.polarity,
+                'subjectivity': sentiment.subjectivity}
+
+
+@register_analyzer('textblob-nb')
+class NaiveBayesAnalyzer(Analyzer):
+    """
+    Classify the sentiment as NaiveBayesAnalyzer from textblob does. Computes also 'p_pos' and 'p_neg', as probabilities.
+    The classifier is trained on the NLTK movie_reviews corpus once, and saved to a model file which is then loaded by
+    every process (see bsi_sentiment.nb).
+    """
+    columns = ('classification', 'p_pos', 'p_neg')
+    package = 'textblob'
+
+    def __init__(self):
+        from .nb import load_model, tokenize
+        self._model = load_model(quiet=True)
+        self._tokenize = tokenize
+
+    def score(self, text):
+        return self.score_batch([text])[0]
+
+    def score_batch(self, texts):
+        return [{'classification': classification, 'p_pos': probs['pos'], 'p_neg': probs['neg']}
+                for classification, probs in self._model.prob_classify_batch(map(self._tokenize, texts))]
+
+
+class CombinedAnalyzer(Analyzer):
+    """
+    Score texts with several engines at once, prefixing the name of each metric with the name of its method.
+
+    Parameters
+    ----------
+    names (Tuple[str]): names of the methods to combine.
+    """
+    def __init__(self, names):
+        self.analyzers = [get_analyzer(name) for name in names]
+        self.name = '+'.join(names)
+        self._prefixed = [[(col, column_prefix(analyzer.name) + col) for col in analyzer.columns]
+                          for analyzer in self.analyzers]
+        self.columns = tuple(prefixed for columns in self._prefixed for _, prefixed in columns)
+
+    def version(self):
+        return '+'.join(analyzer.version() for analyzer in self.analyzers)
+
+    def score(self, text):
+        scores = dict()
+        for analyzer, columns in zip(self.analyzers, self._prefixed):
+            analyzer_scores = analyzer.score(text)
+            scores.update((prefixed, analyzer_scores[col]) for col, prefixed in columns)
+        return scores
+
+    def score_batch(self, texts):
+        scores = [dict() for _ in texts]
+        for analyzer, columns in zip(self.analyzers, self._prefixed):
+            for text_scores, analyzer_scores in zip(scores, analyzer.score_batch(texts)):
+                text_scores.update((prefixed, analyzer_scores[col]) for col, prefixed in columns)
+        return scores
@@ -0,0 +1,130 @@
+"""
+Batch mode: many searches in a single run.
+
+Running each search in its own process means importing Snscrape/Tweepy and creating the analyzer engine (e.g.
+loading the VADER lexicon) again for every query. Here the engine is created once and shared by all searches, as
+is the process pool used to score tweets when workers > 1, while up to query_workers searches are downloaded at the
+same time. Results are written either to one file per search or to a single file with an additional 'query' column.
+"""
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from tqdm import tqdm
+
+from .analyzers import get_analyzer, method_key
+from .twitter import _init_worker, output_columns
+from .utils import load_nltk
+
+COMBINED_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst', '.parquet')
+
+
+def _search(name, validated_args, tweepy, method, workers, executor, cache, normalizer, dedup):
+    from .twitter import search_tweets_sn, search_tweets_tweepy
+
+    search = search_tweets_tweepy if tweepy else search_tweets_sn
+    tweets = search(**{**validated_args, 'quiet': True})
+    if method is not None and len(tweets) > 0:
+        tweets.get_sentiment(method=method, quiet=True, workers=workers, executor=executor, cache=cache,
+                             normalizer=normalizer, dedup=dedup)
+    return tweets
+
+
+def _write_combined(results, dest, columns, quiet):
+    def batches():
+        for name, tweets in results:
+            for tweet in tweets:
+                tweet['query'] = name
+            yield tweets.tweets
+
+    if Path(dest).suffix == '.parquet':
+        from .parquet import stream_to_parquet
+        return stream_to_parquet(batches(), dest, columns=columns, quiet=True)
+    from .pipeline import stream_to_csv
+    return stream_to_csv(batches(), dest, columns=columns, quiet=True)
+
+
+def _results(futures, pbar, n_tweets, errors, quiet):
+    """
+    Yield the name and tweets of each search that found tweets, as soon as it completes, recording the number of
+    tweets found by successful searches in n_tweets and the exceptions raised by failed ones in errors.
+    """
+    for future in as_completed(futures):
+        name = futures[future]
+        pbar.update()
+        try:
+            tweets = future.result()
+        except Exception as e:
+            errors[name] = e
+            if not quiet:
+                tqdm.write(f"Search '{name}' failed: {e}", file=sys.stderr)
+            continue
+        n_tweets[name] = len(tweets)
+        if len(tweets) > 0:
+            yield name, tweets
+
+
+def _write_results(results, dest, searches, method, dedup, quiet):
+    if dest.name.endswith(COMBINED_SUFFIXES):
+        # searches using different backends are written under the union of their columns
+        columns = output_columns({'tweepy' if tweepy else 'sn' for _, _, tweepy in searches}, method=method,
+                                 dedup=method is not None and dedup is not None, extra=('query',))
+        _write_combined(results, dest, columns, quiet)
+    else:
+        for name, tweets in results:
+            tweets.to_csv(dest / f"{name}.csv", quiet=True)
+
+
+def run_batch(searches: List[Tuple[str, dict, bool]], dest: Union[str, Path], method=None, workers=1, query_workers=4, cache=None, quiet=False, normalizer=None, dedup=None):
+    """
+    Run several searches in the same process, optionally analyzing the sentiment of the tweets found.
+
+    Parameters
+    ----------
+    searches (List[Tuple[str, dict, bool]]): name, validated arguments and whether to use Tweepy for each search, e.g. as returned by read_batch_config.
+    dest (Union[str, Path]): if it ends with '.csv' (possibly compressed, see bsi_sentiment.csvfile) or '.parquet', all tweets are written to this file with an additional 'query' column containing the name of their search. Otherwise, it is a directory where the tweets of each search are written to '<name>.csv'.
+    method (Union[str, List[str]]): method(s) used for sentiment analysis. Default is None, i.e. tweets are only downloaded.
+    workers (int): number of processes used to score tweets, shared by all searches. Default is 1, i.e. tweets are scored in the current process.
+    query_workers (int): maximum number of searches run at the same time. Default is 4.
+    cache (bsi_sentiment.cache.SentimentCache): cache of sentiment scores shared by all searches. Default is no cache.
+    quiet (bool): whether to disable the progress bar and the messages about failed searches. Default is False.
+    normalizer (bsi_sentiment.preprocess.TextNormalizer): rules used to normalize texts before analysis. Default is those of clean_text.
+    dedup (bsi_sentiment.dedup.Deduplicator): if given, duplicates are scored only once, including across searches. Default is to score every tweet.
+
+    Returns
+    -------
+    n_tweets (Dict[str, int]): number of tweets found by each successful search.
+    """
+    if query_workers < 1:
+        raise ValueError(f"query_workers must be a positive integer, got {query_workers}")
+    if not searches:
+        raise ValueError("no search to run")
+    names = [name for name, _, _ in searches]
+    if len(set(names)) != len(names):
+        raise ValueError("search names must be unique")
+    dest = Path(dest)
+    if not dest.name.endswith(COMBINED_SUFFIXES):
+        dest.mkdir(parents=True, exist_ok=True)
+    if method is not None:
+        method = method_key(method)
+        load_nltk(method, quiet=quiet)
+        get_analyzer(method)  # create the shared engine before the search threads start using it
+
+    n_tweets = dict()
+    errors = dict()
+    executor = None
+    if method is not None and workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(method,))
+    try:
+        with ThreadPoolExecutor(max_workers=query_workers) as threads, \
+                tqdm(total=len(searches), desc="Running searches  ", disable=quiet) as pbar:
+            futures = {threads.submit(_search, name, validated_args, tweepy, method, workers, executor, cache, normalizer, dedup): name
+                       for name, validated_args, tweepy in searches}
+            _write_results(_results(futures, pbar, n_tweets, errors, quiet), dest, searches, method, dedup, quiet)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if errors:
+        raise Exception(f"{len(errors)} of {len(searches)} searches failed: {', '.join(errors)}")
+    return n_tweets
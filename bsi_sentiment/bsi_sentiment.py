@@ -1,28 +1,293 @@
+from pathlib import Path
+
 from .parser import parser
-from .twitter import search_tweets_tweepy, search_tweets_sn
-from .utils import validate_args, read_config, write_config
+from .utils import CONFIG_SECTION, validate_args, read_batch_config, read_queries, write_config
 
+# Modules depending on Snscrape, Tweepy, NLTK or TextBlob are imported only by the commands that need them,
+# so that e.g. 'sentiment configure' and 'sentiment -h' start quickly.
 
-def main():
-    args = parser.parse_args()
+
+def make_normalizer(args):
+    """
+    Text normalizer corresponding to the --url_token, --emoji and --fold_whitespace options, or None if they have their default values.
+    """
+    if args.url_token is None and args.emoji == 'keep' and not args.fold_whitespace:
+        return None
+    from .preprocess import TextNormalizer
+    return TextNormalizer(url_token=args.url_token, emoji=args.emoji, fold_whitespace=args.fold_whitespace)
+
+
+def make_dedup(args):
+    """
+    Deduplicator corresponding to the --dedup and --dedup_similarity options, or None if --dedup is not given.
+    """
+    if args.dedup is None:
+        return None
+    from .dedup import Deduplicator
+    return Deduplicator(near=args.dedup == 'near', min_similarity=args.dedup_similarity)
+
+
+def make_source(args):
+    """
+    Recorder or Replay corresponding to the --record and --replay options, or None if neither is given.
+    """
+    if args.record is not None and args.replay is not None:
+        raise ValueError("--record and --replay cannot be used together")
+    if args.replay is not None:
+        from .replay import Replay
+        return Replay(args.replay, speed=args.replay_speed, latency=args.replay_latency,
+                      rate_limit=args.replay_rate_limit, error_rate=args.replay_error_rate)
+    if args.replay_speed is not None or args.replay_latency > 0 or args.replay_rate_limit is not None or args.replay_error_rate > 0:
+        raise ValueError("--replay_speed, --replay_latency, --replay_rate_limit and --replay_error_rate can only be used with --replay")
+    if args.record is not None:
+        from .replay import Recorder
+        return Recorder(args.record)
+    return None
+
+
+def with_source(searches, source, quiet=False):
+    """
+    Add the scraper factory (Snscrape) or rate-limit scheduler (Tweepy) of a Recorder or Replay to the arguments of each search.
+    """
+    from .ratelimit import RateLimitScheduler
+    from .replay import Replay
+
+    sourced = []
+    for name, validated_args, tweepy in searches:
+        if not tweepy:
+            validated_args = {**validated_args, 'scraper': source.sn_scraper}
+        elif isinstance(source, Replay):
+            validated_args = {**validated_args, 'scheduler': RateLimitScheduler([source.tweepy_api()], quiet=quiet, clock=source.clock, sleep=source.sleep)}
+        else:
+            from .twitter import _authenticate, read_credentials
+            apis = [source.tweepy_api(_authenticate(c)) for c in read_credentials(validated_args['credentials_path'])]
+            validated_args = {**validated_args, 'scheduler': RateLimitScheduler(apis, quiet=quiet)}
+        sourced.append((name, validated_args, tweepy))
+    return sourced
+
+
+def _open_progress(args, tweepy):
+    """
+    Checkpoint and index of the search, as requested by --checkpoint and --index, once checked that they can be used.
+    """
+    if args.checkpoint is None and args.index is None:
+        return None, None
+    if args.checkpoint is not None and args.index is not None:
+        raise ValueError("--index cannot be used together with --checkpoint")
+    option = '--checkpoint' if args.checkpoint is not None else '--index'
+    if tweepy:
+        raise ValueError(f"{option} can only be used with Snscrape")
+    if Path(args.dest).suffix == '.parquet':
+        raise ValueError(f"{option} can only be used with .csv output files")
+    if args.checkpoint is not None:
+        from .checkpoint import Checkpoint
+        return Checkpoint(args.checkpoint), None
+    from .index import TweetIndex
+    return None, TweetIndex(args.index)
+
+
+def _stream_batches(args, tweets, cache, dedup):
+    from .pipeline import batched, stream_sentiment
+
+    if args.command == 'analyze':
+        return stream_sentiment(tweets, method=args.analyzer, batch_size=args.batch_size, workers=args.jobs,
+                                quiet=args.quiet, cache=cache, normalizer=make_normalizer(args), dedup=dedup)
+    return batched(tweets, args.batch_size)
+
+
+def _write_stream(args, batches, columns, checkpoint, index):
+    if Path(args.dest).suffix == '.parquet':
+        from .parquet import stream_to_parquet
+        return stream_to_parquet(batches, args.dest, columns=columns, quiet=args.quiet, desc="Processing tweets ")
+    from .pipeline import stream_to_csv
+    return stream_to_csv(batches, args.dest, columns=columns, quiet=args.quiet, checkpoint=checkpoint,
+                         append=index is not None, index=index)
+
+
+def run_stream(args, validated_args, tweepy, cache=None, dedup=None):
+    from .twitter import iter_tweets_tweepy, iter_tweets_sn, output_columns
+
+    search = iter_tweets_tweepy if tweepy else iter_tweets_sn
+    # tweets are written as they arrive, so the columns of the output file are declared up front
+    columns = output_columns('tweepy' if tweepy else 'sn', method=args.analyzer if args.command == 'analyze' else None,
+                             dedup=dedup is not None)
+    if not tweepy:
+        validated_args.pop('quiet', None)
+    checkpoint, index = _open_progress(args, tweepy)
+    if checkpoint is not None:
+        validated_args['checkpoint'] = checkpoint
+    if index is not None:
+        validated_args['index'] = index
+    try:
+        batches = _stream_batches(args, search(**validated_args), cache, dedup)
+        n_tweets = _write_stream(args, batches, columns, checkpoint, index)
+    finally:
+        if index is not None:
+            index.close()
+    if index is not None:
+        if not args.quiet:
+            print(f"Appended {n_tweets} new tweets to {args.dest}")
+    elif n_tweets == 0 and (checkpoint is None or checkpoint.n_tweets == 0):
+        raise Exception("The search returned no tweets. Please double check your query.")
+
+
+def run(args, validated_args, tweepy, cache=None, dedup=None):
+    from .twitter import search_tweets_tweepy, search_tweets_sn
+
+    search = search_tweets_tweepy if tweepy else search_tweets_sn
+    tweets = search(**validated_args)
+    if len(tweets) == 0:
+        raise Exception("The search returned no tweets. Please double check your query.")
+    if args.command == 'analyze':
+        tweets.get_sentiment(method=args.analyzer, quiet=args.quiet, workers=args.jobs, cache=cache,
+                             normalizer=make_normalizer(args), dedup=dedup)
+    if Path(args.dest).suffix == '.parquet':
+        tweets.to_parquet(args.dest, quiet=args.quiet)
+    else:
+        tweets.to_csv(args.dest, quiet=args.quiet)
+
+
+def run_aggregate(args):
+    from .aggregate import aggregate_file
+
+    if args.input is None:
+        raise ValueError("--input is required by the 'aggregate' command")
+    if args.dest is None:
+        args.dest = './aggregate.csv'
+    aggregator = aggregate_file(args.input, by=args.by, metric=args.metric, quantiles=args.quantiles, quiet=args.quiet,
+                                value_range=tuple(args.range))
+    if aggregator.n_skipped == aggregator.n_tweets:
+        raise Exception(f"No tweet of {args.input} has both a '{args.metric}' value and a {args.by}.")
+    aggregator.to_csv(args.dest)
+    if not args.quiet and aggregator.n_skipped > 0:
+        print(f"Skipped {aggregator.n_skipped} of {aggregator.n_tweets} tweets without a '{args.metric}' value or a {args.by}.")
+    if not args.quiet and aggregator.n_outside > 0:
+        print(f"{aggregator.n_outside} '{args.metric}' values are outside of --range {args.range[0]:g} {args.range[1]:g}, "
+              f"the quantiles of their groups were left empty.")
+
+
+def check_input_args(args):
+    """
+    Check that the options given together with --input can be used to score an existing file.
+    """
+    if args.command != 'analyze':
+        raise ValueError(f"--input cannot be used with the '{args.command}' command")
+    if args.config is not None or args.queries is not None or args.checkpoint is not None or args.index is not None:
+        raise ValueError("--input cannot be used together with --config, --queries, --checkpoint or --index")
+    if args.record is not None or args.replay is not None:
+        raise ValueError("--input cannot be used together with --record or --replay")
+
+
+def run_analyze_file(args, cache=None, dedup=None):
+    from .pipeline import analyze_file
+
+    n_tweets = analyze_file(args.input, args.dest, method=args.analyzer, batch_size=args.batch_size,
+                            workers=args.jobs, quiet=args.quiet, cache=cache, normalizer=make_normalizer(args),
+                            dedup=dedup)
+    if n_tweets == 0:
+        raise Exception(f"{args.input} contains no tweets.")
+
+
+def read_searches(args, validated_args):
+    """
+    Searches to run: the one given on the command line, or those of --config and --queries.
+
+    Returns
+    -------
+    searches (List[Tuple[str, dict, bool]]): name, validated arguments and whether to use Tweepy for each search.
+    batch (bool): whether several searches are run, see bsi_sentiment.batch.
+    """
+    searches = [(CONFIG_SECTION, validated_args, args.tweepy)]
+    if args.config is not None:
+        searches = read_batch_config(args.config)
+    if args.queries is not None:
+        searches = [(name if len(searches) == 1 else f"{section}_{name}", query_args, tweepy)
+                    for section, section_args, tweepy in searches
+                    for name, query_args in read_queries(args.queries, section_args)]
+    batch = args.queries is not None or searches[0][0] != CONFIG_SECTION
+    if batch and (args.stream or args.checkpoint is not None or args.index is not None):
+        raise ValueError("--stream, --checkpoint and --index cannot be used when running several queries")
+    return searches, batch
+
+
+def open_resources(args):
+    """
+    Objects shared by all the searches of a command: the sentiment cache and the deduplicator, used only by the
+    'analyze' command, and the recorder or replay of --record and --replay. See close_resources.
+    """
+    cache = None
+    dedup = None
+    if args.command == 'analyze':
+        if args.cache_dir is not None:
+            from .cache import SentimentCache
+            cache = SentimentCache(args.cache_dir, max_entries=args.cache_size)
+        dedup = make_dedup(args)
+    return cache, dedup, make_source(args)
+
+
+def close_resources(args, cache, dedup, source):
+    if source is not None and hasattr(source, 'close'):
+        source.close()
+    if dedup is not None and not args.quiet:
+        print("Deduplication: {tweets} tweets, {groups} distinct texts ({duplicate_rate:.1%} duplicates)".format(**dedup.stats()))
+    if cache is not None:
+        cache.close()
+        if not args.quiet:
+            print("Sentiment cache: {hits} hits, {misses} misses ({hit_rate:.1%} hit rate)".format(**cache.stats()))
+
+
+def run_searches(args, searches, batch, cache=None, dedup=None):
+    if args.input is not None:
+        run_analyze_file(args, cache=cache, dedup=dedup)
+    elif batch:
+        from .batch import run_batch
+        run_batch(searches, args.dest, method=args.analyzer if args.command == 'analyze' else None,
+                  workers=args.jobs, query_workers=args.query_workers, cache=cache, quiet=args.quiet,
+                  normalizer=make_normalizer(args), dedup=dedup)
+    elif args.stream or args.checkpoint is not None or args.index is not None:
+        run_stream(args, *searches[0][1:], cache=cache, dedup=dedup)
+    else:
+        run(args, *searches[0][1:], cache=cache, dedup=dedup)
+
+
+def run_command(args):
     validated_args = validate_args(args)
 
     if args.command == "configure":
         write_config(args, validated_args)
-    else:
-        if args.config is not None:
-            validated_args, tweepy = read_config(args.config)
-            search = search_tweets_tweepy if tweepy else search_tweets_sn
-        else:
-            search = search_tweets_tweepy if args.tweepy else search_tweets_sn
-        tweets = search(**validated_args)
-        if len(tweets) == 0:
-            raise Exception("The search returned no tweets. Please double check your query.")
-        if args.command == 'analyze':
-            tweets.get_sentiment(method=args.analyzer, quiet=args.quiet)
-        if args.dest is None:
-            args.dest = './result.csv'
-        tweets.to_csv(args.dest, quiet=args.quiet)
+        return
+    if args.command == "aggregate":
+        run_aggregate(args)
+        return
+    if args.input is not None:
+        check_input_args(args)
+    searches, batch = read_searches(args, validated_args)
+    if args.dest is None:
+        args.dest = './result.csv'
+    cache, dedup, source = open_resources(args)
+    try:
+        if source is not None:
+            searches = with_source(searches, source, quiet=args.quiet)
+        run_searches(args, searches, batch, cache=cache, dedup=dedup)
+    finally:
+        close_resources(args, cache, dedup, source)
+
+
+def main():
+    args = parser.parse_args()
+    if args.stats_json is None:
+        run_command(args)
+        return
+    from .stats import PipelineStats
+    error = None
+    with PipelineStats() as stats:
+        try:
+            run_command(args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stats.to_json(args.stats_json, command=args.command, dest=args.dest, error=error)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,160 @@
+"""
+Persistent cache of sentiment scores.
+
+Scores are stored in a SQLite database, keyed by a hash of the normalized text of a tweet (see preprocess.py),
+the analysis method and its version, so that tweets downloaded again by overlapping searches, as well as
+copy-pasted texts, are scored only once. When the cache grows beyond max_entries, the least recently used
+entries are evicted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Union
+
+from .analyzers import get_analyzer
+from .preprocess import normalize_tweets
+from .twitter import NLPTweet
+
+# SQLite limits the number of variables in a statement
+_SQL_BATCH = 500
+
+
+def default_cache_dir():
+    """
+    Default location of the cache, i.e. $XDG_CACHE_HOME/bsi_sentiment or ~/.cache/bsi_sentiment.
+    """
+    return Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'bsi_sentiment'
+
+
+class SentimentCache:
+    """
+    On-disk cache of sentiment scores with LRU eviction.
+
+    Parameters
+    ----------
+    cache_dir (Union[str, Path]): directory containing the cache database. It is created if it does not exist. Default is default_cache_dir().
+    max_entries (int): maximum number of scores kept in the cache. Entries added by other processes using the same cache_dir are only counted when the cache is opened again. Default is 1000000.
+
+    Attributes
+    ----------
+    hits (int): number of tweets whose scores were found in the cache.
+    misses (int): number of tweets whose scores were not found in the cache.
+    """
+    def __init__(self, cache_dir: Union[str, Path] = None, max_entries=1000000):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be a positive integer, got {max_entries}")
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_dir / 'sentiment.sqlite'), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, scores TEXT NOT NULL, last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+        # number of entries, counted once and then kept up to date, so that storing scores never scans the table
+        self._size = self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    @staticmethod
+    def _key_prefix(method):
+        analyzer = get_analyzer(method)
+        return f"{analyzer.name}\0{analyzer.version()}\0"
+
+    @staticmethod
+    def key(text, method):
+        """
+        Cache key of the scores of an already preprocessed text according to 'method'.
+        """
+        return hashlib.sha1((SentimentCache._key_prefix(method) + text).encode('utf-8')).hexdigest()
+
+    def _keys(self, tweets, method, texts):
+        prefix = self._key_prefix(method)
+        if texts is None:
+            texts = normalize_tweets(tweets)
+        return [hashlib.sha1((prefix + text).encode('utf-8')).hexdigest() for text in texts]
+
+    def __len__(self):
+        return self._size
+
+    def lookup(self, tweets: List[NLPTweet], method, texts: List[str] = None) -> List[NLPTweet]:
+        """
+        Set the scores of the tweets found in the cache.
+
+        Parameters
+        ----------
+        tweets (List[NLPTweet]): tweets to look up.
+        method (Union[str, List[str]]): method(s) used for sentiment analysis.
+        texts (List[str]): normalized texts of the tweets, if already computed. Default is their 'normalized' attribute, see normalize_tweets.
+
+        Returns
+        -------
+        misses (List[NLPTweet]): tweets that were not found in the cache, in their original order.
+        """
+        keys = self._keys(tweets, method, texts)
+        found = dict()
+        now = time.time()
+        unique_keys = list(set(keys))
+        with self._lock, self._conn:
+            for i in range(0, len(unique_keys), _SQL_BATCH):
+                batch = unique_keys[i:i + _SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, scores FROM scores WHERE key IN ({placeholders})", batch))
+                self._conn.execute(
+                    f"UPDATE scores SET last_used = ? WHERE key IN ({placeholders})", [now] + batch)
+        misses = []
+        for tweet, key in zip(tweets, keys):
+            if key in found:
+                tweet.update(json.loads(found[key]))
+            else:
+                misses.append(tweet)
+        self.hits += len(tweets) - len(misses)
+        self.misses += len(misses)
+        return misses
+
+    def store(self, tweets: List[NLPTweet], method, texts: List[str] = None):
+        """
+        Store the scores of already analyzed tweets, evicting the least recently used entries if the cache is full.
+
+        Parameters
+        ----------
+        tweets (List[NLPTweet]): tweets analyzed using 'method'.
+        method (Union[str, List[str]]): method(s) used for sentiment analysis.
+        texts (List[str]): normalized texts of the tweets, if already computed. Default is their 'normalized' attribute, see normalize_tweets.
+        """
+        if not tweets:
+            return
+        columns = get_analyzer(method).columns
+        now = time.time()
+        rows = [(key, json.dumps({col: tweet[col] for col in columns}), now)
+                for tweet, key in zip(tweets, self._keys(tweets, method, texts))]
+        with self._lock, self._conn:
+            # a key that is already stored (e.g. by another search) has the same scores, so only new keys are inserted
+            self._size += self._conn.executemany(
+                "INSERT OR IGNORE INTO scores (key, scores, last_used) VALUES (?, ?, ?)", rows).rowcount
+            excess = self._size - self.max_entries
+            if excess > 0:
+                self._size -= self._conn.execute(
+                    "DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY last_used LIMIT ?)", (excess,)).rowcount
+
+    def stats(self):
+        """
+        Cache usage counters since the cache was opened.
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,130 @@
+"""
+Checkpoints for resumable Snscrape downloads.
+
+Snscrape returns search results from the newest to the oldest tweet, so the progress of a search is fully
+described by the id of the last tweet written to disk: on restart, the search is resumed with a 'max_id'
+operator and any tweet that is not older than that is skipped. The state of each search is stored in a
+JSON file, keyed by a hash of the arguments of the search, together with the size of the output file at the time
+of the checkpoint, so that rows written after the last checkpoint can be discarded before resuming.
+
+Default dates depend on the day a search is started, so the dates a search resolved when it started are stored
+in its state too, and a search resumed on a later day covers the same range.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Union
+
+
+class Checkpoint:
+    """
+    Progress of a search, persisted to a local JSON state file.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the state file. It is created if it does not exist.
+
+    Attributes
+    ----------
+    query (dict): arguments of the current search, as given by the user. Set by start().
+    since (str): lower bound date of the current search, as resolved when it was started, or None before it is set.
+    until (str): upper bound date (not included) of the current search, or None before it is set.
+    last_id (int): id of the last tweet written to disk, or None if nothing was written yet.
+    last_date (str): date of the last tweet written to disk.
+    n_tweets (int): number of tweets written to disk so far.
+    dest (str): location of the output file.
+    offset (int): size in bytes of the output file at the time of the last checkpoint.
+    done (bool): whether the search was completed.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.query = None
+        self._reset()
+
+    def _reset(self):
+        self.since = None
+        self.until = None
+        self.last_id = None
+        self.last_date = None
+        self.n_tweets = 0
+        self.dest = None
+        self.offset = 0
+        self.done = False
+
+    @staticmethod
+    def make_key(query):
+        return hashlib.sha1(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _read(self):
+        if not self.path.is_file():
+            return dict()
+        with self.path.open() as f:
+            return json.load(f)
+
+    def start(self, **query):
+        """
+        Load the state of a search, if any.
+
+        Parameters
+        ----------
+        **query: arguments identifying the search, as given by the user, e.g. q, since, until, username, near, radius and lang. Dates that were not given must be passed as None, and resolved afterwards only if since is None (see iter_tweets_sn).
+        """
+        self.query = query
+        self._reset()
+        state = self._read().get(self.make_key(query))
+        if state is not None:
+            self.since = state['since']
+            self.until = state['until']
+            self.last_id = state['last_id']
+            self.last_date = state['last_date']
+            self.n_tweets = state['n_tweets']
+            self.dest = state['dest']
+            self.offset = state['offset']
+            self.done = state['done']
+
+    def advance(self, tweets, dest, offset):
+        """
+        Record that 'tweets' were written to 'dest', whose size is now 'offset' bytes, and save the state.
+
+        Parameters
+        ----------
+        tweets (List[NLPTweet]): tweets written since the last checkpoint, from the newest to the oldest.
+        dest (Union[str, Path]): location of the output file.
+        offset (int): size in bytes of the output file after writing 'tweets'.
+        """
+        if tweets:
+            self.last_id = int(tweets[-1].id)
+            self.last_date = tweets[-1].date
+            self.n_tweets += len(tweets)
+        self.dest = str(dest)
+        self.offset = offset
+        self.save()
+
+    def finish(self):
+        """
+        Mark the search as completed and save the state.
+        """
+        self.done = True
+        self.save()
+
+    def save(self):
+        if self.query is None:
+            raise RuntimeError("Checkpoint.start must be called before saving")
+        states = self._read()
+        states[self.make_key(self.query)] = {
+            'query': self.query,
+            'since': self.since,
+            'until': self.until,
+            'last_id': self.last_id,
+            'last_date': self.last_date,
+            'n_tweets': self.n_tweets,
+            'dest': self.dest,
+            'offset': self.offset,
+            'done': self.done,
+        }
+        # write to a temporary file first, so that a crash while saving never corrupts the state
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with tmp_path.open('w') as f:
+            json.dump(states, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,228 @@
+"""
+Buffered, optionally compressed .csv output for tweets.
+
+A CSVWriter writes tweets under a fixed list of columns (see bsi_sentiment.twitter.output_columns for the columns
+declared for each backend and analyzer), so that tweets lacking some fields (e.g. Snscrape tweets among Tweepy ones,
+or tweets that were not scored) are written with empty values instead of breaking the output. Rows are formatted
+one column at a time for whole batches of tweets: the values of each column are fetched with a single attrgetter
+pass, converted to text and checked for characters that need quoting at once, so that most values never go through
+a Python-level function call. The resulting text is buffered and written in large blocks. Files are the same as
+those of csv.writer with its default dialect.
+
+Files whose name ends with '.csv.gz' or '.csv.zst' are compressed with gzip or zstd (the latter requires the
+optional dependency zstandard, which can be installed with `pip install bsi-sentiment[zstd]`). Appending to a
+compressed file adds a new gzip member or zstd frame, and files made of several members or frames are read back as
+a single stream.
+"""
+import gzip
+import io
+import re
+from operator import attrgetter
+from pathlib import Path
+from typing import List, Union
+
+COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+# number of tweets formatted at a time by NLPTweetList.to_csv
+WRITE_BATCH_SIZE = 10000
+_LINE_TERMINATOR = '\r\n'
+# values of these types never contain characters that need quoting
+_UNQUOTED_TYPES = frozenset((int, float, type(None)))
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstandard is required to read and write .csv.zst files. Install it with 'pip install bsi-sentiment[zstd]'") from None
+    return zstandard
+
+
+def csv_compression(path: Union[str, Path]):
+    """
+    Compression of a .csv file according to its name: None for '.csv', 'gzip' for '.csv.gz' and 'zstd' for '.csv.zst'.
+    """
+    suffixes = Path(path).suffixes
+    if suffixes[-1:] == ['.csv']:
+        return None
+    if len(suffixes) >= 2 and suffixes[-2] == '.csv' and suffixes[-1] in COMPRESSIONS:
+        return COMPRESSIONS[suffixes[-1]]
+    raise FileNotFoundError(
+        f"path must be pointing at a .csv, .csv.gz or .csv.zst file, got '{str(path)}'")
+
+
+def check_csv_path(path: Union[str, Path]) -> Path:
+    """
+    Validate the location of a .csv file, possibly compressed (see csv_compression).
+    """
+    if not isinstance(path, (str, Path)):
+        raise TypeError(
+            f"path must be of type Union[str, Path], got '{type(path).__name__}'")
+    path = Path(path)
+    if not path.parent.is_dir():
+        raise FileNotFoundError(f"path '{str(path)}'is not valid")
+    csv_compression(path)
+    return path
+
+
+def open_csv(path: Union[str, Path]):
+    """
+    Open a .csv file for reading as text, decompressing it if needed, e.g. to pass it to csv.reader.
+    """
+    compression = csv_compression(path)
+    if compression is None:
+        return open(path, newline='', encoding='utf-8')
+    if compression == 'gzip':
+        return gzip.open(path, 'rt', newline='', encoding='utf-8')
+    reader = _import_zstandard().ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+    return io.TextIOWrapper(reader, newline='', encoding='utf-8')
+
+
+def _column(tweets, col):
+    try:
+        return list(map(attrgetter(col), tweets))
+    except AttributeError:
+        # the field is missing from some tweets, e.g. Tweepy fields of Snscrape tweets
+        return [getattr(tweet, col, None) for tweet in tweets]
+
+
+def _needs_quotes(delimiter):
+    return re.compile(f'[{re.escape(delimiter)}"\r\n]').search
+
+
+def _quote(needs_quotes):
+    def quote(value):
+        return '"' + value.replace('"', '""') + '"' if needs_quotes(value) else value
+    return quote
+
+
+def format_rows(tweets: List, columns: List[str], delimiter=',') -> str:
+    """
+    Format tweets as .csv rows, as csv.writer would with its default dialect: missing fields and None are written
+    as empty values, and values containing the delimiter, quotes or line breaks are quoted.
+
+    Parameters
+    ----------
+    tweets (List[NLPTweet]): tweets to format.
+    columns (List[str]): fields written to each row.
+    delimiter (str): field delimiter. Default is ','.
+
+    Returns
+    -------
+    text (str): one line per tweet, each ending with '\\r\\n'.
+    """
+    if not tweets:
+        return ''
+    needs_quotes = _needs_quotes(delimiter)
+    quote = _quote(needs_quotes)
+    values = []
+    for col in columns:
+        column = _column(tweets, col)
+        types = set(map(type, column))
+        if types == {type(None)}:
+            column = [''] * len(column)
+        elif types != {str}:
+            column = ['' if value is None else str(value) for value in column] if type(None) in types else list(map(str, column))
+        if not types <= _UNQUOTED_TYPES and needs_quotes('\0'.join(column)):
+            column = list(map(quote, column))
+        if len(columns) == 1:
+            # a row made of a single empty value would be an empty line
+            column = [value or '""' for value in column]
+        values.append(column)
+    return _LINE_TERMINATOR.join(map(delimiter.join, zip(*values))) + _LINE_TERMINATOR
+
+
+class CSVWriter:
+    """
+    Write tweets to a .csv file in large blocks, optionally compressed. The header is written when the file is
+    created, or when appending to a file that does not exist or is empty.
+
+    Example
+    -------
+    with CSVWriter("tweets.csv.gz", output_columns('sn', method='vader')) as writer:
+        for batch in batches:
+            writer.write(batch)
+
+    Parameters
+    ----------
+    path (Union[str, Path]): path of the file. It is compressed with gzip if it ends with '.csv.gz', and with zstd if it ends with '.csv.zst'.
+    columns (List[str]): columns to write. Fields missing from a tweet are written as empty values.
+    delimiter (str): field delimiter. Default is ','.
+    append (bool): whether to append to the file, if it exists, instead of overwriting it. Default is False.
+    offset (int): if given, the (uncompressed) file is truncated to offset bytes and writing resumes there, e.g. after the last checkpoint of a search. The header is written only if offset is 0.
+    buffer_size (int): number of characters formatted before they are written to the file. Default is 4 MiB.
+    """
+    def __init__(self, path: Union[str, Path], columns: List[str], delimiter=',', append=False, offset=None, buffer_size=1 << 22):
+        path = check_csv_path(path)
+        self.compression = csv_compression(path)
+        if offset is not None and (append or self.compression is not None):
+            raise ValueError("offset can only be used to overwrite uncompressed .csv files")
+        self.path = path
+        self.columns = list(columns)
+        self.delimiter = delimiter
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        if offset:
+            new = False
+            self._file = path.open('r+b')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+        else:
+            new = not append or not path.is_file() or path.stat().st_size == 0
+            mode = 'ab' if append else 'wb'
+            if self.compression == 'gzip':
+                self._file = gzip.open(path, mode, compresslevel=6)
+            elif self.compression == 'zstd':
+                self._file = _import_zstandard().ZstdCompressor().stream_writer(path.open(mode))
+            else:
+                self._file = path.open(mode)
+        if new:
+            quote = _quote(_needs_quotes(delimiter))
+            self._add(delimiter.join(map(quote, self.columns)) + _LINE_TERMINATOR)
+
+    def _add(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self._drain()
+
+    def _drain(self):
+        if self._buffer:
+            self._file.write(''.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+            self._buffered = 0
+
+    def write(self, tweets: List):
+        """
+        Write a batch of tweets. Rows are buffered until buffer_size characters are formatted, see flush.
+        """
+        self._add(format_rows(tweets, self.columns, self.delimiter))
+
+    def flush(self):
+        """
+        Write the buffered rows and flush the file, so that they are visible on disk.
+        """
+        self._drain()
+        self._file.flush()
+
+    def tell(self) -> int:
+        """
+        Size of the (uncompressed) file once the buffered rows are flushed.
+        """
+        if self.compression is not None:
+            raise ValueError("offsets are only available for uncompressed .csv files")
+        self._drain()
+        return self._file.tell()
+
+    def close(self):
+        try:
+            self._drain()
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
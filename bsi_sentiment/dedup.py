@@ -0,0 +1,219 @@
+"""
+Deduplication of tweet texts before analysis.
+
+Search results often contain many copies of the same text (e.g. copy-pasted spam or bot tweets), which would
+otherwise be scored separately. A Deduplicator assigns each tweet to a duplicate group, identified by the id of the
+first tweet of the group (its representative), or by the number of the group if that tweet has no id (e.g. when
+scoring a file without ids). Only representatives are scored, and their scores are copied to the other members of
+their group. The group of each tweet is stored in its 'dup_group' field, so that it is written to the output files.
+
+Groups are found on the normalized texts (see bsi_sentiment.preprocess), by exact hashing and, optionally, by
+comparing MinHash sketches to also collapse near-duplicates, e.g. copies that differ by a hashtag or a few words.
+Members of such groups receive the scores of their representative, which may differ slightly from their own.
+
+A sketch is the bottom-k MinHash of the pairs of consecutive words of a text, i.e. the k smallest hashes of its
+word pairs, from which the Jaccard similarity of two texts can be estimated. Representatives are indexed by their
+few smallest hashes, which near-duplicates are very likely to share, so that each new text is only compared with a
+handful of candidates. On texts as short as tweets, this separates near-duplicates from unrelated texts much more
+reliably than SimHash fingerprints.
+
+Only the most recently seen groups are remembered, with their hashes, sketches and scores, so that deduplicating a
+stream runs in bounded memory. Later copies of the texts of a forgotten group are scored again, and may start a
+new group.
+"""
+import hashlib
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Tuple
+
+DEDUP_CHOICES = ('exact', 'near')
+
+_WORD_REGEX = re.compile(r'\w+')
+SKETCH_SIZE = 16
+# number of smallest hashes under which representatives are indexed, and maximum number of representatives kept
+# under each hash, so that hashes of very common word pairs do not make lookups linear in the number of groups
+_ANCHORS = 4
+_MAX_CANDIDATES = 64
+
+
+class _Group:
+    __slots__ = ('sketch', 'scores')
+
+    def __init__(self, text_sketch=()):
+        self.sketch = text_sketch
+        # scores of the representative, by method
+        self.scores = dict()
+
+
+def sketch(text: str, k=SKETCH_SIZE) -> Tuple[int, ...]:
+    """
+    Bottom-k MinHash sketch of a text: the k smallest CRC-32 hashes of its pairs of consecutive words, lowercased,
+    in ascending order.
+    """
+    words = _WORD_REGEX.findall(text.lower())
+    return tuple(sorted({zlib.crc32(f"{a} {b}".encode('utf-8')) for a, b in zip(words, words[1:])})[:k])
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...], k=SKETCH_SIZE) -> float:
+    """
+    Estimate of the Jaccard similarity of the word pairs of two texts, from their sketches. It is exact when both
+    texts have at most k distinct word pairs.
+    """
+    union = sorted(set(a).union(b))[:k]
+    if not union:
+        return 0.0
+    a, b = set(a), set(b)
+    return sum(1 for h in union if h in a and h in b) / len(union)
+
+
+class Deduplicator:
+    """
+    Group tweets whose normalized texts are identical or, optionally, nearly identical, so that each group is scored
+    only once. Groups are remembered across calls, so the same instance can be used for the successive batches of
+    a stream or for several searches, including from several threads.
+
+    Parameters
+    ----------
+    near (bool): whether to also group near-duplicates, whose estimated Jaccard similarity is at least min_similarity. Default is False, i.e. only identical texts are grouped.
+    min_similarity (float): minimum Jaccard similarity of the pairs of consecutive words of near-duplicates, between 0 (exclusive) and 1. Default is 0.5, which groups e.g. texts of 10 words differing by one word.
+    max_groups (int): maximum number of groups kept in memory, with their scores, to be copied to members found in later batches. The least recently used groups are dropped first, and their next members are scored again. Default is 100000.
+    """
+    def __init__(self, near=False, min_similarity=0.5, max_groups=100000):
+        if not 0 < min_similarity <= 1:
+            raise ValueError(f"min_similarity must be in (0, 1], got {min_similarity}")
+        self.near = near
+        self.min_similarity = min_similarity
+        self.max_groups = max_groups
+        self.n_tweets = 0
+        self.n_groups = 0
+        self._lock = threading.Lock()
+        # hashes of normalized texts and groups, both in least recently used order
+        self._exact = OrderedDict()
+        self._groups = OrderedDict()
+        self._index = dict()
+
+    def _find_near(self, text_sketch):
+        for h in text_sketch[:_ANCHORS]:
+            for candidate, group in self._index.get(h, ()):
+                if similarity(text_sketch, candidate) >= self.min_similarity:
+                    return group
+        return None
+
+    def _add_near(self, text_sketch, group):
+        for h in text_sketch[:_ANCHORS]:
+            candidates = self._index.setdefault(h, [])
+            if len(candidates) >= _MAX_CANDIDATES:
+                del candidates[0]
+            candidates.append((text_sketch, group))
+
+    def _remove_near(self, text_sketch, group):
+        for h in text_sketch[:_ANCHORS]:
+            candidates = [candidate for candidate in self._index.get(h, ()) if candidate[1] != group]
+            if candidates:
+                self._index[h] = candidates
+            else:
+                self._index.pop(h, None)
+
+    def _touch(self, group):
+        record = self._groups.get(group)
+        if record is None:
+            # the group was forgotten, but a hash of one of its texts was not
+            record = self._groups[group] = _Group()
+        else:
+            self._groups.move_to_end(group)
+        return record
+
+    def _forget(self):
+        while len(self._exact) > self.max_groups:
+            self._exact.popitem(last=False)
+        while len(self._groups) > self.max_groups:
+            group, record = self._groups.popitem(last=False)
+            if record.sketch:
+                self._remove_near(record.sketch, group)
+
+    def _group(self, text, tweet_id):
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        group = self._exact.get(key)
+        if group is not None:
+            self._exact.move_to_end(key)
+            record = self._touch(group)
+            self._forget()
+            return group, record
+        text_sketch = sketch(text) if self.near else ()
+        if text_sketch:
+            group = self._find_near(text_sketch)
+        if group is None:
+            self.n_groups += 1
+            group = self.n_groups if tweet_id is None else tweet_id
+            record = self._groups[group] = _Group(text_sketch)
+            if text_sketch:
+                self._add_near(text_sketch, group)
+        else:
+            record = self._touch(group)
+        self._exact[key] = group
+        self._forget()
+        return group, record
+
+    def collapse(self, tweets, texts, method) -> Tuple[list, List[str], list]:
+        """
+        Assign tweets to duplicate groups, setting their 'dup_group' field, and copy the known scores of their groups.
+
+        Parameters
+        ----------
+        tweets (List[NLPTweet]): tweets to score.
+        texts (List[str]): their normalized texts.
+        method (Union[str, Tuple[str]]): method used to score them, as returned by method_key.
+
+        Returns
+        -------
+        representatives (List[NLPTweet]): tweets that must be scored.
+        texts (List[str]): normalized texts of the representatives.
+        members (List[Tuple[NLPTweet, NLPTweet]]): tweets whose representative is scored in the same batch, paired with it. See fan_out.
+        """
+        representatives, representative_texts, members = [], [], []
+        batch = dict()
+        with self._lock:
+            self.n_tweets += len(tweets)
+            for tweet, text in zip(tweets, texts):
+                group, record = self._group(text, tweet.get('id'))
+                tweet['dup_group'] = group
+                scores = record.scores.get(method)
+                if scores is not None:
+                    tweet.update(scores)
+                elif group in batch:
+                    members.append((tweet, batch[group]))
+                else:
+                    batch[group] = tweet
+                    representatives.append(tweet)
+                    representative_texts.append(text)
+        return representatives, representative_texts, members
+
+    def fan_out(self, representatives, members, method, columns):
+        """
+        Copy the scores of representatives, once scored, to the members of their groups, and remember them for the
+        members found in later batches.
+
+        Parameters
+        ----------
+        representatives (List[NLPTweet]), members (List[Tuple[NLPTweet, NLPTweet]]): as returned by collapse.
+        method (Union[str, Tuple[str]]): method used to score the representatives.
+        columns (Tuple[str]): names of the scores, i.e. the columns of the analyzer.
+        """
+        for tweet, representative in members:
+            tweet.update({col: representative.get(col) for col in columns})
+        with self._lock:
+            for representative in representatives:
+                record = self._groups.get(representative.dup_group)
+                # groups forgotten since collapse are scored again when they come back
+                if record is not None:
+                    record.scores[method] = {col: representative.get(col) for col in columns}
+
+    def stats(self):
+        """
+        Number of tweets seen, number of groups and fraction of tweets that were duplicates of an earlier tweet.
+        """
+        with self._lock:
+            return {'tweets': self.n_tweets, 'groups': self.n_groups,
+                    'duplicate_rate': 1 - self.n_groups / self.n_tweets if self.n_tweets else 0.0}
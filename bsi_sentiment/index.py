@@ -0,0 +1,133 @@
+"""
+Local index of the tweets already downloaded by each search, for incremental ("since last run") searches.
+
+For each query, the index stores the ids of the tweets written to disk and a high-water mark, i.e. the id and date
+of the newest tweet found by the last completed search. Since Snscrape returns results from the newest to the oldest
+tweet, the next search for the same query only needs to start from the date of the high-water mark and can stop as
+soon as it reaches its id, so that only new tweets are downloaded, scored and appended to the output file.
+
+The high-water mark is moved only once a search is completed: if a search is interrupted, the next one scrapes
+down to the previous mark again, skipping the ids that were already written.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Union
+
+
+class TweetIndex:
+    """
+    Ids and high-water marks of the tweets downloaded by each query, stored in a SQLite database.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the database. It is created if it does not exist.
+
+    Attributes
+    ----------
+    key (str): key of the current query. Set by start().
+    max_id (int): id of the newest tweet found by the last completed search of the current query, or None.
+    max_date (str): date of that tweet, formatted as yyyy-mm-dd.
+    n_tweets (int): number of tweets of the current query stored so far, by all searches.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.key = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries (key TEXT PRIMARY KEY, query TEXT NOT NULL, max_id INTEGER, "
+                "max_date TEXT, n_tweets INTEGER NOT NULL, updated REAL NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tweets (key TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (key, id)) WITHOUT ROWID")
+        self._reset()
+
+    def _reset(self):
+        self.max_id = None
+        self.max_date = None
+        self.n_tweets = 0
+        self._new_max_id = None
+        self._new_max_date = None
+
+    @staticmethod
+    def make_key(query):
+        return hashlib.sha1(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def start(self, **query):
+        """
+        Load the high-water mark of a query.
+
+        Parameters
+        ----------
+        **query: arguments identifying the query, e.g. q, username, near, radius and lang, but not the date range.
+        """
+        self.key = self.make_key(query)
+        self._reset()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT max_id, max_date, n_tweets FROM queries WHERE key = ?", (self.key,)).fetchone()
+            if row is None:
+                self._conn.execute("INSERT INTO queries (key, query, max_id, max_date, n_tweets, updated) VALUES (?, ?, NULL, NULL, 0, ?)",
+                                   (self.key, json.dumps(query, sort_keys=True), time.time()))
+            else:
+                self.max_id, self.max_date, self.n_tweets = row
+
+    def _check_started(self):
+        if self.key is None:
+            raise RuntimeError("TweetIndex.start must be called first")
+
+    def known_ids(self):
+        """
+        Ids of the current query stored by interrupted searches, i.e. newer than the high-water mark.
+        """
+        self._check_started()
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                "SELECT id FROM tweets WHERE key = ? AND id > ?", (self.key, self.max_id if self.max_id is not None else -1))}
+
+    def add(self, tweets):
+        """
+        Record that tweets of the current query were written to disk. Writers such as stream_to_csv call it right
+        after each batch is flushed, so that a search killed at any point never writes a recorded tweet again.
+
+        Parameters
+        ----------
+        tweets (List[NLPTweet]): tweets written.
+        """
+        self._check_started()
+        if not tweets:
+            return
+        newest = max(tweets, key=lambda tweet: int(tweet.id))
+        if self._new_max_id is None or int(newest.id) > self._new_max_id:
+            self._new_max_id, self._new_max_date = int(newest.id), newest.date
+        with self._lock, self._conn:
+            n_before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO tweets (key, id) VALUES (?, ?)",
+                                   [(self.key, int(tweet.id)) for tweet in tweets])
+            self.n_tweets += self._conn.total_changes - n_before
+            self._conn.execute("UPDATE queries SET n_tweets = ?, updated = ? WHERE key = ?",
+                               (self.n_tweets, time.time(), self.key))
+
+    def finish(self):
+        """
+        Mark the search of the current query as completed, moving its high-water mark to the newest tweet added.
+        """
+        self._check_started()
+        if self._new_max_id is not None and (self.max_id is None or self._new_max_id > self.max_id):
+            self.max_id, self.max_date = self._new_max_id, self._new_max_date
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE queries SET max_id = ?, max_date = ?, updated = ? WHERE key = ?",
+                               (self.max_id, self.max_date, time.time(), self.key))
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
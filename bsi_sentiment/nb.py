@@ -0,0 +1,263 @@
+"""
+Compiled Naive Bayes classifier, equivalent to textblob's NaiveBayesAnalyzer.
+
+textblob trains NLTK's NaiveBayesClassifier on the movie_reviews corpus in every process creating the analyzer,
+then classifies each text with one dict lookup per word and label. Here the classifier is trained once and saved
+to a model file holding its vocabulary and, for each label, an array of the log-probabilities of the words of the
+vocabulary. Model files are memory-mapped when loaded, so the arrays are neither parsed nor copied, and their pages
+are shared by all the processes of a pool.
+
+With textblob's feature extractor, each distinct word of a text is a feature whose value is True, and features
+absent from a text are simply not seen by the classifier. The log-probability of a label is therefore its prior
+plus the sum of the log-probabilities of the known distinct words of the text, i.e. the product of a sparse
+word-presence vector with the arrays of the model, which is computed for whole batches of texts at once when numpy
+is installed. Probabilities are estimated exactly as NaiveBayesClassifier.train does with its default estimator
+(ELE), so p_pos and p_neg match those of textblob up to rounding errors.
+
+Model file format (all integers and floats in the byte order given in the header):
+
+    magic (8 bytes) | header length (8 bytes) | JSON header, padded to a multiple of 8 bytes |
+    log-probabilities (float64, one row of vocab_size values per label) | vocabulary (UTF-8, one word per line)
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from collections import Counter
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+MAGIC = b'BSINB\x00\x01\n'
+_LENGTH = struct.Struct('<Q')
+
+
+def default_model_path() -> Path:
+    """
+    Default location of the model, i.e. $BSI_SENTIMENT_NB_MODEL if set, or textblob-nb.model in the directory of the
+    sentiment cache (see bsi_sentiment.cache.default_cache_dir).
+    """
+    if os.environ.get('BSI_SENTIMENT_NB_MODEL'):
+        return Path(os.environ['BSI_SENTIMENT_NB_MODEL'])
+    from .cache import default_cache_dir
+    return default_cache_dir() / 'textblob-nb.model'
+
+
+def _log2(p):
+    return math.log(p, 2)
+
+
+def train_model(documents: Iterable[Tuple[Iterable[str], str]], path: Union[str, Path]) -> Path:
+    """
+    Train a Naive Bayes classifier on labeled documents, as NaiveBayesClassifier.train does on textblob's features,
+    and save it to a model file.
+
+    Parameters
+    ----------
+    documents (Iterable[Tuple[Iterable[str], str]]): words and label of each training document.
+    path (Union[str, Path]): location of the model file. It is written atomically, so that processes building the same model at once do not read partial files.
+
+    Returns
+    -------
+    path (Path): location of the model file.
+    """
+    n_docs = Counter()
+    df = dict()  # label -> number of documents of the label containing each word
+    for words, label in documents:
+        n_docs[label] += 1
+        df.setdefault(label, Counter()).update(set(words))
+    if not n_docs:
+        raise ValueError("at least one training document is required")
+    labels = list(n_docs)
+    vocab = sorted(set().union(*df.values()))
+    for word in vocab:
+        if not word or '\n' in word:
+            raise ValueError(f"words must be non-empty and must not contain line breaks, got {word!r}")
+
+    # ELE estimates: (count + 0.5) / (total + 0.5 * bins), where a feature has 2 bins (True and missing), unless
+    # it is present in every training document
+    total = sum(n_docs.values())
+    log_priors = [_log2((n_docs[label] + 0.5) / (total + 0.5 * len(labels))) for label in labels]
+    everywhere = {word for word in vocab if all(df[label][word] == n_docs[label] for label in labels)}
+    rows = []
+    for label in labels:
+        counts, n = df[label], n_docs[label]
+        rows.append([_log2((counts[word] + 0.5) / (n + (0.5 if word in everywhere else 1.0))) for word in vocab])
+
+    header = json.dumps({'labels': labels, 'log_priors': log_priors, 'vocab_size': len(vocab),
+                         'byteorder': sys.byteorder}).encode('utf-8')
+    header += b' ' * (-len(header) % 8)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open('wb') as f:
+            f.write(MAGIC)
+            f.write(_LENGTH.pack(len(header)))
+            f.write(header)
+            for row in rows:
+                f.write(struct.pack(f'={len(row)}d', *row))
+            f.write('\n'.join(vocab).encode('utf-8'))
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
+
+def build_model(path: Union[str, Path] = None, quiet=False) -> Path:
+    """
+    Train the classifier of textblob's NaiveBayesAnalyzer on the NLTK movie_reviews corpus, downloading it if needed,
+    and save it to a model file.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the model file. Default is default_model_path().
+    quiet (bool): whether to disable the messages of the corpus download. Default is False.
+    """
+    from nltk import data, download
+
+    try:
+        data.find('corpora/movie_reviews')
+    except LookupError:
+        download('movie_reviews', quiet=quiet)
+    from nltk.corpus import movie_reviews
+
+    documents = ((movie_reviews.words(fileids=[fileid]), label)
+                 for label in ('neg', 'pos') for fileid in movie_reviews.fileids(label))
+    return train_model(documents, path if path is not None else default_model_path())
+
+
+class NaiveBayesModel:
+    """
+    Naive Bayes classifier loaded from a model file written by train_model.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the model file.
+
+    Attributes
+    ----------
+    labels (List[str]): labels of the classifier, in training order.
+    vocab (Dict[str, int]): index of each word of the vocabulary in the arrays of the model.
+    """
+    def __init__(self, path: Union[str, Path]):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a Naive Bayes model file")
+        offset = len(MAGIC) + _LENGTH.size
+        header_length, = _LENGTH.unpack_from(buffer, len(MAGIC))
+        header = json.loads(bytes(buffer[offset:offset + header_length]))
+        offset += header_length
+        self.labels = header['labels']
+        self._log_priors = header['log_priors']
+        n_labels, size = len(self.labels), header['vocab_size']
+        end = offset + 8 * n_labels * size
+        if header['byteorder'] == sys.byteorder:
+            self._rows = [buffer[offset + 8 * size * i:offset + 8 * size * (i + 1)].cast('d') for i in range(n_labels)]
+        else:
+            from array import array
+            values = array('d', bytes(buffer[offset:end]))
+            values.byteswap()
+            self._rows = [values[size * i:size * (i + 1)] for i in range(n_labels)]
+        self.vocab = {word: i for i, word in enumerate(bytes(buffer[end:]).decode('utf-8').split('\n'))} if size else {}
+        try:
+            import numpy as np
+        except ImportError:
+            self._matrix = None
+        else:
+            dtype = np.dtype('<f8' if header['byteorder'] == 'little' else '>f8')
+            self._matrix = np.frombuffer(self._mmap, dtype=dtype, count=n_labels * size, offset=offset).reshape(n_labels, size)
+
+    def _word_ids(self, words):
+        vocab = self.vocab
+        return [vocab[word] for word in set(words) if word in vocab]
+
+    def log_probs(self, documents: Iterable[Iterable[str]]) -> List[List[float]]:
+        """
+        Unnormalized log-probabilities (in base 2) of each label, for each document.
+
+        Parameters
+        ----------
+        documents (Iterable[Iterable[str]]): words of each document. Words absent from the vocabulary are ignored.
+        """
+        ids = [self._word_ids(words) for words in documents]
+        if not ids:
+            return []
+        if self._matrix is None:
+            return [[prior + sum(map(row.__getitem__, doc_ids)) for prior, row in zip(self._log_priors, self._rows)]
+                    for doc_ids in ids]
+        import numpy as np
+
+        lengths = np.fromiter(map(len, ids), dtype=np.intp, count=len(ids))
+        indices = np.fromiter(chain.from_iterable(ids), dtype=np.intp, count=int(lengths.sum()))
+        docs = np.repeat(np.arange(len(ids)), lengths)
+        sums = [np.bincount(docs, weights=row[indices], minlength=len(ids)) + prior
+                for prior, row in zip(self._log_priors, self._matrix)]
+        return np.stack(sums, axis=1).tolist()
+
+    def prob_classify_batch(self, documents: Iterable[Iterable[str]]) -> List[Tuple[str, Dict[str, float]]]:
+        """
+        Classify documents, as NaiveBayesClassifier.prob_classify would.
+
+        Parameters
+        ----------
+        documents (Iterable[Iterable[str]]): words of each document.
+
+        Returns
+        -------
+        results (List[Tuple[str, Dict[str, float]]]): most probable label and probability of each label, for each document.
+        """
+        from nltk.probability import sum_logs
+
+        results = []
+        for logp in self.log_probs(documents):
+            total = sum_logs(logp)
+            probs = {label: 2 ** (lp - total) for label, lp in zip(self.labels, logp)}
+            results.append((max((p, label) for label, p in probs.items())[1], probs))
+        return results
+
+
+def load_model(path: Union[str, Path] = None, quiet=False) -> NaiveBayesModel:
+    """
+    Load the model of textblob's NaiveBayesAnalyzer, building it first if the model file does not exist.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the model file. Default is default_model_path().
+    quiet (bool): whether to disable the messages of the corpus download, if the model is built. Default is False.
+    """
+    path = Path(path) if path is not None else default_model_path()
+    if not path.exists():
+        build_model(path, quiet=quiet)
+    return NaiveBayesModel(path)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Words of a text used as features, as in textblob's NaiveBayesAnalyzer: lowercased words of at least 3 characters.
+    """
+    from textblob.tokenizers import word_tokenize
+
+    return [token.lower() for token in word_tokenize(text, include_punc=False) if len(token) >= 3]
+
+
+def main(argv: Sequence[str] = None):
+    """
+    Build the model file ahead of time, e.g. when installing bsi_sentiment on machines without network access.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m bsi_sentiment.nb', description=main.__doc__.strip())
+    parser.add_argument('path', nargs='?', default=None,
+                        help="location of the model file. Default is $BSI_SENTIMENT_NB_MODEL or textblob-nb.model in the cache directory.")
+    args = parser.parse_args(argv)
+    print(build_model(args.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Parquet input/output for tweets.
+
+Unlike .csv files, Parquet files keep column types (e.g. polarity is read back as a float) and are compressed,
+so they are much faster to read back many times. Writing happens one row group at a time, so that large
+searches never need to be converted to a single in-memory table. Requires the optional dependency pyarrow,
+which can be installed with `pip install bsi-sentiment[parquet]`.
+"""
+from pathlib import Path
+from typing import Iterable, List, Union
+
+from tqdm import tqdm
+
+from .stats import record
+from .utils import check_path
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "pyarrow is required to read and write Parquet files. Install it with 'pip install bsi-sentiment[parquet]'") from None
+    return pyarrow
+
+
+# ids are ints for Snscrape and strs for Tweepy, so they are stored as text to allow both backends in one file
+ID_FIELDS = ('id', 'dup_group')
+
+
+def _field_types(pa):
+    """
+    Arrow types of the fields of NLPTweet, whatever the backend used for the search.
+    """
+    string_fields = ID_FIELDS + ('permalink', 'username', 'to', 'text', 'date', 'time', 'mentions', 'hashtags', 'geo', 'classification')
+    int_fields = ('retweets', 'favorites')
+    float_fields = ('polarity', 'subjectivity', 'pos_w', 'neu_w', 'neg_w', 'p_pos', 'p_neg')
+    types = dict.fromkeys(string_fields, pa.string())
+    types.update(dict.fromkeys(int_fields, pa.int64()))
+    types.update(dict.fromkeys(float_fields, pa.float64()))
+    return types
+
+
+def _to_array(pa, values, type):
+    if pa.types.is_string(type):
+        # non-scalar fields (e.g. Tweepy geo) are stored as text, as in .csv files
+        values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+    return pa.array(values, type=type)
+
+
+def tweets_schema(tweets, columns):
+    """
+    Infer the Arrow schema of a batch of tweets. Only the types of fields that are not declared by NLPTweet (e.g. the
+    metrics of custom analyzers) are inferred from the batch.
+
+    Parameters
+    ----------
+    tweets (List[NLPTweet]): tweets to infer the schema from.
+    columns (List[str]): fields to include in the schema.
+
+    Returns
+    -------
+    schema (pyarrow.Schema)
+    """
+    pa = _import_pyarrow()
+    types = _field_types(pa)
+    fields = []
+    for col in columns:
+        if col in types:
+            fields.append((col, types[col]))
+            continue
+        # e.g. metrics of custom analyzers
+        inferred = pa.array([tweet.get(col) for tweet in tweets]).type
+        fields.append((col, pa.string() if pa.types.is_null(inferred) or pa.types.is_nested(inferred) else inferred))
+    return pa.schema(fields)
+
+
+def tweets_table(tweets, schema):
+    """
+    Convert a batch of tweets to an Arrow table with the given schema.
+    """
+    pa = _import_pyarrow()
+    arrays = [_to_array(pa, [tweet.get(field.name) for tweet in tweets], field.type) for field in schema]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def stream_to_parquet(batches: Iterable[list], path: Union[str, Path], columns: List[str] = None, compression='snappy', quiet=False, desc="Writing tweets    "):
+    """
+    Write batches of tweets to a .parquet file, one row group per batch. The file is created only once the first batch is received.
+
+    Parameters
+    ----------
+    batches (Iterable[List[NLPTweet]]): batches of tweets to write, e.g. as yielded by stream_sentiment or batched.
+    path (Union[str, Path]): path of the .parquet file.
+    columns (List[str]): columns to write. Default is the attributes of the first tweet.
+    compression (str): compression codec, e.g. 'snappy', 'zstd', 'gzip' or 'none'. Default is 'snappy'.
+    quiet (bool): whether to disable the progress bar. Default is False.
+
+    Returns
+    -------
+    n_tweets (int): number of tweets written.
+    """
+    pq = _import_pyarrow().parquet
+    path = check_path(path, '.parquet')
+    n_tweets = 0
+    writer = None
+    try:
+        with tqdm(desc=desc, disable=quiet) as pbar:
+            for batch in batches:
+                if not batch:
+                    continue
+                if writer is None:
+                    if columns is None:
+                        columns = batch[0].keys()
+                    schema = tweets_schema(batch, columns)
+                    writer = pq.ParquetWriter(str(path), schema, compression=compression)
+                with record('write', len(batch)):
+                    writer.write_table(tweets_table(batch, schema))
+                n_tweets += len(batch)
+                pbar.update(len(batch))
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_tweets
+
+
+def _to_id(value):
+    # Snscrape ids are read back as ints, as from .csv files
+    return int(value) if value is not None and value.isdigit() else value
+
+
+def _rows(record_batch):
+    rows = record_batch.to_pylist()
+    for col in ID_FIELDS:
+        if col in record_batch.schema.names:
+            for row in rows:
+                row[col] = _to_id(row[col])
+    return rows
+
+
+def iter_parquet(path: Union[str, Path], columns: List[str] = None, batch_size=10000):
+    """
+    Read a .parquet file written by stream_to_parquet or NLPTweetList.to_parquet in batches.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): path of the .parquet file.
+    columns (List[str]): columns to read. Default is all columns.
+    batch_size (int): maximum number of tweets read at a time. Default is 10000.
+
+    Yields
+    ------
+    batch (List[NLPTweet])
+    """
+    from .twitter import NLPTweet
+
+    pq = _import_pyarrow().parquet
+    path = check_path(path, '.parquet')
+    if not path.is_file():
+        raise FileNotFoundError(f"path '{str(path)}'is not valid")
+    parquet_file = pq.ParquetFile(str(path))
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield [NLPTweet.from_dict(row) for row in _rows(record_batch)]
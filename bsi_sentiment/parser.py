@@ -1,12 +1,18 @@
 import argparse
 
+from .analyzers import ANALYZERS
+
 
 parser = argparse.ArgumentParser(description="BSI Tool for Sentiment Analysis. Tweets can be downloaded using either Snscrape (default) or Tweepy.")
-parser.add_argument("command", type=str, choices=["analyze", "configure", "download"], help="Action to perform.")
-parser.add_argument("dest", type=str, nargs="?", metavar="DEST", help="Output file location. Analysis/configuration/download output file is stored here. Default is current directory.")
+parser.add_argument("command", type=str, choices=["aggregate", "analyze", "configure", "download"], help="Action to perform. 'aggregate' computes statistics of the tweets of a file written by 'analyze' (see --input).")
+parser.add_argument("dest", type=str, nargs="?", metavar="DEST", help="Output file location. Analysis/configuration/download output file is stored here. Tweets are written in Parquet format if DEST ends with '.parquet' (requires pyarrow), and in CSV format otherwise, compressed with gzip if DEST ends with '.csv.gz' or with zstd if it ends with '.csv.zst' (requires zstandard). Default is current directory.")
 parser.add_argument("-c", "--config", type=str, help="Config file location. If action is 'analyze' or 'download', configuration file is read from here.")
-# TODO: allow user to specify more than one analyzer at the same time
-parser.add_argument("-a", "--analyzer", type=str, default='vader', metavar="ANALYZER", choices=["vader", "textblob-pa", "textblob-nb"], help="Analyzer method for sentiment analysis. Available options are {'vader','textblob-pa','textblob-nb'}. Default is 'vader'.")
+parser.add_argument("-a", "--analyzer", type=str, nargs="+", default='vader', metavar="ANALYZER", choices=list(ANALYZERS), help="Analyzer method(s) for sentiment analysis. Available options are {%s}. Default is 'vader'. If several methods are given (e.g. -a vader textblob-pa), each text is scored by all of them in a single pass, and their metrics are prefixed with the method name (e.g. 'vader_polarity' and 'textblob_pa_polarity')." % ','.join(f"'{name}'" for name in ANALYZERS))
+parser.add_argument("--url_token", type=str, metavar="TOKEN", help="Replace URLs with TOKEN (e.g. 'URL') before analysis, instead of removing them.")
+parser.add_argument("--emoji", type=str, default="keep", choices=["keep", "remove", "name"], help="How emoji are handled before analysis: kept as they are ('keep'), removed ('remove') or replaced with their Unicode name ('name', e.g. 'smiling face with smiling eyes'), which VADER can score. Default is 'keep'.")
+parser.add_argument("--fold_whitespace", action="store_true", default=False, help="Replace runs of whitespace with a single space before analysis.")
+parser.add_argument("--dedup", type=str, choices=["exact", "near"], help="Score each distinct text only once and copy its scores to its duplicates, recording the id of the first tweet with the same text in an additional 'dup_group' column. With 'exact', only identical texts (after normalization) are grouped. With 'near', texts whose word pairs are at least --dedup_similarity similar (e.g. copies differing by a hashtag or a few words) are grouped too, and receive the scores of the first one. Default is to score every tweet.")
+parser.add_argument("--dedup_similarity", type=float, default=0.5, metavar="SIMILARITY", help="Minimum Jaccard similarity of the pairs of consecutive words of near-duplicates when using --dedup near, between 0 and 1. Default is 0.5.")
 parser.add_argument("-q", "--query", type=str, default="", metavar="QUERY", dest="q", help="A query text to be matched")
 parser.add_argument("-s", "--since", type=str, help="A lower bound date (UTC) to restrict search. Default is 7 days before --until. Used only by Snscrape.")
 parser.add_argument("-u", "--until", type=str, help="An upper bound date (not included) to restrict search. Default is today. Tweepy has a 7 day hard limit, while Snscrape has no such limit.")
@@ -15,7 +21,30 @@ parser.add_argument("-r", "--radius", type=str, help="Must be used together with
 parser.add_argument("-l", "--lang", type=str, help="Restrict language of the tweets retrieved. Must be an ISO 639-1 code (e.g. en, it, etc.). Default is no language restriction. Used only by Tweepy.")
 parser.add_argument("--user", type=str, metavar="USERNAME", dest="username", help="Restrict search  to tweets from specified username.")
 parser.add_argument("--result_type", type=str, default="mixed", choices=["recent", "popular", "mixed"], help="Type of tweets to retrieve. Can be either 'recent', 'popular' or 'mixed'. Default is 'mixed'. Used only by Tweepy.")
-parser.add_argument("--max_tweets", type=int, default=10, help="The maximum number of tweets to be retrieved. Default is 10. In the case of Tweepy, if greater API rate limit is reached, the program waits for 15 minutes before trying again.")
+parser.add_argument("--max_tweets", type=int, default=10, help="The maximum number of tweets to be retrieved. Default is 10. In the case of Tweepy, if API rate limit is reached, requests are sent using the next set of credentials, if any, or the program waits until the rate limit resets.")
+parser.add_argument("--shard_days", type=int, metavar="DAYS", help="Split the range between --since and --until into windows of DAYS days (e.g. 1 or 7) which are scraped concurrently. Default is no splitting. Used only by Snscrape.")
+parser.add_argument("--shard_workers", type=int, default=4, metavar="WORKERS", help="Maximum number of windows scraped at the same time when using --shard_days. Default is 4. Used only by Snscrape.")
 parser.add_argument("--tweepy", action="store_true", default=False, dest="tweepy", help="Use Tweepy instead of the default Snscrape to download tweets.")
-parser.add_argument("--credentials", type=str, default='./credentials.json', help="Path to JSON file containing Tweepy credentials. See examples/credentials.json to see how the file should be formatted.")
+parser.add_argument("--credentials", type=str, default='./credentials.json', help="Path to JSON file containing Tweepy credentials. See examples/credentials.json to see how the file should be formatted. The file can also contain a list of credentials, which are used in turn to avoid waiting for rate limits.")
+parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes used to analyze tweets. Default is 1.")
+parser.add_argument("--stream", action="store_true", default=False, help="Analyze and write tweets in batches while they are being downloaded, instead of after the search is complete. Memory usage is bounded by --batch_size.")
+parser.add_argument("--batch_size", type=int, default=1000, help="Number of tweets analyzed and written at a time when using --stream or --input. Default is 1000.")
+parser.add_argument("--checkpoint", type=str, metavar="STATE_FILE", help="JSON file where the progress of the download is saved after each batch. If the same search is run again, it resumes from the last tweet written to DEST, with the dates it started with, even on a later day. A new search is refused if DEST is not empty. Implies --stream. Used only by Snscrape.")
+parser.add_argument("--index", type=str, metavar="INDEX_FILE", help="Incremental mode. SQLite file where the ids of the tweets written to DEST are recorded for each query. If the same query is run again, only tweets newer than those found by the last run are downloaded, analyzed and appended to DEST. Implies --stream. Used only by Snscrape with .csv output files.")
+parser.add_argument("--cache_dir", type=str, metavar="DIR", help="Directory of the on-disk cache of sentiment scores. If given, texts that were already analyzed with the same analyzer are not scored again. Default is no cache.")
+parser.add_argument("--cache_size", type=int, default=1000000, help="Maximum number of scores kept in the cache. Least recently used scores are evicted first. Default is 1000000.")
+parser.add_argument("--queries", type=str, metavar="QUERIES_FILE", help="Text file containing one query per line. All the queries are run in the same process, sharing the other search parameters, the analyzer and the --jobs worker processes. Configuration files can likewise contain several '[bsi-sentiment:NAME]' sections. If DEST ends with '.csv' (possibly compressed) or '.parquet', all tweets are written to it with an additional 'query' column, otherwise DEST is a directory where the tweets of each query are written to a separate .csv file.")
+parser.add_argument("--query_workers", type=int, default=4, metavar="WORKERS", help="Maximum number of queries searched at the same time when running several queries. Default is 4.")
+parser.add_argument("--record", type=str, metavar="PAGES_FILE", help="Record the raw pages downloaded by the searches to PAGES_FILE (gzip-compressed JSON Lines, appended to if it exists), so that they can be served again with --replay.")
+parser.add_argument("--replay", type=str, metavar="PAGES_FILE", help="Serve the pages recorded with --record from PAGES_FILE instead of downloading them, e.g. to test or measure the pipeline offline. Queries and dates must be the same as when recording, including explicit --since/--until dates. No Tweepy credentials are needed.")
+parser.add_argument("--replay_speed", type=float, metavar="SPEED", help="Used only with --replay. Replay pages at SPEED times the pace at which they were recorded, e.g. 1 to reproduce the recorded response times. Default is to serve pages without delay.")
+parser.add_argument("--replay_latency", type=float, default=0.0, metavar="SECONDS", help="Used only with --replay. Seconds added to the response time of every request. Default is 0.")
+parser.add_argument("--replay_rate_limit", type=int, metavar="REQUESTS", help="Used only with --replay. Reject requests with rate-limit errors beyond REQUESTS requests per 15-minute window, as Twitter does. Default is no limit.")
+parser.add_argument("--replay_error_rate", type=float, default=0.0, metavar="RATE", help="Used only with --replay. Probability that a request is rejected with a rate-limit error, between 0 and 1. Rejections are random but reproducible. Default is 0.")
+parser.add_argument("-i", "--input", type=str, metavar="INPUT_FILE", help=".csv (possibly compressed) or .parquet file of tweets, which is read in a single streaming pass. With 'aggregate', statistics of the analyzed tweets of INPUT_FILE are written to DEST, one row per group (default is ./aggregate.csv). With 'analyze', the tweets of INPUT_FILE (e.g. written by 'download') are scored without searching them again, in batches of --batch_size tweets scored by --jobs processes, and DEST only contains their id and their new scores.")
+parser.add_argument("--by", type=str, default="day", choices=["hour", "day", "month", "user", "hashtag"], help="Used only by 'aggregate'. How tweets are grouped: by hour, day or month (UTC), by user or by hashtag. Default is 'day'.")
+parser.add_argument("--metric", type=str, default="polarity", help="Used only by 'aggregate'. Column whose count, mean, standard deviation, extrema and quantiles are computed for each group, e.g. 'polarity' or 'vader_polarity'. Default is 'polarity'.")
+parser.add_argument("--quantiles", type=float, nargs="+", default=[0.25, 0.5, 0.75], metavar="Q", help="Used only by 'aggregate'. Quantiles computed for each group, between 0 and 1. They are estimated with an error of at most 0.5%% of --range. Default is 0.25 0.5 0.75.")
+parser.add_argument("--range", type=float, nargs=2, default=[-1.0, 1.0], metavar=("LOW", "HIGH"), help="Used only by 'aggregate'. Range of the values of --metric, within which quantiles are estimated. The quantile columns of a group are left empty if some of its values are outside of the range. Default is -1 1, the range of polarity (e.g. use 0 1 for subjectivity).")
+parser.add_argument("--stats_json", type=str, metavar="STATS_FILE", help="JSON file where statistics of the run are written at the end, even if it fails: wall time, peak memory usage (RSS), time spent, number of items processed and throughput of each stage (scrape, rate_limit_wait, construct, read, normalize, dedup, cache, analyze, write, aggregate), and counters such as cache hits and misses, duplicates and rate-limited requests.")
 parser.add_argument("--quiet", action="store_true", default=False, help="No stdout output when downloading or analyzing tweets. Default is verbose.")
@@ -0,0 +1,336 @@
+"""
+Streaming download -> analyze -> write pipeline.
+
+Instead of materializing the whole search result in an NLPTweetList, tweets flow through generators and are
+scored and written in batches as soon as they are downloaded. Memory usage is therefore bounded by the batch
+size rather than by max_tweets, and partial results are visible on disk while long searches are still running.
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Union
+
+from tqdm import tqdm
+
+from .analyzers import get_analyzer, method_key
+from .csvfile import CSVWriter, check_csv_path, csv_compression, open_csv
+from .stats import record, timed
+from .twitter import NLPTweet, _init_worker, _score_tweets, infer_columns
+from .utils import load_nltk
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[list]:
+    """
+    Split an iterable into lists of at most batch_size elements, lazily.
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be a positive integer, got {batch_size}")
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_sentiment(tweets: Iterable[NLPTweet], method="vader", batch_size=1000, workers=1, quiet=False, cache=None, normalizer=None, dedup=None) -> Iterator[List[NLPTweet]]:
+    """
+    Score a stream of tweets in batches.
+
+    Parameters
+    ----------
+    tweets (Iterable[NLPTweet]): tweets to analyze, e.g. as yielded by iter_tweets_sn.
+    method (Union[str, List[str]]): method(s) to use for sentiment analysis. See NLPTweet.get_sentiment. Default is 'vader'.
+    batch_size (int): number of tweets scored at a time. Default is 1000.
+    workers (int): number of processes used to score tweets. If None, one per CPU is used. Default is 1.
+    quiet (bool): whether to suppress the output of load_nltk. Default is False.
+    cache (bsi_sentiment.cache.SentimentCache): if given, cache used to look up and store scores.
+    normalizer (bsi_sentiment.preprocess.TextNormalizer): rules used to normalize texts before analysis. Default is those of clean_text.
+    dedup (bsi_sentiment.dedup.Deduplicator): if given, duplicates are scored only once, including across batches. Default is to score every tweet.
+
+    Yields
+    ------
+    batch (List[NLPTweet]): batch of scored tweets, in the order they were received.
+    """
+    method = method_key(method)
+    load_nltk(method, quiet=quiet)
+    if workers is None:
+        workers = os.cpu_count()
+    if workers < 1:
+        raise ValueError(f"workers must be a positive integer, got {workers}")
+    if workers == 1:
+        get_analyzer(method)
+        for batch in batched(tweets, batch_size):
+            _score_tweets(batch, method, cache=cache, normalizer=normalizer, dedup=dedup)
+            yield batch
+        return
+    chunksize = max(1, batch_size // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(method,)) as executor:
+        for batch in batched(tweets, batch_size):
+            _score_tweets(batch, method, executor=executor, chunksize=chunksize, cache=cache, normalizer=normalizer,
+                          dedup=dedup)
+            yield batch
+
+
+def read_csv_header(path, delimiter=','):
+    """
+    Columns of an existing .csv file, possibly compressed, or None if the file does not exist or is empty.
+    """
+    path = Path(path)
+    if not path.is_file():
+        return None
+    with open_csv(path) as f:
+        return next(csv.reader(f, delimiter=delimiter), None)
+
+
+# types of the numeric fields of NLPTweet, converted back from text when .csv files are read. Metrics of combined
+# methods (e.g. 'vader_polarity') have the type of the metric they are prefixed to.
+CSV_INT_FIELDS = ('retweets', 'favorites')
+CSV_FLOAT_FIELDS = ('polarity', 'subjectivity', 'pos_w', 'neu_w', 'neg_w', 'p_pos', 'p_neg')
+
+
+def _to_id(value):
+    # Snscrape ids are ints, while Tweepy ids and the ids of other sources may not be numeric
+    return int(value) if value.isdigit() else value
+
+
+def _csv_converter(column):
+    if column in ('id', 'dup_group'):
+        return _to_id
+    if column in CSV_INT_FIELDS:
+        return int
+    if column in CSV_FLOAT_FIELDS or any(column.endswith('_' + field) for field in CSV_FLOAT_FIELDS):
+        return float
+    return None
+
+
+def _extra_setter(column):
+    def set_field(tweet, value):
+        tweet[column] = value
+    return set_field
+
+
+def _csv_fields(path, header, columns):
+    """
+    Position in the rows, converter and setter of each column read from a .csv file, see _csv_tweet.
+    """
+    missing = [col for col in columns if col not in header]
+    if missing:
+        raise ValueError(f"'{str(path)}' has no column(s) {missing}")
+    # fields of NLPTweet are set through their slots, other columns through __setitem__
+    return [(header.index(col), _csv_converter(col),
+             getattr(NLPTweet, col).__set__ if col in NLPTweet.FIELDS else _extra_setter(col))
+            for col in columns]
+
+
+def _csv_tweet(row, fields, width):
+    if len(row) < width:
+        row += [''] * (width - len(row))
+    tweet = NLPTweet()
+    for i, convert, set_field in fields:
+        value = row[i]
+        if value == '':
+            set_field(tweet, None)
+        elif convert is None:
+            set_field(tweet, value)
+        else:
+            set_field(tweet, convert(value))
+    return tweet
+
+
+def iter_csv(path: Union[str, Path], columns: List[str] = None, delimiter=',', batch_size=10000) -> Iterator[List[NLPTweet]]:
+    """
+    Lazily read a .csv file written by stream_to_csv or NLPTweetList.to_csv in batches, so that files of any size
+    can be read (e.g. scored again with stream_sentiment) in bounded memory. Files ending with '.csv.gz' or
+    '.csv.zst' are decompressed while they are read.
+
+    Empty values are read as None, and the numeric fields of NLPTweet (ids, counts and metrics, including those of
+    combined methods) are converted back to int or float. Other columns are read as strings.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): path of the .csv file.
+    columns (List[str]): columns to read, e.g. ['id', 'text'] to score the tweets again. Default is all columns.
+    delimiter (str): field delimiter. Default is ','.
+    batch_size (int): maximum number of tweets read at a time. Default is 10000.
+
+    Yields
+    ------
+    batch (List[NLPTweet])
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be a positive integer, got {batch_size}")
+    path = check_csv_path(path)
+    with open_csv(path) as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        fields = _csv_fields(path, header, header if columns is None else columns)
+        width = len(header)
+        while True:
+            rows = list(islice(reader, batch_size))
+            if not rows:
+                return
+            yield [_csv_tweet(row, fields, width) for row in rows]
+
+
+def _writer_columns(path, batch, columns, delimiter, append):
+    """
+    Columns of the output file of stream_to_csv: those of its header when appending to an existing file, which
+    the tweets must all have, otherwise the given columns or, by default, those of the first batch.
+    """
+    header = read_csv_header(path, delimiter) if append else None
+    if header is not None:
+        missing = set(header) - set(batch[0].keys())
+        if missing:
+            raise ValueError(f"cannot append to '{str(path)}': tweets have no column(s) {sorted(missing)}")
+        return header
+    return infer_columns(batch) if columns is None else columns
+
+
+def _open_writer(path, batch, columns, delimiter, checkpoint=None, append=False):
+    """
+    Open the output file of stream_to_csv once the first batch is received, truncating it to the last checkpoint
+    if a search is being resumed.
+    """
+    columns = _writer_columns(path, batch, columns, delimiter, append)
+    if append or checkpoint is None:
+        return CSVWriter(path, columns, delimiter=delimiter, append=append)
+    if checkpoint.offset == 0:
+        # a search that was interrupted but cannot be found in the state file must not overwrite its partial output
+        if checkpoint.path.is_file() and path.is_file() and path.stat().st_size > 0:
+            raise FileExistsError(
+                f"checkpoint '{str(checkpoint.path)}' has no state for this search, but output file '{str(path)}' "
+                "is not empty. Remove one of them to start a new search")
+        return CSVWriter(path, columns, delimiter=delimiter)
+    if checkpoint.dest != str(path):
+        raise ValueError(
+            f"checkpoint refers to output file '{checkpoint.dest}', got '{str(path)}'")
+    if not path.is_file():
+        raise FileNotFoundError(
+            f"cannot resume search: output file '{str(path)}' does not exist anymore")
+    return CSVWriter(path, columns, delimiter=delimiter, offset=checkpoint.offset)
+
+
+def _record_progress(batch, path, writer, checkpoint, index):
+    """
+    Record a batch in the checkpoint or index of the search, if any, as soon as it is flushed to disk.
+    """
+    if checkpoint is not None:
+        checkpoint.advance(batch, path, writer.tell())
+    if index is not None:
+        index.add(batch)
+
+
+def _finish_progress(checkpoint, index):
+    if checkpoint is not None:
+        checkpoint.finish()
+    if index is not None:
+        index.finish()
+
+
+def stream_to_csv(batches: Iterable[List[NLPTweet]], path: Union[str, Path], columns: List[str] = None, delimiter=',', quiet=False, checkpoint=None, append=False, index=None, desc="Processing tweets "):
+    """
+    Write batches of tweets to a .csv file, flushing after each batch so that partial results are visible on disk.
+    The file is created only once the first batch is received, and is compressed with gzip if path ends with
+    '.csv.gz' or with zstd if it ends with '.csv.zst' (see bsi_sentiment.csvfile).
+    If a checkpoint is given, it is advanced after each batch is written and, when resuming a search, the rows
+    of the file that were written after its last checkpoint are discarded and new rows are appended.
+    Likewise, if an index is given, each batch is added to it once written.
+
+    Parameters
+    ----------
+    batches (Iterable[List[NLPTweet]]): batches of tweets to write, e.g. as yielded by stream_sentiment or batched.
+    path (Union[str, Path]): path of the .csv file.
+    columns (List[str]): columns to write, e.g. as declared by output_columns. Fields missing from a tweet are written as empty values. Default is the fields set on the tweets of the first batch.
+    delimiter (str): field delimiter. Default is ','.
+    quiet (bool): whether to disable the progress bar. Default is False.
+    checkpoint (bsi_sentiment.checkpoint.Checkpoint): checkpoint of the search producing the tweets, e.g. as passed to iter_tweets_sn. Only uncompressed files can be checkpointed.
+    append (bool): whether to append the tweets to the file, if it exists, instead of overwriting it. Columns are then read from its header. Default is False.
+    index (bsi_sentiment.index.TweetIndex): index of the search producing the tweets, e.g. as passed to iter_tweets_sn. Each batch is added to it as soon as it is written, and the search is marked as completed once all batches are written.
+    desc (str): description of the progress bar.
+
+    Returns
+    -------
+    n_tweets (int): number of tweets written by this call.
+    """
+    path = check_csv_path(path)
+    if checkpoint is not None and csv_compression(path) is not None:
+        raise ValueError("checkpoint can only be used with uncompressed .csv files")
+    if append and checkpoint is not None:
+        raise ValueError("append cannot be used together with checkpoint")
+
+    n_tweets = 0
+    writer = None
+    try:
+        with tqdm(desc=desc, disable=quiet) as pbar:
+            for batch in batches:
+                if not batch:
+                    continue
+                if writer is None:
+                    writer = _open_writer(path, batch, columns, delimiter, checkpoint, append)
+                with record('write', len(batch)):
+                    writer.write(batch)
+                    writer.flush()
+                    _record_progress(batch, path, writer, checkpoint, index)
+                n_tweets += len(batch)
+                pbar.update(len(batch))
+        _finish_progress(checkpoint, index)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_tweets
+
+
+def _with_text(tweets):
+    # empty texts are read as None from .csv files
+    for tweet in tweets:
+        if tweet.text is None:
+            tweet.text = ''
+        yield tweet
+
+
+def analyze_file(path: Union[str, Path], dest: Union[str, Path], method="vader", keep_columns=('id',), batch_size=1000, workers=1, quiet=False, cache=None, normalizer=None, dedup=None) -> int:
+    """
+    Score the tweets of an existing .csv or .parquet file, e.g. downloaded earlier, without searching them again.
+    Only the text column and keep_columns are read, and tweets are scored and written in batches, so memory usage
+    is bounded by batch_size whatever the size of the file.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): .csv or .parquet file containing a 'text' column, e.g. written by the 'download' command.
+    dest (Union[str, Path]): output file. Tweets are written in Parquet format if it ends with '.parquet', and in CSV format otherwise. Its columns are keep_columns, in the given order, followed by the metrics of the method(s) and, if dedup is given, the 'dup_group' column.
+    method (Union[str, List[str]]): method(s) to use for sentiment analysis. See NLPTweet.get_sentiment. Default is 'vader'.
+    keep_columns (Tuple[str]): columns of the input file copied to dest, when present, to join the scores with the input. Default is ('id',).
+    batch_size (int): number of tweets read, scored and written at a time. Default is 1000.
+    workers (int): number of processes used to score tweets. If None, one per CPU is used. Default is 1.
+    quiet (bool): whether to disable the progress bar. Default is False.
+    cache (bsi_sentiment.cache.SentimentCache): if given, cache used to look up and store scores.
+    normalizer (bsi_sentiment.preprocess.TextNormalizer): rules used to normalize texts before analysis. Default is those of clean_text.
+    dedup (bsi_sentiment.dedup.Deduplicator): if given, duplicates are scored only once. Default is to score every tweet.
+
+    Returns
+    -------
+    n_tweets (int): number of tweets scored.
+    """
+    from .aggregate import file_columns, iter_file
+
+    if Path(path).resolve() == Path(dest).resolve():
+        raise ValueError(f"the output file must differ from the input file '{str(path)}'")
+    names = file_columns(path)
+    if 'text' not in names:
+        raise ValueError(f"'{str(path)}' has no 'text' column")
+    keep_columns = [col for col in keep_columns if col in names and col != 'text']
+    method = method_key(method)
+    load_nltk(method, quiet=quiet)
+    columns = keep_columns + list(get_analyzer(method).columns) + (['dup_group'] if dedup is not None else [])
+    tweets = timed('read', _with_text(iter_file(path, columns=keep_columns + ['text'])))
+    batches = stream_sentiment(tweets, method=method, batch_size=batch_size, workers=workers, quiet=quiet,
+                               cache=cache, normalizer=normalizer, dedup=dedup)
+    if Path(dest).suffix == '.parquet':
+        from .parquet import stream_to_parquet
+        return stream_to_parquet(batches, dest, columns=columns, quiet=quiet, desc="Processing tweets ")
+    return stream_to_csv(batches, dest, columns=columns, quiet=quiet)
@@ -0,0 +1,96 @@
+"""
+Text normalization stage.
+
+Before analysis, hashtag symbols, retweet markers, URLs and mentions are removed from the text of each tweet.
+TextNormalizer compiles these rules, together with optional extra ones (replacing URLs with a placeholder,
+removing or naming emoji), into a single regular expression applied in one pass over the text, optionally
+folding whitespace afterwards. normalize_tweets stores the result in the 'normalized' attribute of each NLPTweet,
+so that the text is normalized only once per tweet, however many analyzers and cache lookups use it.
+"""
+import re
+import unicodedata
+from typing import List
+
+# rules of the default normalization, see clean_text
+BASE_PATTERN = r'(#)|(^RT[\s]+)|(https?:\S+)|(@[A-Za-z0-9_]+)'
+BASE_REGEX = re.compile(BASE_PATTERN)
+
+EMOJI_PATTERN = r'[\U0001F000-\U0001FAFF\u2300-\u23FF\u2600-\u27BF\u2B00-\u2BFF\uFE0E\uFE0F\u200D\u20E3]'
+# characters joining emoji into sequences, which carry no meaning on their own
+_EMOJI_JOINERS = frozenset('\uFE0E\uFE0F\u200D\u20E3')
+EMOJI_CHOICES = ('keep', 'remove', 'name')
+
+
+def _emoji_name(char):
+    if char in _EMOJI_JOINERS:
+        return ' '
+    name = unicodedata.name(char, '')
+    return f" {name.lower()} " if name else ' '
+
+
+class TextNormalizer:
+    """
+    Normalize tweet texts before analysis, in a single pass of a precompiled regular expression.
+
+    Hashtag symbols, retweet markers, URLs and mentions are always removed, as by clean_text. With the default
+    parameters, the result is identical to clean_text.
+
+    Parameters
+    ----------
+    url_token (str): if given, URLs are replaced with this token (e.g. 'URL') instead of being removed. Default is None.
+    emoji (str): either 'keep' (default), 'remove' to remove emoji, or 'name' to replace each emoji with its Unicode name (e.g. 'smiling face with smiling eyes'), which lexicon-based analyzers can score.
+    fold_whitespace (bool): whether to replace each run of whitespace with a single space and strip leading and trailing whitespace. Default is False.
+    """
+    def __init__(self, url_token: str = None, emoji='keep', fold_whitespace=False):
+        if emoji not in EMOJI_CHOICES:
+            raise ValueError(f"emoji must be one of {list(EMOJI_CHOICES)}, got '{emoji}'")
+        self.url_token = url_token
+        self.emoji = emoji
+        self.fold_whitespace = fold_whitespace
+        self._default = url_token is None and emoji == 'keep'
+        self._regex = BASE_REGEX if emoji == 'keep' else re.compile(f'{BASE_PATTERN}|({EMOJI_PATTERN})')
+
+    def _replace(self, match):
+        group = match.lastindex
+        if group == 3 and self.url_token is not None:
+            return self.url_token
+        if group == 5:
+            return '' if self.emoji == 'remove' else _emoji_name(match.group(5))
+        return ''
+
+    def __call__(self, text: str) -> str:
+        """
+        Normalized version of text.
+        """
+        text = self._regex.sub('' if self._default else self._replace, text)
+        if self.fold_whitespace:
+            text = ' '.join(text.split())
+        return text
+
+    def __repr__(self):
+        return f"TextNormalizer(url_token={self.url_token!r}, emoji={self.emoji!r}, fold_whitespace={self.fold_whitespace!r})"
+
+
+DEFAULT_NORMALIZER = TextNormalizer()
+
+
+def normalize_tweets(tweets, normalizer: TextNormalizer = None) -> List[str]:
+    """
+    Normalized texts of a list of tweets, computing them only for the tweets that were not normalized yet.
+
+    Parameters
+    ----------
+    tweets (List[NLPTweet]): tweets to normalize. Their 'normalized' attribute is set.
+    normalizer (TextNormalizer): if given, all the tweets are normalized again with it. Default is to reuse the normalized text of each tweet, if any, or else to apply DEFAULT_NORMALIZER.
+
+    Returns
+    -------
+    texts (List[str]): normalized texts, in the same order as tweets.
+    """
+    texts = []
+    for tweet in tweets:
+        text = None if normalizer is not None else tweet.get('normalized')
+        if text is None:
+            text = tweet.normalized = (normalizer or DEFAULT_NORMALIZER)(tweet.text)
+        texts.append(text)
+    return texts
@@ -0,0 +1,123 @@
+"""
+Rate-limit aware scheduling of Tweepy search requests.
+
+Twitter reports, in the headers of each response, how many requests are left in the current rate-limit window
+('x-rate-limit-remaining') and when the window resets ('x-rate-limit-reset', as a Unix timestamp). The scheduler
+keeps track of these values for each set of credentials, sends each request through a set of credentials that
+still has budget left and, only when all of them are exhausted, sleeps until the earliest reset.
+"""
+import time
+from typing import List
+
+from .stats import count, record
+
+# fallback wait when a rate-limit error does not carry a reset time, as documented by Twitter
+DEFAULT_WINDOW = 15 * 60
+
+
+def _header(response, name):
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        return None
+    value = headers.get(name)
+    return int(value) if value is not None else None
+
+
+class RateLimitScheduler:
+    """
+    Send search requests through several authenticated Tweepy APIs, rotating among them to respect rate limits.
+
+    Parameters
+    ----------
+    apis (List[tweepy.API]): authenticated APIs, e.g. one per set of credentials.
+    quiet (bool): whether to suppress messages when waiting for a rate limit to reset. Default is False.
+    clock (Callable[[], float]): function returning the current Unix time. Default is time.time.
+    sleep (Callable[[float], None]): function used to wait. Default is time.sleep.
+
+    Attributes
+    ----------
+    wait_time (float): total number of seconds spent waiting for rate limits to reset.
+    n_rate_limited (int): number of requests rejected because of rate limits.
+    n_requests (int): number of successful requests.
+    """
+    def __init__(self, apis: List, quiet=False, clock=time.time, sleep=time.sleep):
+        if not apis:
+            raise ValueError("at least one API is required")
+        self.apis = list(apis)
+        self.quiet = quiet
+        self._clock = clock
+        self._sleep = sleep
+        # None means unknown, i.e. the API was not used yet
+        self._remaining = [None] * len(self.apis)
+        self._reset = [0.0] * len(self.apis)
+        self.wait_time = 0.0
+        self.n_rate_limited = 0
+        self.n_requests = 0
+
+    def _available(self, i, now):
+        return self._remaining[i] is None or self._remaining[i] > 0 or self._reset[i] <= now
+
+    def acquire(self):
+        """
+        Index of the API with the largest known budget, sleeping until the earliest reset if all of them are exhausted.
+        """
+        now = self._clock()
+        available = [i for i in range(len(self.apis)) if self._available(i, now)]
+        if not available:
+            i = min(range(len(self.apis)), key=lambda i: self._reset[i])
+            wait = max(0.0, self._reset[i] - now) + 1  # reset times have a 1 second resolution
+            if not self.quiet:
+                print(f"Reached Tweepy API rate limit for all credentials. Trying again in {wait:.0f} seconds. For more information, see https://developer.twitter.com/en/docs/twitter-api/v1/rate-limits.")
+            with record('rate_limit_wait'):
+                self._sleep(wait)
+            self.wait_time += wait
+            self._remaining[i] = None
+            return i
+
+        def budget(i):
+            if self._remaining[i] is None or self._reset[i] <= now:
+                return float('inf')
+            return self._remaining[i]
+        return max(available, key=budget)
+
+    def update(self, i, response):
+        """
+        Record the budget left for API i according to the headers of its last response.
+        """
+        remaining = _header(response, 'x-rate-limit-remaining')
+        reset = _header(response, 'x-rate-limit-reset')
+        if remaining is not None:
+            self._remaining[i] = remaining
+        if reset is not None:
+            self._reset[i] = reset
+
+    def rate_limited(self, i, response):
+        """
+        Record that API i exceeded its rate limit.
+        """
+        self.n_rate_limited += 1
+        count('rate_limited_requests')
+        self._remaining[i] = 0
+        reset = _header(response, 'x-rate-limit-reset')
+        self._reset[i] = reset if reset is not None else self._clock() + DEFAULT_WINDOW
+
+    def search(self, **kwargs):
+        """
+        Call search_tweets with the given arguments on the best available API, retrying on rate-limit errors.
+        """
+        import tweepy as tw
+
+        while True:
+            i = self.acquire()
+            api = self.apis[i]
+            try:
+                results = api.search_tweets(**kwargs)
+            except tw.TooManyRequests as e:
+                self.rate_limited(i, e.response)
+                continue
+            self.n_requests += 1
+            self.update(i, getattr(api, 'last_response', None))
+            return results
+
+    def stats(self):
+        return {'requests': self.n_requests, 'rate_limited': self.n_rate_limited, 'wait_time': self.wait_time}
@@ -0,0 +1,380 @@
+"""
+Recording and replay of search results, for offline testing and load testing.
+
+Searches reach Twitter through two source backends: Snscrape scrapers, created by the scraper factory passed to
+iter_tweets_sn (sntwitter.TwitterSearchScraper by default), and Tweepy APIs, used through the RateLimitScheduler
+passed to iter_tweets_tweepy, which only need a search_tweets method. A Recorder wraps the real backends to store
+the raw pages they download (the JSON returned by Twitter, before any parsing) in a gzip-compressed JSON Lines
+file, and a Replay serves these pages back without network access. Pages are still parsed by Snscrape and Tweepy,
+so the whole pipeline runs as it would online.
+
+A Replay can reproduce the recorded response times, scaled by a speed factor, add latency to every request, and
+reject requests with rate-limit errors, either beyond a number of requests per window or at random with a fixed
+seed. This makes throughput, backpressure and retries measurable deterministically, e.g. on CI machines. Fixture
+files can also be written from synthetic tweets with write_fixture, without recording anything.
+
+Pages are looked up by query and position: Snscrape pages by search criteria (see sn_criteria) and pagination
+cursor, Tweepy pages by query (see tweepy_query) and max_id. Replayed searches must therefore use the same
+arguments as the recorded ones, including explicit dates, since the default dates depend on the current day.
+Once the recorded pages of a query are exhausted, the search ends as if Twitter had no more results.
+"""
+import email.utils
+import gzip
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Union
+
+from .stats import count
+
+SOURCES = ('sn', 'tweepy')
+# default length of rate-limit windows, in seconds, as documented by Twitter
+DEFAULT_WINDOW = 15 * 60
+
+_EMPTY_SN_PAGE = {'globalObjects': {'tweets': {}, 'users': {}}, 'timeline': {'instructions': []}}
+
+
+class _RateLimited(Exception):
+    def __init__(self, headers):
+        super().__init__("rate limited")
+        self.headers = headers
+
+
+class _Response:
+    """
+    Stand-in for the requests.Response of a Tweepy request, carrying rate-limit headers.
+    """
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.reason = "Too Many Requests" if status_code == 429 else "OK"
+        self.headers = headers
+
+    def json(self):
+        return {}
+
+
+@lru_cache(maxsize=None)
+def _sn_scrapers():
+    # Snscrape is slow to import, so the scraper classes are created on first use
+    import snscrape.base
+    import snscrape.modules.twitter as sntwitter
+
+    class RecordingScraper(sntwitter.TwitterSearchScraper):
+        def __init__(self, criteria, recorder, **kwargs):
+            super().__init__(criteria, **kwargs)
+            self._criteria = criteria
+            self._recorder = recorder
+
+        def _get_api_data(self, endpoint, params):
+            start = time.perf_counter()
+            page = super()._get_api_data(endpoint, params)
+            self._recorder.add({'source': 'sn', 'query': self._criteria, 'cursor': params.get('cursor'),
+                                'seconds': time.perf_counter() - start, 'page': page})
+            return page
+
+    class ReplayScraper(sntwitter.TwitterSearchScraper):
+        def __init__(self, criteria, replay, **kwargs):
+            super().__init__(criteria, **kwargs)
+            self._criteria = criteria
+            self._replay = replay
+
+        def _get_api_data(self, endpoint, params):
+            # rate-limited requests are retried with the same backoff as Snscrape
+            for attempt in range(self._retries + 1):
+                try:
+                    return self._replay.serve('sn', self._criteria, params.get('cursor'))
+                except _RateLimited:
+                    count('rate_limited_requests')
+                    if attempt < self._retries:
+                        self._replay.sleep(1.0 * 2 ** attempt)
+            raise snscrape.base.ScraperException(
+                f"{self._retries + 1} requests for '{self._criteria}' were rate limited, giving up.")
+
+    return RecordingScraper, ReplayScraper
+
+
+class _RecordingAPI:
+    def __init__(self, api, recorder):
+        self._api = api
+        self._recorder = recorder
+
+    @property
+    def last_response(self):
+        return getattr(self._api, 'last_response', None)
+
+    def search_tweets(self, **kwargs):
+        start = time.perf_counter()
+        results = self._api.search_tweets(**kwargs)
+        self._recorder.add({'source': 'tweepy', 'query': kwargs['q'], 'max_id': kwargs.get('max_id'),
+                            'seconds': time.perf_counter() - start, 'page': [status._json for status in results]})
+        return results
+
+
+class _ReplayAPI:
+    def __init__(self, replay):
+        self._replay = replay
+        self.last_response = None
+
+    def search_tweets(self, **kwargs):
+        import tweepy as tw
+
+        try:
+            page = self._replay.serve('tweepy', kwargs['q'], kwargs.get('max_id'))
+        except _RateLimited as e:
+            raise tw.TooManyRequests(_Response(429, e.headers)) from None
+        self.last_response = _Response(200, self._replay.headers())
+        return tw.models.Status.parse_list(None, page)
+
+
+class Recorder:
+    """
+    Record the raw pages downloaded by searches to a gzip-compressed JSON Lines file, to be served by a Replay.
+    Pages are appended to the file if it exists, and can be recorded by several searches at once.
+
+    Example
+    -------
+    with Recorder("pages.jsonl.gz") as recorder:
+        tweets = list(iter_tweets_sn("us elections", since="2020-11-01", until="2020-11-08", scraper=recorder.sn_scraper))
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the file.
+
+    Attributes
+    ----------
+    n_pages (int): number of pages recorded.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.n_pages = 0
+        self._lock = threading.Lock()
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+
+    def add(self, entry: dict):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self.n_pages += 1
+
+    def sn_scraper(self, criteria: str):
+        """
+        Snscrape scraper recording the pages it downloads, to be passed as the scraper factory of iter_tweets_sn.
+        """
+        return _sn_scrapers()[0](criteria, self)
+
+    def tweepy_api(self, api):
+        """
+        Wrap an authenticated tweepy.API so that the pages it downloads are recorded, e.g. to create a RateLimitScheduler.
+        """
+        return _RecordingAPI(api, self)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Replay:
+    """
+    Serve the pages of a file written by Recorder or write_fixture in place of Twitter.
+
+    Example
+    -------
+    replay = Replay("pages.jsonl.gz", speed=10, rate_limit=180)
+    tweets = iter_tweets_tweepy("us elections", until="2020-11-08", scheduler=RateLimitScheduler([replay.tweepy_api()]))
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the file.
+    speed (float): factor by which the recorded response time of each page is divided, e.g. 1 to replay pages at the pace they were recorded, or 10 to replay them 10 times faster. Default is None, i.e. pages are served without delay.
+    latency (float): number of seconds added to the response time of every request, including rejected ones. Default is 0.
+    rate_limit (int): maximum number of requests per window, beyond which requests are rejected with rate-limit errors until the window resets. Tweepy responses carry the corresponding 'x-rate-limit-remaining' and 'x-rate-limit-reset' headers. Default is no limit.
+    window (float): length of rate-limit windows, in seconds. Default is 900, as for Twitter.
+    error_rate (float): probability that a request is rejected with a rate-limit error, independently of rate_limit. Default is 0.
+    seed (int): seed of the random rejections. Default is 0.
+    clock (Callable[[], float]): function returning the current Unix time, used for rate-limit windows. Default is time.time.
+    sleep (Callable[[float], None]): function used to wait. Default is time.sleep.
+
+    Attributes
+    ----------
+    n_requests (int): number of requests served, including rejected ones.
+    n_rate_limited (int): number of requests rejected with rate-limit errors.
+    """
+    def __init__(self, path: Union[str, Path], speed=None, latency=0.0, rate_limit=None, window=DEFAULT_WINDOW, error_rate=0.0, seed=0, clock=time.time, sleep=time.sleep):
+        if speed is not None and speed <= 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        if latency < 0:
+            raise ValueError(f"latency must be non-negative, got {latency}")
+        if rate_limit is not None and rate_limit < 1:
+            raise ValueError(f"rate_limit must be a positive integer, got {rate_limit}")
+        if not 0 <= error_rate <= 1:
+            raise ValueError(f"error_rate must be between 0 and 1, got {error_rate}")
+        self.speed = speed
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.error_rate = error_rate
+        self.sleep = sleep
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._used = dict()  # requests per rate-limit window
+        self.n_requests = 0
+        self.n_rate_limited = 0
+        # (source, query) -> cursor (Snscrape) or max_id (Tweepy) -> (page, seconds)
+        self._pages = dict()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                key = entry['cursor'] if entry['source'] == 'sn' else entry['max_id']
+                self._pages.setdefault((entry['source'], entry['query']), dict())[key] = (entry['page'], entry['seconds'])
+
+    def queries(self, source: str):
+        """
+        Queries whose pages were recorded for source ('sn' or 'tweepy').
+        """
+        return [query for pages_source, query in self._pages if pages_source == source]
+
+    def headers(self):
+        """
+        Rate-limit headers of Tweepy responses at the current time, if rate_limit is set.
+        """
+        if self.rate_limit is None:
+            return {}
+        window = int(self.clock() // self.window)
+        with self._lock:
+            used = self._used.get(window, 0)
+        return {'x-rate-limit-remaining': str(max(0, self.rate_limit - used)),
+                'x-rate-limit-reset': str(int((window + 1) * self.window))}
+
+    def _rejected(self):
+        # None if the request is accepted, otherwise the time at which it can be retried
+        now = self.clock()
+        if self.rate_limit is not None:
+            window = int(now // self.window)
+            used = self._used.get(window, 0)
+            if used >= self.rate_limit:
+                return (window + 1) * self.window
+            self._used = {window: used + 1}
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            return now + 1
+        return None
+
+    def serve(self, source: str, query: str, key):
+        """
+        Serve the page recorded for source and query at key (the pagination cursor for Snscrape, max_id for Tweepy),
+        waiting for its response time. An empty page is served if key was not recorded.
+
+        Raises
+        ------
+        LookupError: if no page was recorded for the query.
+        """
+        pages = self._pages.get((source, query))
+        if pages is None:
+            raise LookupError(f"no {source} page was recorded for query '{query}', recorded queries are {self.queries(source)}")
+        with self._lock:
+            self.n_requests += 1
+            retry_at = self._rejected()
+            rejected = retry_at is not None
+            if rejected:
+                self.n_rate_limited += 1
+        page, seconds = pages.get(key, (None, 0.0))
+        delay = self.latency + (seconds / self.speed if self.speed is not None and not rejected else 0.0)
+        if delay > 0:
+            self.sleep(delay)
+        if rejected:
+            raise _RateLimited({**self.headers(), 'x-rate-limit-reset': str(int(retry_at))})
+        if page is None:
+            return _EMPTY_SN_PAGE if source == 'sn' else []
+        return page
+
+    def sn_scraper(self, criteria: str):
+        """
+        Snscrape scraper serving the recorded pages, to be passed as the scraper factory of iter_tweets_sn.
+        """
+        return _sn_scrapers()[1](criteria, self)
+
+    def tweepy_api(self):
+        """
+        Stand-in for an authenticated tweepy.API serving the recorded pages, e.g. to create a RateLimitScheduler.
+        """
+        return _ReplayAPI(self)
+
+    def stats(self):
+        return {'requests': self.n_requests, 'rate_limited': self.n_rate_limited}
+
+
+def _sn_user(user, date):
+    return {'screen_name': user.username, 'id_str': str(user.id), 'name': user.displayname or user.username,
+            'description': user.rawDescription or '', 'entities': {'description': {}},
+            'created_at': email.utils.format_datetime(user.created or date),
+            'followers_count': user.followersCount or 0, 'friends_count': user.friendsCount or 0,
+            'statuses_count': user.statusesCount or 0, 'favourites_count': user.favouritesCount or 0,
+            'listed_count': user.listedCount or 0, 'media_count': user.mediaCount or 0,
+            'location': user.location or '', 'profile_image_url_https': user.profileImageUrl or ''}
+
+
+def _sn_tweet(tweet):
+    return {'id_str': str(tweet.id), 'full_text': tweet.content, 'user_id_str': str(tweet.user.id),
+            'entities': {'hashtags': [{'text': hashtag} for hashtag in tweet.hashtags or []]},
+            'created_at': email.utils.format_datetime(tweet.date), 'reply_count': tweet.replyCount or 0,
+            'retweet_count': tweet.retweetCount or 0, 'favorite_count': tweet.likeCount or 0,
+            'quote_count': tweet.quoteCount or 0, 'conversation_id_str': str(tweet.conversationId or tweet.id),
+            'lang': tweet.lang, 'source': tweet.source or ''}
+
+
+def _sn_page(tweets, next_cursor):
+    entries = [{'entryId': f'sq-I-t-{tweet.id}', 'content': {'item': {'content': {'tweet': {'id': str(tweet.id)}}}}}
+               for tweet in tweets]
+    if next_cursor is not None:
+        entries.append({'entryId': 'sq-cursor-bottom', 'content': {'operation': {'cursor': {'value': next_cursor}}}})
+    return {'globalObjects': {'tweets': {str(tweet.id): _sn_tweet(tweet) for tweet in tweets},
+                              'users': {str(tweet.user.id): _sn_user(tweet.user, tweet.date) for tweet in tweets}},
+            'timeline': {'instructions': [{'addEntries': {'entries': entries}}]}}
+
+
+def write_fixture(path: Union[str, Path], tweets: Iterable, source: str, query: str, page_size=100, seconds=0.0) -> int:
+    """
+    Write tweets as the raw pages of a search, to be served by a Replay. Pages are appended to the file if it exists.
+
+    Parameters
+    ----------
+    path (Union[str, Path]): location of the file.
+    tweets (Iterable[Union[sntwitter.Tweet, tweepy.models.Status]]): tweets returned by the search, from the newest to the oldest, e.g. generated synthetically.
+    source (str): 'sn' for sntwitter.Tweet objects, served to Snscrape searches, or 'tweepy' for tweepy.models.Status objects, served to Tweepy searches.
+    query (str): query sent by the search, as returned by sn_criteria or tweepy_query.
+    page_size (int): number of tweets per page. Default is 100, as for Twitter.
+    seconds (float): response time recorded for each page, which a Replay with a speed divides. Default is 0.
+
+    Returns
+    -------
+    n_pages (int): number of pages written.
+    """
+    if source not in SOURCES:
+        raise ValueError(f"source must be one of {list(SOURCES)}, got '{source}'")
+    tweets = list(tweets)
+    n_pages = 0
+    with Recorder(path) as recorder:
+        for start in range(0, len(tweets), page_size):
+            page = tweets[start:start + page_size]
+            if source == 'sn':
+                # pages are chained by cursors, as in Twitter's responses
+                cursor = f"page-{n_pages}" if n_pages > 0 else None
+                next_cursor = f"page-{n_pages + 1}" if start + page_size < len(tweets) else None
+                recorder.add({'source': 'sn', 'query': query, 'cursor': cursor, 'seconds': seconds,
+                              'page': _sn_page(page, next_cursor)})
+            else:
+                # Tweepy searches request the page following each page with max_id, see iter_tweets_tweepy
+                max_id = tweets[start - 1].id - 1 if start > 0 else None
+                recorder.add({'source': 'tweepy', 'query': query, 'max_id': max_id, 'seconds': seconds,
+                              'page': [status._json for status in page]})
+            n_pages += 1
+    return n_pages
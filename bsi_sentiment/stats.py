@@ -0,0 +1,234 @@
+"""
+Instrumentation of the download -> analyze -> write pipeline.
+
+While a PipelineStats is active (see PipelineStats.__enter__), the pipeline records, for each stage, the time spent
+in it, the number of items it processed and the number of times it was entered, together with counters such as
+cache hits or rate-limit errors. Stages are:
+
+    scrape: downloading and parsing search results (Snscrape pagination or Tweepy search requests)
+    rate_limit_wait: waiting for Tweepy rate limits to reset
+    construct: converting search results to NLPTweet
+    read: reading tweets from .csv or .parquet files to analyze them again
+    normalize: normalizing texts before analysis
+    dedup: grouping duplicate texts
+    cache: looking up and storing scores in the sentiment cache
+    analyze: scoring texts, in the current process or in worker processes
+    write: writing tweets to .csv or .parquet files
+    aggregate: reading and aggregating the tweets of a file
+
+Stages can be nested (e.g. constructing an NLPTweet pulls the next result from the scraper): the time of each stage
+excludes the time spent in the stages nested in it, so that the times of all stages add up to the time spent in the
+pipeline. Stages running in several threads at once (e.g. the searches of batch mode) add up the time of each thread.
+
+When no PipelineStats is active, recording costs next to nothing (timed() returns iterables as they are), so the
+pipeline does not need to know whether it is being measured.
+"""
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+
+_active = None
+
+
+class _StageStats:
+    __slots__ = ('seconds', 'items', 'calls')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.items = 0
+        self.calls = 0
+
+
+def peak_rss():
+    """
+    Peak resident set size of the current process and of its terminated child processes (e.g. the workers of a
+    process pool once it is shut down), in bytes, or (None, None) if the platform does not report it.
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None, None
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+class PipelineStats:
+    """
+    Per-stage timings, throughput, peak memory usage and counters of the pipeline, recorded while it is active.
+
+    Example
+    -------
+    with PipelineStats() as stats:
+        tweets = search_tweets_sn("us elections", max_tweets=1000)
+        tweets.get_sentiment()
+    stats.to_json("stats.json")
+
+    Attributes
+    ----------
+    counters (Dict[str, float]): counters incremented by the pipeline, e.g. 'cache_hits', 'cache_misses', 'duplicates' or 'rate_limited_requests'.
+    """
+    def __init__(self):
+        self.counters = dict()
+        self._stages = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = None
+        self._end = None
+        self._previous = None
+
+    def __enter__(self):
+        global _active
+        self._previous, _active = _active, self
+        self._start = time.perf_counter()
+        self._end = None
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        self._end = time.perf_counter()
+        _active = self._previous
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def _push(self):
+        # time spent in nested stages, subtracted from the time of the enclosing one
+        self._stack().append(0.0)
+
+    def _pop(self, name, elapsed, items, calls=1):
+        stack = self._stack()
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = _StageStats()
+            stage.seconds += elapsed - nested
+            stage.items += items
+            stage.calls += calls
+
+    def count(self, name: str, n: float = 1):
+        """
+        Increment the counter name by n.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @property
+    def wall_seconds(self):
+        if self._start is None:
+            return 0.0
+        return (self._end if self._end is not None else time.perf_counter()) - self._start
+
+    def to_dict(self) -> dict:
+        """
+        Statistics recorded so far, as a JSON-serializable dict.
+        """
+        rss, children_rss = peak_rss()
+        with self._lock:
+            stages = {name: {'seconds': stage.seconds, 'items': stage.items, 'calls': stage.calls,
+                             'items_per_sec': stage.items / stage.seconds if stage.seconds > 0 else None}
+                      for name, stage in self._stages.items()}
+            counters = dict(self.counters)
+        return {'wall_seconds': self.wall_seconds, 'peak_rss_bytes': rss, 'peak_rss_children_bytes': children_rss,
+                'stages': stages, 'counters': counters}
+
+    def to_json(self, path: Union[str, Path], **extra):
+        """
+        Write the statistics to a JSON file, together with any extra keyword arguments (e.g. the command run).
+        """
+        with open(path, 'w') as f:
+            json.dump({**extra, **self.to_dict()}, f, indent=2)
+
+
+class _Stage:
+    """
+    Context manager recording the time spent in its block. Its items attribute can be set within the block, e.g.
+    once the number of items processed is known.
+    """
+    __slots__ = ('stats', 'name', 'items', '_start')
+
+    def __init__(self, stats, name, items):
+        self.stats = stats
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        if self.stats is not None:
+            self.stats._push()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.stats is not None:
+            self.stats._pop(self.name, time.perf_counter() - self._start, self.items)
+        return False
+
+
+def active() -> PipelineStats:
+    """
+    The PipelineStats being recorded, or None.
+    """
+    return _active
+
+
+def record(name: str, items: int = 0) -> _Stage:
+    """
+    Context manager recording the time spent in its block as stage name, processing items items.
+    """
+    return _Stage(_active, name, items)
+
+
+def timed(name: str, iterable: Iterable) -> Iterator:
+    """
+    Wrap an iterable so that the time spent producing each of its items is recorded as stage name.
+    The iterable is returned as is when no PipelineStats is active.
+    """
+    stats = _active
+    if stats is None:
+        return iterable
+    return _timed(stats, name, iterable)
+
+
+def _timed(stats, name, iterable):
+    iterator = iter(iterable)
+    clock = time.perf_counter
+    first = True
+    try:
+        while True:
+            stats._push()
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stats._pop(name, clock() - start, 0, calls=1 if first else 0)
+                return
+            except BaseException:
+                stats._pop(name, clock() - start, 0, calls=1 if first else 0)
+                raise
+            stats._pop(name, clock() - start, 1, calls=1 if first else 0)
+            first = False
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+def count(name: str, n: float = 1):
+    """
+    Increment the counter name of the active PipelineStats, if any.
+    """
+    stats = _active
+    if stats is not None:
+        stats.count(name, n)
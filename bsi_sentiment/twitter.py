@@ -1,23 +1,143 @@
-import csv
 import datetime
 import json
-import re
+import math
+import os
+import queue
 import sys
+import threading
 import time
-from itertools import islice
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice, repeat, takewhile
 from pathlib import Path
-from typing import Iterable, List, Union
+from typing import TYPE_CHECKING, Iterable, List, Union
 
+from .analyzers import get_analyzer, method_key
+from .preprocess import BASE_REGEX, normalize_tweets
+from .stats import count, record, timed
 from .utils import load_nltk
 
-import snscrape.modules.twitter as sntwitter
-import tweepy as tw
-
-from textblob import TextBlob
-from textblob.sentiments import NaiveBayesAnalyzer
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from tqdm import tqdm
 
+if TYPE_CHECKING:
+    import snscrape.modules.twitter as sntwitter
+    import tweepy
+
+# Snscrape and Tweepy are slow to import, so they are imported only by the functions using them.
+SN_MODULE = 'snscrape.modules.twitter'
+TWEEPY_MODULE = 'tweepy'
+
+
+def clean_text(text):
+    """
+    Remove hashtag symbols, retweet markers, URLs and mentions from a tweet text before analysis.
+    See bsi_sentiment.preprocess.TextNormalizer for further normalization rules.
+    """
+    return BASE_REGEX.sub('', text)
+
+
+# number of texts passed at a time to Analyzer.score_batch when scoring in the current process
+_SCORE_BATCH = 1000
+
+
+def _init_worker(method):
+    """
+    Create the analyzer engine of a worker process once, when the process starts.
+    """
+    get_analyzer(method)
+
+
+def _score_chunk(method, texts):
+    """
+    Score a chunk of normalized tweet texts inside a worker process.
+    """
+    return get_analyzer(method).score_batch(texts)
+
+
+def _score_in_pool(executor, tweets, texts, method, chunksize, pbar=None):
+    """
+    Score a list of NLPTweet, whose normalized texts are given, in chunks using a process pool created with
+    _init_worker as initializer.
+    """
+    chunks = [tweets[i:i + chunksize] for i in range(0, len(tweets), chunksize)]
+    text_chunks = (texts[i:i + chunksize] for i in range(0, len(texts), chunksize))
+    # executor.map yields results in submission order, so scores are merged back in the original order
+    for chunk, scores in zip(chunks, executor.map(_score_chunk, repeat(method), text_chunks)):
+        for tweet, tweet_scores in zip(chunk, scores):
+            tweet.update(tweet_scores)
+        if pbar is not None:
+            pbar.update(len(chunk))
+
+
+def _score_here(tweets, texts, method, pbar=None):
+    """
+    Score tweets in the current process, _SCORE_BATCH texts at a time.
+    """
+    analyzer = get_analyzer(method)
+    for i in range(0, len(tweets), _SCORE_BATCH):
+        chunk = tweets[i:i + _SCORE_BATCH]
+        for tweet, scores in zip(chunk, analyzer.score_batch(texts[i:i + _SCORE_BATCH])):
+            tweet.update(scores)
+        if pbar is not None:
+            pbar.update(len(chunk))
+
+
+def _collapse_duplicates(tweets, texts, method, dedup, pbar=None):
+    """
+    Representatives of the duplicate groups of tweets, their texts and the members of each group, see
+    Deduplicator.collapse.
+    """
+    n_tweets = len(tweets)
+    with record('dedup', n_tweets):
+        tweets, texts, members = dedup.collapse(tweets, texts, method)
+    count('duplicates', n_tweets - len(tweets))
+    if pbar is not None:
+        pbar.update(n_tweets - len(tweets))
+    return tweets, texts, members
+
+
+def _cache_misses(tweets, texts, method, cache, pbar=None):
+    """
+    Tweets whose scores are not found in cache, and their texts. The scores of the others are set from cache.
+    """
+    with record('cache', len(tweets)):
+        misses = cache.lookup(tweets, method, texts)
+    count('cache_hits', len(tweets) - len(misses))
+    count('cache_misses', len(misses))
+    if pbar is not None:
+        pbar.update(len(tweets) - len(misses))
+    if len(misses) < len(tweets):
+        missed = set(map(id, misses))
+        texts = [text for tweet, text in zip(tweets, texts) if id(tweet) in missed]
+    return misses, texts
+
+
+def _score_tweets(tweets, method, executor=None, chunksize=1000, cache=None, pbar=None, normalizer=None, dedup=None):
+    """
+    Score a list of NLPTweet in place, either in the current process or, if executor is given, in a process pool.
+    Scores found in cache are reused, and new scores are stored in it. Each text is normalized only once, even
+    when several methods are combined, and only if it was not normalized before (see normalize_tweets).
+    If dedup is given, only one tweet of each duplicate group is scored (see bsi_sentiment.dedup).
+    """
+    with record('normalize', len(tweets)):
+        texts = normalize_tweets(tweets, normalizer)
+    if dedup is not None:
+        tweets, texts, members = _collapse_duplicates(tweets, texts, method, dedup, pbar)
+        representatives = tweets
+    if cache is not None:
+        tweets, texts = _cache_misses(tweets, texts, method, cache, pbar)
+    with record('analyze', len(tweets)):
+        if executor is not None:
+            _score_in_pool(executor, tweets, texts, method, chunksize, pbar)
+        else:
+            _score_here(tweets, texts, method, pbar)
+    if cache is not None:
+        with record('cache'):
+            cache.store(tweets, method, texts)
+    if dedup is not None:
+        with record('dedup'):
+            dedup.fan_out(representatives, members, method, get_analyzer(method).columns)
+
 
 class NLPTweet:
     """
@@ -36,18 +156,34 @@ class NLPTweet:
     username(str)
     to (str)
     text (str)
-    date (datetime) in UTC
+    date (str): date of the tweet in UTC, formatted as yyyy-mm-dd
+    time (str): time of the tweet in UTC, formatted as HH:MM:SS
     retweets (int)
     favorites (int)
     mentions (str)
     hashtags (str)
     geo (str)
     sentiment -> update description once method implemented
+    normalized (str): text normalized for analysis, set by the first analysis (see bsi_sentiment.preprocess). It is not part of keys(), so it is not written to output files.
+
+    Records use __slots__ rather than a per-instance __dict__ to keep memory usage low on large searches.
+    Fields that are not listed in NLPTweet.FIELDS (e.g. the metrics of a custom analyzer) can still be set
+    through update() or item assignment, and are then stored in a small dict that is created only when needed.
+    Fields and normalized are also accessible as tweet[col], as in a dict, and keys() lists the fields that are set.
     """
-    def __init__(self, tweet: Union[None, tw.models.Status, sntwitter.Tweet] = None):
-        if isinstance(tweet, tw.models.Status):
+    FIELDS = ('id', 'permalink', 'username', 'to', 'text', 'date', 'time', 'retweets', 'favorites', 'mentions', 'hashtags', 'geo',
+              'polarity', 'subjectivity', 'pos_w', 'neu_w', 'neg_w', 'classification', 'p_pos', 'p_neg')
+    __slots__ = FIELDS + ('normalized', '_extra')
+
+    def __init__(self, tweet: Union[None, 'tweepy.models.Status', 'sntwitter.Tweet'] = None):
+        if tweet is None:
+            return
+        # a tweet can only be an instance of a backend class if the backend was already imported
+        tw = sys.modules.get(TWEEPY_MODULE)
+        sntwitter = sys.modules.get(SN_MODULE)
+        if tw is not None and isinstance(tweet, tw.models.Status):
             self._from_tweepy(tweet)
-        elif isinstance(tweet, sntwitter.Tweet):
+        elif sntwitter is not None and isinstance(tweet, sntwitter.Tweet):
             self._from_sn(tweet)
 
     def _from_tweepy(self, tweet):
@@ -57,8 +193,9 @@ class NLPTweet:
         # if multiple reply_to, take first like https://github.com/Mottl/GetOldTweets3/blob/master/GetOldTweets3/manager/TweetManager.py
         self.to = tweet.in_reply_to_screen_name[0] if tweet.in_reply_to_screen_name is not None else None
         self.text = tweet.full_text
-        self.date = datetime.datetime.strftime(
-            tweet.created_at.astimezone(datetime.timezone.utc), '%Y-%m-%d')
+        created_at = tweet.created_at.astimezone(datetime.timezone.utc)
+        self.date = created_at.strftime('%Y-%m-%d')
+        self.time = created_at.strftime('%H:%M:%S')
         self.retweets = tweet.retweet_count
         self.favorites = tweet.favorite_count
         self.mentions = ' '.join([user['screen_name']
@@ -72,24 +209,82 @@ class NLPTweet:
         self.permalink = tweet.url
         self.username = tweet.user.username
         self.text = tweet.content
-        self.date = datetime.datetime.strftime(
-            tweet.date.astimezone(datetime.timezone.utc), '%Y-%m-%d')
+        date = tweet.date.astimezone(datetime.timezone.utc)
+        self.date = date.strftime('%Y-%m-%d')
+        self.time = date.strftime('%H:%M:%S')
+
+    def __getattr__(self, name):
+        # only called when name is not a field that is set, so look it up among the extra fields
+        if name == '_extra':
+            raise AttributeError(name)
+        try:
+            return self._extra[name]
+        except (AttributeError, KeyError):
+            raise AttributeError(f"'NLPTweet' object has no attribute '{name}'") from None
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str(self.to_dict())
 
     def __getitem__(self, k):
-        return self.__dict__[k]
+        # only fields are items, not methods or private attributes
+        try:
+            return getattr(self, k) if k in _NLPTWEET_KEYS else self._extra[k]
+        except AttributeError:
+            raise KeyError(k) from None
+
+    def __setitem__(self, k, v):
+        if k in _NLPTWEET_FIELDS:
+            setattr(self, k, v)
+        else:
+            try:
+                self._extra[k] = v
+            except AttributeError:
+                self._extra = {k: v}
+
+    def __contains__(self, k):
+        try:
+            self[k]
+        except KeyError:
+            return False
+        return True
 
     def __copy__(self):
-        copy = NLPTweet()
-        copy.__dict__ = self.__dict__.copy()
-        return copy
+        return NLPTweet.from_dict(self.to_dict())
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.update(state)
+
+    def keys(self):
+        """
+        Names of the fields that are set, in the order of NLPTweet.FIELDS followed by any extra field.
+        """
+        keys = [k for k in NLPTweet.FIELDS if hasattr(self, k)]
+        try:
+            keys.extend(self._extra)
+        except AttributeError:
+            pass
+        return keys
+
+    def get(self, k, default=None):
+        try:
+            return self[k]
+        except KeyError:
+            return default
+
+    def update(self, d):
+        for k, v in d.items():
+            self[k] = v
+
+    def to_dict(self):
+        return {k: self[k] for k in self.keys()}
 
     @staticmethod
     def from_dict(d):
         tweet = NLPTweet()
-        tweet.__dict__ = d.copy()
+        tweet.update(d)
         return tweet
 
     def get_sentiment(self, method="vader"):
@@ -101,27 +296,77 @@ class NLPTweet:
         method (str): method to use for sentiment analysis. Possible choices are:
             - 'vader'(default): Give a sentiment intensity score to sentences, according to VADER sentiment analysis tool. Metrics stored are 'polarity', 'pos_w', 'neu_w', 'neg_w'.
             - 'textblob-pa': Uses PatternAnalyzer from textblob to compute 'polarity' (in range [-1.0, 1.0]) and 'subjectivity' (in range [0.0,1.0]).
-            - 'textblob-nb': Uses NaiveBayesAnalyzer from textblob to classify the sentiment. Computes also 'p_pos' and 'p_neg', as probabilities.
+            - 'textblob-nb': Classifies the sentiment as NaiveBayesAnalyzer from textblob does. Computes also 'p_pos' and 'p_neg', as probabilities.
+            Further methods can be made available through bsi_sentiment.analyzers.register_analyzer.
+            A list of methods can also be given, in which case the text is preprocessed once and scored by each of them, and the name of each metric is prefixed with the name of its method (e.g. 'vader_polarity', 'textblob_pa_polarity').
+        The analyzer engine is shared across tweets, so it is created only the first time a method is used.
         """       
-        processed_text = re.sub(
-            r'(#)|(^RT[\s]+)|(https?:\S+)|(@[A-Za-z0-9_]+)', '', self.text)
-        # select method chosen
-        if method == "textblob-pa":
-            processed_text = TextBlob(processed_text)
-            self.polarity = processed_text.sentiment.polarity
-            self.subjectivity = processed_text.sentiment.subjectivity
-        elif method == "textblob-nb":
-            processed_text = TextBlob(processed_text, analyzer=NaiveBayesAnalyzer())
-            self.classification = processed_text.sentiment.classification
-            self.p_pos = processed_text.sentiment.p_pos
-            self.p_neg = processed_text.sentiment.p_neg
-        elif method == "vader":
-            analyzer = SentimentIntensityAnalyzer()
-            scores = analyzer.polarity_scores(processed_text)
-            self.polarity = scores['compound']
-            self.pos_w = scores['pos']
-            self.neu_w = scores['neu']
-            self.neg_w = scores['neg']
+        self.update(get_analyzer(method).score(normalize_tweets([self])[0]))
+
+
+_NLPTWEET_FIELDS = frozenset(NLPTweet.FIELDS)
+# names accessible as items besides the extra fields, including normalized which is not part of keys()
+_NLPTWEET_KEYS = _NLPTWEET_FIELDS | {'normalized'}
+_FIELD_ORDER = {field: i for i, field in enumerate(NLPTweet.FIELDS)}
+
+# fields set by NLPTweet for the results of each backend
+BACKEND_FIELDS = {
+    'sn': ('id', 'permalink', 'username', 'text', 'date', 'time'),
+    'tweepy': ('id', 'permalink', 'username', 'to', 'text', 'date', 'time', 'retweets', 'favorites', 'mentions', 'hashtags', 'geo'),
+}
+
+
+def merge_columns(*columns: Iterable[str]) -> List[str]:
+    """
+    Union of lists of columns, in the order of NLPTweet.keys(): fields of NLPTweet.FIELDS first, then other columns
+    in the order in which they are first seen.
+    """
+    merged = list(dict.fromkeys(chain.from_iterable(columns)))
+    return sorted(merged, key=lambda col: _FIELD_ORDER.get(col, len(_FIELD_ORDER)))
+
+
+def output_columns(backends=('sn',), method=None, dedup=False, extra=()) -> List[str]:
+    """
+    Declared columns of the tweets found by searches, as written to output files.
+
+    Parameters
+    ----------
+    backends (Union[str, Iterable[str]]): backend(s) used by the searches, 'sn' and/or 'tweepy'. Default is 'sn'.
+    method (Union[str, List[str]]): method(s) used to score the tweets, if any. Default is None, i.e. tweets are not scored.
+    dedup (bool): whether duplicates were grouped, adding the 'dup_group' column. Default is False.
+    extra (Iterable[str]): other columns, e.g. 'query' for the combined output of several searches.
+
+    Returns
+    -------
+    columns (List[str])
+    """
+    from .analyzers import analyzer_columns
+
+    if isinstance(backends, str):
+        backends = (backends,)
+    for backend in backends:
+        if backend not in BACKEND_FIELDS:
+            raise ValueError(f"backend must be one of {list(BACKEND_FIELDS)}, got '{backend}'")
+    return merge_columns(*(BACKEND_FIELDS[backend] for backend in backends), ('dup_group',) if dedup else (),
+                         analyzer_columns(method) if method is not None else (), extra)
+
+
+def infer_columns(tweets: Iterable[NLPTweet]) -> List[str]:
+    """
+    Union of the fields set on tweets, for tweets whose backend is unknown. This looks up every field of every tweet,
+    so declared columns (see output_columns) are much faster to obtain on large lists.
+    """
+    return merge_columns(*(tweet.keys() for tweet in tweets))
+
+
+def _backend(cls):
+    tw = sys.modules.get(TWEEPY_MODULE)
+    sntwitter = sys.modules.get(SN_MODULE)
+    if tw is not None and issubclass(cls, tw.models.Status):
+        return 'tweepy'
+    if sntwitter is not None and issubclass(cls, sntwitter.Tweet):
+        return 'sn'
+    return None
 
 
 class NLPTweetList:
@@ -130,15 +375,31 @@ class NLPTweetList:
 
     Parameters
     ----------
-    tweets (Iterable[Union[tweepy.models.Status, sntwitter.Tweet]])
+    tweets (Iterable[Union[tweepy.models.Status, sntwitter.Tweet, NLPTweet]])
+    columns (List[str]): columns of the tweets, written by to_csv and to_parquet. Default is the columns declared for the backend(s) of the tweets (see output_columns), or None if some tweets are already NLPTweet objects, in which case the columns are inferred from the tweets when they are written.
+
+    Attributes
+    ----------
+    columns (List[str]): columns of the tweets, updated by get_sentiment with the metrics of the methods used.
     """
 
-    def __init__(self, tweets: Iterable[Union[tw.models.Status, sntwitter.Tweet]], quiet=False, tqdm_total=None):
+    def __init__(self, tweets: Iterable[Union['tweepy.models.Status', 'sntwitter.Tweet', NLPTweet]], quiet=False, tqdm_total=None, columns: List[str] = None):
         if not isinstance(tweets, Iterable):
             raise TypeError(
                 f"tweets must be an Iterable containing instances of either tweepy.models.Status or sntwitter.Tweet, got '{type(tweets).__name__}'")
-        self.tweets = list(map(NLPTweet, tqdm(tweets, desc="Downloading tweets", total=tqdm_total, disable=quiet)))
-        
+        types = set()
+        add_type = types.add
+
+        def convert(tweet):
+            add_type(type(tweet))
+            return tweet if isinstance(tweet, NLPTweet) else NLPTweet(tweet)
+
+        self.tweets = list(map(convert, tqdm(tweets, desc="Downloading tweets", total=tqdm_total, disable=quiet)))
+        if columns is not None:
+            self.columns = list(columns)
+        else:
+            backends = {_backend(cls) for cls in types}
+            self.columns = output_columns(backends) if backends and None not in backends else None
 
     def __getitem__(self, i):
         return self.tweets[i]
@@ -150,49 +411,210 @@ class NLPTweetList:
         for tweet in self.tweets:
             yield tweet
 
-    def get_sentiment(self, method="vader", quiet=False):
+    def column(self, name, typecode=None):
+        """
+        Values of a field across all tweets, e.g. to aggregate scores without iterating over NLPTweet objects.
+
+        Parameters
+        ----------
+        name (str): name of the field, e.g. 'polarity'.
+        typecode (str): if given, values are returned in a typed array.array with this typecode (e.g. 'd' for
+            scores, 'q' for Snscrape ids), which can be wrapped without copies by numpy.frombuffer. Missing values
+            are stored as NaN in float arrays. Default is a list, with None for missing values.
+
+        Returns
+        -------
+        values (Union[list, array.array])
+        """
+        values = [tweet.get(name) for tweet in self.tweets]
+        if typecode is None:
+            return values
+        if typecode in ('f', 'd'):
+            values = [math.nan if value is None else value for value in values]
+        return array(typecode, values)
+
+    def normalize(self, normalizer=None):
+        """
+        Normalize the text of each tweet for analysis, storing it in its 'normalized' attribute.
+        get_sentiment does this automatically for the tweets that were not normalized yet.
+
+        Parameters
+        ----------
+        normalizer (bsi_sentiment.preprocess.TextNormalizer): normalization rules. Default is those of clean_text.
+
+        Returns
+        -------
+        texts (List[str]): normalized texts.
+        """
+        from .preprocess import DEFAULT_NORMALIZER
+        return normalize_tweets(self.tweets, normalizer or DEFAULT_NORMALIZER)
+
+    def get_sentiment(self, method="vader", quiet=False, workers=1, chunksize=None, cache=None, executor=None, normalizer=None, dedup=None):
+        """
+        Extract sentiment expressed by each tweet in the list. See NLPTweet.get_sentiment for the available methods.
+
+        Parameters
+        ----------
+        method (Union[str, List[str]]): method(s) to use for sentiment analysis. Default is 'vader'.
+        quiet (bool): whether to disable the progress bar. Default is False.
+        workers (int): number of processes used to score tweets. If None, one per CPU is used. Default is 1, i.e. tweets are scored in the current process.
+        chunksize (int): number of tweets sent to a worker process at a time. Default is chosen so that each worker receives about 4 chunks (at most 1000 tweets each).
+        cache (bsi_sentiment.cache.SentimentCache): if given, scores of previously analyzed texts are read from the cache instead of being computed again, and new scores are stored in it.
+        executor (concurrent.futures.ProcessPoolExecutor): if given, tweets are scored by this pool, whose workers must have been initialized with _init_worker(method), instead of a new one. workers is then only used to choose chunksize.
+        normalizer (bsi_sentiment.preprocess.TextNormalizer): if given, texts are normalized again with these rules before analysis. Default is to reuse the normalized text of each tweet, if any (see normalize), or else to apply clean_text.
+        dedup (bsi_sentiment.dedup.Deduplicator): if given, tweets whose normalized texts are duplicates are scored only once, and their duplicate group is stored in their 'dup_group' field. Default is to score every tweet.
+        """
+        method = method_key(method)
         load_nltk(method, quiet=quiet)
-        for tweet in tqdm(self,  desc="Analyzing tweets  ", disable=quiet):
-            tweet.get_sentiment(method)
+        if workers is None:
+            workers = os.cpu_count()
+        if workers < 1:
+            raise ValueError(f"workers must be a positive integer, got {workers}")
+        if self.columns is not None:
+            self.columns = merge_columns(self.columns, ('dup_group',) if dedup is not None else (),
+                                         get_analyzer(method).columns)
+        with tqdm(total=len(self), desc="Analyzing tweets  ", disable=quiet) as pbar:
+            if (workers == 1 and executor is None) or len(self) <= 1:
+                get_analyzer(method)  # create the shared engine once, before scoring starts
+                _score_tweets(self.tweets, method, cache=cache, pbar=pbar, normalizer=normalizer, dedup=dedup)
+                return
+            if chunksize is None:
+                chunksize = max(1, min(1000, len(self) // (workers * 4)))
+            if executor is not None:
+                _score_tweets(self.tweets, method, executor=executor, chunksize=chunksize, cache=cache, pbar=pbar,
+                              normalizer=normalizer, dedup=dedup)
+                return
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(method,)) as executor:
+                _score_tweets(self.tweets, method, executor=executor, chunksize=chunksize, cache=cache, pbar=pbar,
+                              normalizer=normalizer, dedup=dedup)
+
+    def aggregate(self, by='day', metric='polarity', quantiles=(0.25, 0.5, 0.75)):
+        """
+        Summary statistics of a metric per time bucket, user or hashtag. See bsi_sentiment.aggregate.Aggregator.
+
+        Returns
+        -------
+        aggregator (bsi_sentiment.aggregate.Aggregator): statistics of each group, see Aggregator.results and Aggregator.to_csv.
+        """
+        from .aggregate import Aggregator
+        return Aggregator(by=by, metric=metric, quantiles=quantiles).add(self.tweets)
 
     @staticmethod
-    def from_csv(path: Union[str, Path], delimiter=','):
-        if not isinstance(path, (str, Path)):
-            raise TypeError(
-                f"path must be of type Union[str, Path], got '{type(path).__name__}'")
-        elif isinstance(path, str):
-            path = Path(path)
-        if not path.parent.is_dir():
-            raise FileNotFoundError(f"path '{str(path)}'is not valid")
-        if not path.suffix == '.csv':
-            raise FileNotFoundError(
-                f"path must be pointing at a .csv file, got f'{str(path)}'")
-        with path.open(newline='') as f:
-            reader = csv.reader(f, delimiter=delimiter)
-            columns = next(reader)
-            tweets = list(map(lambda row: NLPTweet.from_dict(
-                dict(zip(columns, [x if x != '' else None for x in row]))), reader))
+    def _read(batches, columns):
+        tweets = NLPTweetList(chain.from_iterable(batches), quiet=True, columns=columns or [])
+        if columns is None and tweets.tweets:
+            # every column of the file is set on every tweet read from it
+            tweets.columns = tweets[0].keys()
         return tweets
 
-    def to_csv(self, path: Union[str, Path], columns: List[str] = None, delimiter=',', quiet=False):
-        if not isinstance(path, (str, Path)):
-            raise TypeError(
-                f"path must be of type Union[str, Path], got '{type(path).__name__}'")
-        elif isinstance(path, str):
-            path = Path(path)
-        if not path.parent.is_dir():
-            raise FileNotFoundError(f"path '{str(path)}'is not valid")
-        if not path.suffix == '.csv':
-            raise FileNotFoundError(
-                f"path must be pointing at a .csv file, got f'{str(path)}'")
+    @staticmethod
+    def from_csv(path: Union[str, Path], delimiter=',', columns: List[str] = None):
+        """
+        Read tweets from a .csv file, converting numeric fields back to int or float. To read large files in bounded
+        memory, see bsi_sentiment.pipeline.iter_csv.
+
+        Parameters
+        ----------
+        path (Union[str, Path]): path of the .csv file.
+        delimiter (str): field delimiter. Default is ','.
+        columns (List[str]): columns to read, e.g. ['id', 'text'] to score the tweets again. Default is all columns.
+
+        Returns
+        -------
+        tweets (NLPTweetList)
+        """
+        from .pipeline import iter_csv
+        return NLPTweetList._read(iter_csv(path, columns=columns, delimiter=delimiter), columns)
+
+    @staticmethod
+    def from_parquet(path: Union[str, Path], columns: List[str] = None):
+        """
+        Read tweets from a .parquet file, keeping column types. Requires pyarrow.
+
+        Parameters
+        ----------
+        path (Union[str, Path]): path of the .parquet file.
+        columns (List[str]): columns to read. Default is all columns.
+
+        Returns
+        -------
+        tweets (NLPTweetList)
+        """
+        from .parquet import iter_parquet
+        return NLPTweetList._read(iter_parquet(path, columns=columns), columns)
+
+    def _columns(self):
+        columns = self.columns if self.columns is not None else infer_columns(self.tweets)
+        # fields set on the tweets by the caller (e.g. a label) are written too
+        return merge_columns(columns, self.tweets[0].keys()) if self.tweets else columns
+
+    def to_parquet(self, path: Union[str, Path], columns: List[str] = None, compression='snappy', row_group_size=100000, quiet=False):
+        """
+        Write tweets to a .parquet file with typed columns, one row group of row_group_size tweets at a time. Requires pyarrow.
+
+        Parameters
+        ----------
+        path (Union[str, Path]): path of the .parquet file.
+        columns (List[str]): columns to write. Default is self.columns, plus any other field set on the first tweet.
+        compression (str): compression codec, e.g. 'snappy', 'zstd', 'gzip' or 'none'. Default is 'snappy'.
+        row_group_size (int): number of tweets per row group. Default is 100000.
+        quiet (bool): whether to disable the progress bar. Default is False.
+        """
+        from .parquet import stream_to_parquet
+        row_groups = (self.tweets[i:i + row_group_size] for i in range(0, len(self), row_group_size))
+        stream_to_parquet(row_groups, path, columns=columns if columns is not None else self._columns(),
+                          compression=compression, quiet=quiet)
+
+    def to_csv(self, path: Union[str, Path], columns: List[str] = None, delimiter=',', quiet=False, append=False):
+        """
+        Write the tweets to a .csv file, compressed with gzip if path ends with '.csv.gz' or with zstd if it ends with '.csv.zst' (see bsi_sentiment.csvfile).
+
+        Parameters
+        ----------
+        path (Union[str, Path]): path of the .csv file.
+        columns (List[str]): columns to write. Default is self.columns, plus any other field set on the first tweet. Fields missing from a tweet are written as empty values.
+        delimiter (str): field delimiter. Default is ','.
+        quiet (bool): whether to disable the progress bar. Default is False.
+        append (bool): whether to append the tweets to the file, if it exists, instead of overwriting it. Columns are then read from its header. Default is False.
+        """
+        from .csvfile import WRITE_BATCH_SIZE, CSVWriter
+
         if columns is None:
-            columns = list(self[0].__dict__.keys())
+            columns = self._columns()
+        if append:
+            from .pipeline import stream_to_csv
+            stream_to_csv([self.tweets], path, columns=columns, delimiter=delimiter, quiet=quiet, append=True)
+            return
+        with record('write', len(self)), CSVWriter(path, columns, delimiter=delimiter) as writer, \
+                tqdm(total=len(self), desc="Writing tweets    ", disable=quiet) as pbar:
+            for start in range(0, len(self), WRITE_BATCH_SIZE):
+                batch = self.tweets[start:start + WRITE_BATCH_SIZE]
+                writer.write(batch)
+                pbar.update(len(batch))
+
+
+def _authenticate(credentials):
+    import tweepy as tw
 
-        with path.open('w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f, delimiter=delimiter)
-            writer.writerow(columns)
-            for tweet in tqdm(self, desc="Writing tweets    ",  disable=quiet):
-                writer.writerow([tweet[col] for col in columns])
+    auth = tw.OAuthHandler(
+        credentials['api_key'], credentials['api_key_secret'])
+    auth.set_access_token(
+        credentials['access_token'], credentials['access_token_secret'])
+    return tw.API(auth)
+
+
+def read_credentials(credentials_path):
+    """
+    Read the Tweepy credentials stored in a JSON file, which contains either a single set of credentials (see
+    examples/credentials.json) or a list of them.
+
+    Returns
+    -------
+    credentials (List[dict]): list of sets of credentials.
+    """
+    with open(credentials_path) as f:
+        credentials = json.load(f)
+    return credentials if isinstance(credentials, list) else [credentials]
 
 
 def authenticate_tweepy(credentials_path):
@@ -202,35 +624,95 @@ def authenticate_tweepy(credentials_path):
     Parameters
     ----------
     credentials_path (str): Path to JSON file containing Tweepy credentials. See examples/credentials.json to see how the file should be formatted.
+        If the file contains a list of credentials, the first one is used.
 
     Returns
     -------
     api (tweepy.API): Authenticated instance of tweepy.API
     """
-    with open(credentials_path) as f:
-        credentials = json.load(f)
-    auth = tw.OAuthHandler(
-        credentials['api_key'], credentials['api_key_secret'])
-    auth.set_access_token(
-        credentials['access_token'], credentials['access_token_secret'])
-    api = tw.API(auth)
-    return api
+    return _authenticate(read_credentials(credentials_path)[0])
 
 
 def limit_handler(cursor):
     """
-    If Twitter API rate limit is reached, wait for 15 minutes and try again.
+    If Twitter API rate limit is reached, wait until the rate limit resets (15 minutes if unknown) and try again.
+    iter_tweets_tweepy uses RateLimitScheduler instead, which also rotates among several sets of credentials.
     """
+    import tweepy as tw
+
     while True:
         try:
             yield cursor.next()
-        except tw.RateLimitError:
-            print("Reached Tweepy API rate limit. Trying again in 15 minutes. For more information, see https://developer.twitter.com/en/docs/twitter-api/v1/rate-limits.")
-            time.sleep(15 * 60)  # wait 15 minutes
+        except tw.TooManyRequests as e:
+            reset = e.response.headers.get('x-rate-limit-reset') if e.response is not None else None
+            wait = max(0, int(reset) - time.time()) + 1 if reset is not None else 15 * 60
+            print(f"Reached Tweepy API rate limit. Trying again in {wait:.0f} seconds. For more information, see https://developer.twitter.com/en/docs/twitter-api/v1/rate-limits.")
+            time.sleep(wait)
         except StopIteration:
             break
 
 
+def tweepy_query(q):
+    """
+    Build the query sent to the Tweepy API by search_tweets_tweepy.
+
+    Returns
+    -------
+    query (str): search query, to be passed to tweepy.API.search_tweets.
+    """
+    return f"{q} exclude:retweets exclude:replies"
+
+
+def iter_tweets_tweepy(q,
+                       until=None,
+                       geocode=None,
+                       lang=None,
+                       result_type='mixed',
+                       max_tweets=10,
+                       credentials_path='./credentials.json',
+                       quiet=False,
+                       scheduler=None):
+    """
+    Lazily search tweets using Tweepy, yielding each result as soon as it is downloaded.
+    Arguments are the same as search_tweets_tweepy, plus:
+
+    scheduler (bsi_sentiment.ratelimit.RateLimitScheduler): scheduler used to send search requests. Default is a scheduler rotating among the credentials stored at credentials_path.
+
+    Yields
+    ------
+    tweet (NLPTweet)
+    """
+    from .ratelimit import RateLimitScheduler
+
+    if until is None:
+        until = datetime.datetime.strftime(datetime.date.today(), '%Y-%m-%d')
+    if datetime.datetime.strptime(until, '%Y-%m-%d') < (datetime.datetime.today() - datetime.timedelta(days=7)):
+        raise ValueError(
+            'Tweepy limits search to 7 days before today (i.e. no tweets older than a week can be retrieved).')
+
+    search_args = {'q': tweepy_query(q), 'until': until, 'result_type': result_type, 'count': 100, 'tweet_mode': 'extended'}
+    if geocode is not None:
+        search_args['geocode'] = geocode
+    if lang is not None:
+        search_args['lang'] = lang
+
+    if scheduler is None:
+        scheduler = RateLimitScheduler([_authenticate(c) for c in read_credentials(credentials_path)], quiet=quiet)
+    n_tweets = 0
+    while n_tweets < max_tweets:
+        with record('scrape') as stage:
+            page = scheduler.search(**search_args)
+            stage.items = len(page)
+        if len(page) == 0:
+            break
+        yield from timed('construct', map(NLPTweet, page[:max_tweets - n_tweets]))
+        n_tweets += len(page)
+        # results come from the newest to the oldest, so the next page starts right before the last tweet
+        search_args['max_id'] = page[-1].id - 1
+    if scheduler.wait_time > 0 and not quiet:
+        print(f"Waited {scheduler.wait_time:.0f} seconds in total for Tweepy API rate limits to reset.")
+
+
 def search_tweets_tweepy(q,
                          until=None,
                          geocode=None,
@@ -238,7 +720,8 @@ def search_tweets_tweepy(q,
                          result_type='mixed',
                          max_tweets=10,
                          credentials_path='./credentials.json',
-                         quiet=False):
+                         quiet=False,
+                         scheduler=None):
     """
     Search tweets according to keyword arguments specified using Tweepy.
 
@@ -249,33 +732,347 @@ def search_tweets_tweepy(q,
     geocode (str): Returns only tweets by users within a given radius of the given geolocation. Should be of the form "latitude,longitude,radius", where radius can be either in "mi" or "km".
     lang (str): Restrict language of the tweets retrieved. Must be an ISO 639-1 code (e.g. en, it, etc.). Default is no language restriction.
     result_type (str): Type of tweets to retrieve. Can be either "recent", "popular" or "mixed". Default is "mixed".
-    max_tweets (int): The maximum number of tweets to be retrieved. Default is 10. If Twitter API rate limit is reached, the program waits for 15 minutes before trying again.
+    max_tweets (int): The maximum number of tweets to be retrieved. Default is 10. If Twitter API rate limit is reached, requests are sent using the next set of credentials, if any, or the program waits until the rate limit resets.
+    credentials_path (str): Path to JSON file containing Tweepy credentials, either a single set or a list of them. See examples/credentials.json to see how the file should be formatted.
+    scheduler (bsi_sentiment.ratelimit.RateLimitScheduler): Scheduler used to send search requests, e.g. to the APIs of a bsi_sentiment.replay.Replay or Recorder. Default is a scheduler rotating among the credentials stored at credentials_path.
 
     Returns
     -------
     tweets (NLPTweetList): list of tweets resulting from the search and amenable to analysis.
     """
+    tweets = NLPTweetList(
+        iter_tweets_tweepy(q, until=until, geocode=geocode, lang=lang, result_type=result_type,
+                           max_tweets=max_tweets, credentials_path=credentials_path, quiet=quiet,
+                           scheduler=scheduler),
+        tqdm_total=max_tweets,
+        quiet=quiet)
+    return tweets
+
+
+def _sn_dates(since=None, until=None):
+    """
+    Fill in the default since/until dates of search_tweets_sn.
+    """
     if until is None:
         until = datetime.datetime.strftime(datetime.date.today(), '%Y-%m-%d')
-    if datetime.datetime.strptime(until, '%Y-%m-%d') < (datetime.datetime.today() - datetime.timedelta(days=7)):
-        raise ValueError(
-            'Tweepy limits search to 7 days before today (i.e. no tweets older than a week can be retrieved).')
+    if since is None:
+        since = datetime.datetime.strftime(
+            datetime.datetime.strptime(until, '%Y-%m-%d') - datetime.timedelta(days=7), '%Y-%m-%d')
+    return since, until
 
-    q = f"{q} exclude:retweets exclude:replies"
-    search_args = {'q': q, 'until': until, 'result_type': result_type}
-    if geocode is not None:
-        search_args['geocode'] = geocode
+
+def date_shards(since, until, shard_days=1):
+    """
+    Split the date range [since, until) into consecutive windows of shard_days days, from the latest to the earliest.
+
+    Parameters
+    ----------
+    since (str. "yyyy-mm-dd"): lower bound date of the range.
+    until (str. "yyyy-mm-dd"): upper bound date (not included) of the range.
+    shard_days (int): length of each window in days, e.g. 1 for daily or 7 for weekly windows. The earliest window may be shorter.
+
+    Returns
+    -------
+    shards (List[Tuple[str, str]]): list of (since, until) pairs.
+    """
+    if shard_days < 1:
+        raise ValueError(f"shard_days must be a positive integer, got {shard_days}")
+    start = datetime.datetime.strptime(since, '%Y-%m-%d')
+    end = datetime.datetime.strptime(until, '%Y-%m-%d')
+    shards = []
+    while end > start:
+        shard_start = max(start, end - datetime.timedelta(days=shard_days))
+        shards.append((datetime.datetime.strftime(shard_start, '%Y-%m-%d'),
+                       datetime.datetime.strftime(end, '%Y-%m-%d')))
+        end = shard_start
+    return shards
+
+
+_SHARD_DONE = object()
+
+
+class _ShardWorkers:
+    """
+    Bounded pool of threads scraping the criteria of several shards. Each thread takes the next pending shard and
+    puts (shard number, tweet) pairs in a queue, followed by (shard number, _SHARD_DONE) or by the exception raised
+    by the scraper.
+    """
+    def __init__(self, scraper, criteria, max_tweets, workers):
+        self.scraper = scraper
+        self.max_tweets = max_tweets
+        self.pending = queue.Queue()
+        for i, c in enumerate(criteria):
+            self.pending.put((i, c))
+        self.results = queue.Queue(maxsize=workers * 100)
+        self.stop = threading.Event()
+        self.n_threads = min(workers, len(criteria))
+
+    def put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _scrape(self, i, c):
+        for tweet in islice(self.scraper(c).get_items(), self.max_tweets):
+            if not self.put((i, tweet)):
+                return False
+        return self.put((i, _SHARD_DONE))
+
+    def work(self):
+        while not self.stop.is_set():
+            try:
+                i, c = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if not self._scrape(i, c):
+                    return
+            except Exception as e:
+                self.put((i, e))
+                return
+
+    def start(self):
+        for _ in range(self.n_threads):
+            threading.Thread(target=self.work, daemon=True).start()
+
+
+class _ShardOrder:
+    """
+    Order in which the tweets of shards are yielded. If ordered, tweets of a shard are buffered until all the
+    previous shards are complete, otherwise they are yielded as soon as they are scraped.
+    """
+    def __init__(self, n_shards, ordered):
+        self.ordered = ordered
+        self.buffers = {i: [] for i in range(n_shards)}
+        self.done = set()
+        self.next_shard = 0  # first shard whose tweets cannot be yielded yet, if ordered
+
+    def add(self, i, tweet):
+        """
+        Tweets ready to be yielded once a tweet of shard i is scraped.
+        """
+        if self.ordered and i != self.next_shard:
+            self.buffers[i].append(tweet)
+            return []
+        return [tweet]
+
+    def finish(self, i):
+        """
+        Tweets ready to be yielded once shard i is complete.
+        """
+        self.done.add(i)
+        ready = []
+        while self.ordered and self.next_shard in self.done:
+            ready.extend(self.buffers.pop(self.next_shard))
+            self.next_shard += 1
+            if self.next_shard in self.buffers:
+                ready.extend(self.buffers[self.next_shard])
+                self.buffers[self.next_shard] = []
+        return ready
+
+
+def _scrape_shards(scraper, criteria, max_tweets, workers, ordered):
+    """
+    Scrape several search criteria concurrently using a bounded pool of threads.
+
+    Parameters
+    ----------
+    scraper (Callable[[str], sntwitter.TwitterSearchScraper]): factory returning a scraper for given criteria.
+    criteria (List[str]): criteria of each shard, from the latest to the earliest date window.
+    max_tweets (int): maximum number of tweets yielded overall.
+    workers (int): maximum number of shards scraped at the same time.
+    ordered (bool): if True, tweets are yielded in the same order as the corresponding unsharded search, i.e. from the latest to the earliest. Tweets of later shards are buffered in memory until all the previous shards are complete.
+
+    Yields
+    ------
+    tweet (sntwitter.Tweet): tweets deduplicated by id.
+    """
+    pool = _ShardWorkers(scraper, criteria, max_tweets, workers)
+    pool.start()
+    order = _ShardOrder(len(criteria), ordered)
+    seen = set()
+    n_done = 0
+    n_tweets = 0
+    try:
+        while n_done < len(criteria):
+            i, item = pool.results.get()
+            if isinstance(item, Exception):
+                raise item
+            if item is _SHARD_DONE:
+                n_done += 1
+                ready = order.finish(i)
+            else:
+                ready = order.add(i, item)
+            for tweet in ready:
+                if tweet.id in seen:
+                    continue
+                seen.add(tweet.id)
+                yield tweet
+                n_tweets += 1
+                if n_tweets >= max_tweets:
+                    return
+    finally:
+        pool.stop.set()
+
+
+def sn_criteria(q,
+                since=None,
+                until=None,
+                username=None,
+                near=None,
+                radius=None,
+                lang=None):
+    """
+    Build the Snscrape search criteria corresponding to the arguments of search_tweets_sn.
+
+    Returns
+    -------
+    criteria (str): search criteria, to be passed to sntwitter.TwitterSearchScraper.
+    """
+    since, until = _sn_dates(since, until)
+    criteria = f"{q} since:{since} until:{until} exclude:retweets exclude:replies"
+
+    if username is not None:
+        criteria += f" from:{username}"
+    if near is not None:
+        criteria += f" near:{near.replace(' ', '&')}"
+    if radius is not None:
+        criteria += f" within:{radius}"
     if lang is not None:
-        search_args['lang'] = lang
+        criteria += f" lang:{lang}"
+    return criteria
 
-    api = authenticate_tweepy(credentials_path)
-    tweets = NLPTweetList(limit_handler(
-        tw.Cursor(api.search, **search_args, tweet_mode='extended').items(max_tweets)),
-        tqdm_total=max_tweets,
-        quiet=quiet)
+
+def _start_index(index, q, since, until, query):
+    """
+    Start the search of a query in a TweetIndex, returning the since date to search from, the id of the newest tweet
+    found by the last completed search, if any, and the ids written by interrupted searches since then.
+    """
+    index.start(q=q, **query)
+    if index.max_date is not None:
+        # dates are compared as yyyy-mm-dd strings
+        since = max(_sn_dates(since, until)[0], index.max_date)
+    return since, index.max_id, index.known_ids()
+
+
+def _new_tweets(tweets, min_id, known_ids):
+    """
+    Skip the tweets that are already stored in the index of the search, see _start_index.
+    """
+    if min_id is not None:
+        tweets = (tweet for tweet in tweets if tweet.id > min_id)
+    if known_ids:
+        tweets = (tweet for tweet in tweets if tweet.id not in known_ids)
     return tweets
 
 
+def _start_checkpoint(checkpoint, q, since, until, query):
+    """
+    Load the state of a search from a Checkpoint, returning the since/until dates of the search.
+    """
+    checkpoint.start(q=q, since=since, until=until, **query)
+    if checkpoint.since is None:
+        # default dates depend on the current day, so they are fixed when the search starts
+        checkpoint.since, checkpoint.until = _sn_dates(since, until)
+    return checkpoint.since, checkpoint.until
+
+
+def _iter_shards(scraper, q, since, until, query, shard_days, shard_workers, ordered, max_tweets, min_id, known_ids):
+    """
+    Search the date windows of shard_days days of [since, until) concurrently, see iter_tweets_sn.
+    """
+    since, until = _sn_dates(since, until)
+    criteria = [sn_criteria(q, since=shard_since, until=shard_until, **query)
+                for shard_since, shard_until in date_shards(since, until, shard_days)]
+    if min_id is not None:
+        criteria = [c + f" since_id:{min_id}" for c in criteria]
+    # known ids are skipped after scraping, so each window may need to yield more than max_tweets
+    shard_max = sys.maxsize if known_ids else max_tweets
+    # shards are scraped by other threads, so the time spent waiting for them is recorded as scraping
+    tweets = timed('scrape', _scrape_shards(scraper, criteria, shard_max, shard_workers, ordered))
+    return timed('construct', map(NLPTweet, islice(_new_tweets(tweets, min_id, known_ids), max_tweets)))
+
+
+def _iter_search(scraper, criteria, max_tweets, last_id, min_id, known_ids):
+    """
+    Search tweets older than last_id, if given, and newer than the high-water mark min_id, if given.
+    """
+    if min_id is not None:
+        criteria += f" since_id:{min_id}"
+    if last_id is not None:
+        criteria += f" max_id:{last_id - 1}"
+    tweets = timed('scrape', scraper(criteria).get_items())
+    if last_id is not None:
+        # tweets come from the newest to the oldest, so anything not older than last_id was already written
+        tweets = (tweet for tweet in tweets if tweet.id < last_id)
+    if min_id is not None:
+        # likewise, stop paging as soon as the high-water mark of the previous search is reached
+        tweets = takewhile(lambda tweet: tweet.id > min_id, tweets)
+    return timed('construct', map(NLPTweet, islice(_new_tweets(tweets, min_id, known_ids), max(max_tweets, 0))))
+
+
+def iter_tweets_sn(q,
+                   since=None,
+                   until=None,
+                   username=None,
+                   near=None,
+                   radius=None,
+                   lang=None,
+                   max_tweets=-1,
+                   checkpoint=None,
+                   scraper=None,
+                   shard_days=None,
+                   shard_workers=4,
+                   ordered=True,
+                   index=None):
+    """
+    Lazily search tweets using snscrape, yielding each result as soon as it is scraped.
+    Arguments are the same as search_tweets_sn, plus:
+
+    checkpoint (bsi_sentiment.checkpoint.Checkpoint): if given, the search resumes after the last tweet recorded by the checkpoint, with the dates it started with, and max_tweets counts the tweets already recorded.
+    scraper (Callable[[str], sntwitter.TwitterSearchScraper]): factory returning a scraper for given criteria. Default is sntwitter.TwitterSearchScraper.
+    shard_days (int): if given, the range [since, until) is split into windows of shard_days days that are scraped concurrently. Tweets are deduplicated by id and max_tweets applies to all windows together.
+    shard_workers (int): maximum number of windows scraped at the same time. Used only with shard_days. Default is 4.
+    ordered (bool): whether tweets scraped from different windows are yielded from the latest to the earliest, as in an unsharded search, rather than as soon as they are scraped. Used only with shard_days. Default is True.
+    index (bsi_sentiment.index.TweetIndex): if given, only tweets newer than the high-water mark of the index for this query are searched, skipping those already stored in the index. The caller is responsible for adding the tweets to the index once written, e.g. by passing it to stream_to_csv.
+
+    Yields
+    ------
+    tweet (NLPTweet)
+    """
+    if max_tweets == -1:
+        max_tweets = sys.maxsize
+    if scraper is None:
+        import snscrape.modules.twitter as sntwitter
+        scraper = sntwitter.TwitterSearchScraper
+    if checkpoint is not None and (index is not None or shard_days is not None):
+        raise ValueError("checkpoint cannot be used together with index or shard_days")
+    query = {'username': username, 'near': near, 'radius': radius, 'lang': lang}
+
+    min_id = None
+    known_ids = set()
+    if index is not None:
+        since, min_id, known_ids = _start_index(index, q, since, until, query)
+    if shard_days is not None:
+        yield from _iter_shards(scraper, q, since, until, query, shard_days, shard_workers, ordered, max_tweets,
+                                min_id, known_ids)
+        return
+
+    last_id = None
+    if checkpoint is not None:
+        since, until = _start_checkpoint(checkpoint, q, since, until, query)
+        if checkpoint.done:
+            return
+        max_tweets -= checkpoint.n_tweets
+        last_id = checkpoint.last_id
+    criteria = sn_criteria(q, since=since, until=until, **query)
+    yield from _iter_search(scraper, criteria, max_tweets, last_id, min_id, known_ids)
+
+
 def search_tweets_sn(q,
                      since=None,
                      until=None,
@@ -284,7 +1081,11 @@ def search_tweets_sn(q,
                      radius=None,
                      lang=None,
                      max_tweets=-1,
-                     quiet=False):
+                     shard_days=None,
+                     shard_workers=4,
+                     index=None,
+                     quiet=False,
+                     scraper=None):
     """
     Search tweets according to keyword arguments specified using snscrape.
 
@@ -298,33 +1099,20 @@ def search_tweets_sn(q,
     radius (str): A distance radius (e.g. 15km) from location specified by "near". Meaningful only if "near" is set.
     lang (str): Restrict language of the tweets retrieved. Must be an ISO 639-1 code (e.g. en, it, etc.). Default is no language restriction.
     max_tweets (int): The maximum number of tweets to be retrieved. If this number is unsetted or lower than 1 all possible tweets will be retrieved. Default is -1.
+    shard_days (int): If given, the date range is split into windows of shard_days days (e.g. 1 or 7) which are scraped concurrently. Default is no splitting.
+    shard_workers (int): Maximum number of windows scraped at the same time when using shard_days. Default is 4.
+    index (bsi_sentiment.index.TweetIndex): If given, only tweets that are newer than those found by the last search of the same query are retrieved. Once they are written (e.g. using to_csv with append=True), they should be recorded with index.add and index.finish. Default is no index.
+    scraper (Callable[[str], sntwitter.TwitterSearchScraper]): Factory returning a scraper for given criteria, e.g. the sn_scraper method of a bsi_sentiment.replay.Replay or Recorder. Default is sntwitter.TwitterSearchScraper.
 
     Returns
     -------
     tweets (NLPTweetList): list of tweets resulting from the search and amenable to analysis.
     """
-    if until is None:
-        until = datetime.datetime.strftime(datetime.date.today(), '%Y-%m-%d')
-    if since is None:
-        since = datetime.datetime.strftime(
-            datetime.datetime.strptime(until, '%Y-%m-%d') - datetime.timedelta(days=7), '%Y-%m-%d')
-    if max_tweets == -1:
-        max_tweets = sys.maxsize
-
-    criteria = f"{q} since:{since} until:{until} exclude:retweets exclude:replies"
-
-    if username is not None:
-        criteria += f" from:{username}"
-    if near is not None:
-        criteria += f" near:{near.replace(' ', '&')}"
-    if radius is not None:
-        criteria += f" within:{radius}"
-    if lang is not None:
-        criteria += f" lang:{lang}"
-
     tweets = NLPTweetList(
-        islice(sntwitter.TwitterSearchScraper(criteria).get_items(), max_tweets), 
-        tqdm_total=max_tweets,
+        iter_tweets_sn(q, since=since, until=until, username=username, near=near, radius=radius,
+                       lang=lang, max_tweets=max_tweets, shard_days=shard_days, shard_workers=shard_workers,
+                       index=index, scraper=scraper),
+        tqdm_total=max_tweets if max_tweets != -1 else sys.maxsize,
         quiet=quiet
     )
     return tweets
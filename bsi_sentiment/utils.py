@@ -2,9 +2,10 @@ import configparser
 import re
 from datetime import datetime as dt
 from datetime import timedelta as td
+from pathlib import Path
 
-from nltk import data, download
-
+CONFIG_SECTION = "bsi-sentiment"
+QUERY_SECTION_PREFIX = "bsi-sentiment:"
 DATE_FORMAT = "%Y-%m-%d"
 FLOAT_REGEX = "[+-]?([0-9]*[.])?[0-9]+"
 ISO_REGEX = "^[a-z]{2}$"
@@ -46,6 +47,29 @@ def validate_common(args):
     return validated_args
 
 
+def validate_pipeline(args):
+    """
+    Validate CLI arguments controlling how tweets are processed, e.g. scored, cached or aggregated, rather than searched.
+
+    Parameters
+    ----------
+    args (argparse.Namespace): arguments passed by the user through the command line.
+    """
+    for name in ('jobs', 'cache_size', 'batch_size', 'query_workers'):
+        if getattr(args, name) <= 0:
+            raise ValueError(
+                f"{name} must be a positive integer, got {getattr(args, name)}")
+    if not 0 < args.dedup_similarity <= 1:
+        raise ValueError(
+            f"dedup_similarity must be between 0 (excluded) and 1, got {args.dedup_similarity}")
+    if any(not 0 <= q <= 1 for q in args.quantiles):
+        raise ValueError(
+            f"quantiles must be between 0 and 1, got {args.quantiles}")
+    if not args.range[0] < args.range[1]:
+        raise ValueError(
+            f"range must be given as LOW HIGH with LOW < HIGH, got {args.range}")
+
+
 def validate_snscrape(args, validated_args):
     """
     Validate CLI arguments specific to Snscrape.
@@ -70,8 +94,17 @@ def validate_snscrape(args, validated_args):
                 f"since can be at most {dt.strftime(dt.today() - td.timedelta(days=1), '%Y-%m-%d')}, got {args.since}")
         if dt.strptime(args.since, DATE_FORMAT) >= dt.strptime(args.until, DATE_FORMAT):
             raise ValueError("since must strictly precede until")
+    if args.shard_days is not None and args.shard_days <= 0:
+        raise ValueError(
+            f"shard_days must be a positive integer, got {args.shard_days}")
+    if args.shard_workers <= 0:
+        raise ValueError(
+            f"shard_workers must be a positive integer, got {args.shard_workers}")
     validated_args["since"] = args.since
     validated_args["near"] = args.geo
+    validated_args["shard_days"] = args.shard_days
+    if args.shard_days is not None:
+        validated_args["shard_workers"] = args.shard_workers
     return validated_args
 
 
@@ -116,25 +149,59 @@ def validate_args(args):
     -------
     validated_args (dict): validated arguments.
     """
+    validate_pipeline(args)
     validated_args = validate_common(args)
     if args.tweepy:
         return validate_tweepy(args, validated_args)
     return validate_snscrape(args, validated_args)
 
 
+def check_path(path, suffix):
+    """
+    Validate the location of an input/output file.
+
+    Parameters
+    ----------
+    path (Union[str, pathlib.Path]): location of the file.
+    suffix (str): required file extension, e.g. '.csv'.
+
+    Returns
+    -------
+    path (pathlib.Path): validated location.
+    """
+    if not isinstance(path, (str, Path)):
+        raise TypeError(
+            f"path must be of type Union[str, Path], got '{type(path).__name__}'")
+    elif isinstance(path, str):
+        path = Path(path)
+    if not path.parent.is_dir():
+        raise FileNotFoundError(f"path '{str(path)}'is not valid")
+    if not path.suffix == suffix:
+        raise FileNotFoundError(
+            f"path must be pointing at a {suffix} file, got '{str(path)}'")
+    return path
+
+
 def load_nltk(analyzer, quiet=False):
     """
     Check if resources necessary to use 'analyzer' are already present locally. Else, download them.
 
     Parameters
     ----------
-    analyzer (str): method to use for sentiment analysis.
+    analyzer (Union[str, List[str]]): method(s) to use for sentiment analysis.
     """
+    from nltk import data, download
+
+    if not isinstance(analyzer, str):
+        for name in analyzer:
+            load_nltk(name, quiet=quiet)
+        return
     if analyzer == 'textblob-nb':
-        try:
-            data.find('corpora/movie_reviews')
-        except LookupError:
-            download('movie_reviews', quiet=quiet)
+        from .nb import build_model, default_model_path
+
+        # the corpus is only needed to build the model, the first time it is used
+        if not default_model_path().exists():
+            build_model(quiet=quiet)
         try:
             data.find('tokenizers/punkt')
         except LookupError:
@@ -146,6 +213,31 @@ def load_nltk(analyzer, quiet=False):
             download('vader_lexicon', quiet=quiet)
 
 
+def _parse_section(section):
+    """
+    Convert the values of a configuration file section to the types expected by the search functions.
+
+    Parameters
+    ----------
+    section (configparser.SectionProxy): section containing the arguments of a search.
+
+    Returns
+    -------
+    validated_args (dict): validated arguments for twitter search and tweet analysis.
+    tweepy (bool): whether to use Tweepy instead of Snscrape to download tweets.
+    """
+    validated_args = dict(section)
+    validated_args['max_tweets'] = section.getint('max_tweets')
+    if 'quiet' in validated_args:
+        validated_args['quiet'] = section.getboolean('quiet')
+    for argname in ('shard_days', 'shard_workers'):
+        if argname in validated_args:
+            validated_args[argname] = section.getint(argname)
+    tweepy = section.getboolean('tweepy', fallback=False)
+    validated_args.pop('tweepy', None)
+    return validated_args, tweepy
+
+
 def read_config(config_path):
     """
     Read configuration file containing parameters of twitter search query and analysis.
@@ -159,11 +251,70 @@ def read_config(config_path):
     """
     config = configparser.ConfigParser()
     config.read(config_path)
-    validated_args = config._sections['bsi-sentiment']
-    validated_args['max_tweets'] = config['bsi-sentiment'].getint('max_tweets')
-    tweepy = config['bsi-sentiment'].getboolean('tweepy')
-    del validated_args['tweepy']
-    return validated_args, tweepy
+    return _parse_section(config[CONFIG_SECTION])
+
+
+def _unique_name(text, names):
+    """
+    Name of a search usable as a file name, derived from text and distinct from the names already taken, to which
+    it is added.
+    """
+    name = re.sub(r'\W+', '_', text).strip('_') or 'query'
+    base, i = name, 1
+    while name in names:
+        i += 1
+        name = f"{base}_{i}"
+    names.add(name)
+    return name
+
+
+def read_batch_config(config_path):
+    """
+    Read configuration file containing the parameters of several searches, one per section named
+    '[bsi-sentiment:NAME]'. Parameters missing from such a section are taken from the '[bsi-sentiment]' section,
+    if present. If the file has no such section, the '[bsi-sentiment]' section is read as a single search named
+    'bsi-sentiment'. Characters of NAME other than letters, digits and underscores are replaced by underscores,
+    so that it can be used as a file name.
+
+    Parameters:
+    config_path (Union[str, pathlib.Path]): path of configuration file.
+
+    Returns:
+    searches (List[Tuple[str, dict, bool]]): name, validated arguments and whether to use Tweepy for each search.
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    names = [name for name in config.sections() if name.startswith(QUERY_SECTION_PREFIX)]
+    if not names:
+        return [(CONFIG_SECTION, *_parse_section(config[CONFIG_SECTION]))]
+    defaults = dict(config[CONFIG_SECTION]) if config.has_section(CONFIG_SECTION) else dict()
+    merged = configparser.ConfigParser()
+    merged.read_dict({name: {**defaults, **config[name]} for name in names})
+    taken = set()
+    return [(_unique_name(name[len(QUERY_SECTION_PREFIX):], taken), *_parse_section(merged[name])) for name in names]
+
+
+def read_queries(queries_path, validated_args):
+    """
+    Read a text file containing one query per line, sharing all the other search parameters.
+
+    Parameters:
+    queries_path (Union[str, pathlib.Path]): path of the queries file. Empty lines are ignored, but the file must contain at least one query.
+    validated_args (dict): validated arguments shared by all searches, except for 'q'.
+
+    Returns:
+    searches (List[Tuple[str, dict]]): name and validated arguments of each search. Names are derived from the queries.
+    """
+    searches = []
+    names = set()
+    with open(queries_path) as f:
+        for line in f:
+            q = line.strip()
+            if q:
+                searches.append((_unique_name(q, names), {**validated_args, 'q': q}))
+    if not searches:
+        raise ValueError(f"queries file '{str(queries_path)}' contains no query")
+    return searches
 
 
 def write_config(args, validated_args):
@@ -176,8 +327,8 @@ def write_config(args, validated_args):
     validated_args (dict): validated arguments for twitter search and tweet analysis.
     """
     config = configparser.ConfigParser()
-    config['bsi-sentiment'] = {argname: str(argval) for argname, argval in validated_args.items() if argval is not None}
-    config['bsi-sentiment']['tweepy'] = str(args.tweepy)
+    config[CONFIG_SECTION] = {argname: str(argval) for argname, argval in validated_args.items() if argval is not None}
+    config[CONFIG_SECTION]['tweepy'] = str(args.tweepy)
     dest = args.dest if args.dest is not None else './config.ini'
     with open(dest, 'w') as f:
         config.write(f)
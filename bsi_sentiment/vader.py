@@ -0,0 +1,313 @@
+"""
+Vectorized VADER scoring of whole batches of texts.
+
+SentimentIntensityAnalyzer.polarity_scores looks up every token of every text in the lexicon and applies its rules
+(boosters, negations, idioms, 'but', 'least', ALL CAPS and punctuation emphasis) in pure Python. BatchVader tokenizes
+a batch of texts the same way, maps each distinct token to an integer id through an index that is kept across
+batches, and evaluates the same rules with NumPy on a (texts x tokens) matrix of ids, using per-id attribute
+arrays (valence, booster value, negation, ...) computed once per distinct token.
+
+Scores are identical to those of polarity_scores: rules are applied in the same order and with the same
+floating point operations, sums are accumulated token by token as in the reference implementation, and the
+final scores are rounded with Python's round. Requires the optional dependency numpy.
+"""
+import re
+import string
+import sys
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+_PUNCTUATION = string.punctuation
+_HAS_PUNCTUATION = re.compile(f"[{re.escape(_PUNCTUATION)}]")
+
+# codes of the lowercase and exact tokens that VADER rules compare against
+_LOWER_CODES = {'least': 1, 'at': 2, 'very': 3, 'kind': 4, 'of': 5, 'but': 6}
+_EXACT_CODES = {'never': 1, 'so': 2, 'this': 3}
+_LEAST, _AT, _VERY, _KIND, _OF, _BUT = 1, 2, 3, 4, 5, 6
+_NEVER, _SO, _THIS = 1, 2, 3
+
+# padding of the id matrix on each side, i.e. the largest distance between a token and the tokens its rules look at
+_PAD = 3
+
+
+def _row_sums(matrix):
+    """
+    Sum each row in the same order as the builtin sum over the corresponding list.
+    """
+    if sys.version_info >= (3, 12):
+        # sum() uses compensated summation for floats since Python 3.12
+        return np.array([sum(row) for row in matrix.tolist()], dtype=np.float64)
+    total = np.zeros(matrix.shape[0])
+    for k in range(matrix.shape[1]):
+        total = total + matrix[:, k]
+    return total
+
+
+class BatchVader:
+    """
+    Score batches of texts with VADER using NumPy array operations.
+
+    Parameters
+    ----------
+    analyzer (nltk.sentiment.vader.SentimentIntensityAnalyzer): reference analyzer, providing the lexicon and constants.
+    max_vocab (int): maximum number of distinct tokens kept in the token index. When it is exceeded, the index is cleared before scoring the next batch. Default is 1000000.
+    chunk_size (int): maximum number of texts scored with a single matrix, bounding memory usage. Default is 10000.
+    """
+    def __init__(self, analyzer, max_vocab=1000000, chunk_size=10000):
+        self.lexicon = analyzer.lexicon
+        self.constants = analyzer.constants
+        self.max_vocab = max_vocab
+        self.chunk_size = chunk_size
+        self._punc_set = frozenset(self.constants.PUNC_LIST)
+        # idioms and multi-word boosters, as tuples of exact tokens
+        self._idioms = [(tuple(idiom.split()), value) for idiom, value in self.constants.SPECIAL_CASE_IDIOMS.items()]
+        self._bigram_boosters = [tuple(booster.split()) for booster in self.constants.BOOSTER_DICT if ' ' in booster]
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._ids = dict()
+        self._tokens = []
+        self._valence = np.zeros(0)
+        self._in_lexicon = np.zeros(0, dtype=bool)
+        self._booster = np.zeros(0)
+        self._upper = np.zeros(0, dtype=bool)
+        self._negated = np.zeros(0, dtype=bool)
+        self._lower_code = np.zeros(0, dtype=np.int8)
+        self._exact_code = np.zeros(0, dtype=np.int8)
+        # id 0 is the padding token, which matches no rule
+        self._add_tokens([''])
+        for tokens, _ in self._idioms:
+            self._add_tokens([token for token in tokens if token not in self._ids])
+        for tokens in self._bigram_boosters:
+            self._add_tokens([token for token in tokens if token not in self._ids])
+
+    def _add_tokens(self, tokens):
+        """
+        Assign ids to new distinct tokens and compute their attributes.
+        """
+        if not tokens:
+            return
+        lexicon = self.lexicon
+        boosters = self.constants.BOOSTER_DICT
+        lowers = [token.lower() for token in tokens]
+        for token in tokens:
+            self._ids[token] = len(self._tokens)
+            self._tokens.append(token)
+        self._valence = np.concatenate([self._valence, [lexicon.get(lower, 0.0) for lower in lowers]])
+        self._in_lexicon = np.concatenate([self._in_lexicon, [lower in lexicon for lower in lowers]])
+        self._booster = np.concatenate([self._booster, [boosters.get(lower, 0.0) for lower in lowers]])
+        self._upper = np.concatenate([self._upper, [token.isupper() for token in tokens]])
+        self._negated = np.concatenate([self._negated, [self.constants.negated([token]) for token in tokens]])
+        self._lower_code = np.concatenate(
+            [self._lower_code, np.array([_LOWER_CODES.get(lower, 0) for lower in lowers], dtype=np.int8)])
+        self._exact_code = np.concatenate(
+            [self._exact_code, np.array([_EXACT_CODES.get(token, 0) for token in tokens], dtype=np.int8)])
+
+    def tokenize(self, text) -> List[str]:
+        """
+        Split a text into words and emoticons, as SentiText does: tokens of a single character are dropped, and a
+        single leading or trailing punctuation mark (see VaderConstants.PUNC_LIST) is removed from words.
+        """
+        tokens = []
+        for token in text.split():
+            if len(token) <= 1:
+                continue
+            stripped = token.lstrip(_PUNCTUATION)
+            core = stripped.rstrip(_PUNCTUATION)
+            if core != token and len(core) > 1 and not _HAS_PUNCTUATION.search(core):
+                leading = token[:len(token) - len(stripped)]
+                trailing = stripped[len(core):]
+                if (not leading and trailing in self._punc_set) or (not trailing and leading in self._punc_set):
+                    token = core
+            tokens.append(token)
+        return tokens
+
+    def polarity_scores(self, texts: List[str]) -> List[Dict[str, float]]:
+        """
+        Score a batch of texts.
+
+        Parameters
+        ----------
+        texts (List[str]): texts to score.
+
+        Returns
+        -------
+        scores (List[dict]): for each text, the same dictionary as SentimentIntensityAnalyzer.polarity_scores, with keys 'neg', 'neu', 'pos' and 'compound'.
+        """
+        scores = []
+        with self._lock:
+            for i in range(0, len(texts), self.chunk_size):
+                scores.extend(self._score_chunk(texts[i:i + self.chunk_size]))
+        return scores
+
+    def _ids_matrix(self, texts):
+        """
+        Tokenize texts and convert them to a (texts x tokens) matrix of ids, padded with _PAD columns of id 0 on each side.
+        """
+        if len(self._tokens) > self.max_vocab:
+            self._reset()
+        ids = self._ids
+        flat = []
+        lengths = np.zeros(len(texts), dtype=np.int64)
+        new_tokens = dict()
+        for row, text in enumerate(texts):
+            tokens = self.tokenize(text)
+            lengths[row] = len(tokens)
+            for token in tokens:
+                if token not in ids and token not in new_tokens:
+                    new_tokens[token] = None
+            flat.extend(tokens)
+        self._add_tokens(list(new_tokens))
+        flat_ids = np.fromiter((ids[token] for token in flat), dtype=np.int64, count=len(flat))
+        width = int(lengths.max()) if len(texts) else 0
+        matrix = np.zeros((len(texts), width + 2 * _PAD), dtype=np.int64)
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        starts = np.cumsum(lengths) - lengths
+        cols = np.arange(len(flat)) - np.repeat(starts, lengths)
+        matrix[rows, cols + _PAD] = flat_ids
+        return matrix, lengths, width, rows, cols, flat_ids
+
+    def _score_chunk(self, texts):
+        c = self.constants
+        matrix, lengths, width, rows, cols, flat_ids = self._ids_matrix(texts)
+        n = len(texts)
+        if width == 0:
+            return [{'neg': 0.0, 'neu': 0.0, 'pos': 0.0, 'compound': 0.0} for _ in texts]
+
+        def at(d, attribute=None):
+            """Attribute (or id, if None) of the token at offset d from each position."""
+            view = matrix[:, _PAD + d:_PAD + d + width]
+            return view if attribute is None else attribute[view]
+
+        pos = np.arange(width)[None, :]
+        length = lengths[:, None]
+        valid = pos < length
+        n_upper = (at(0, self._upper) & valid).sum(axis=1)
+        cap_diff = ((n_upper > 0) & (n_upper < lengths))[:, None]
+        in_lexicon = [at(-d, self._in_lexicon) for d in range(4)]
+        lower_code = [at(-d, self._lower_code) for d in range(3)]
+        exact_code = [at(-d, self._exact_code) for d in range(4)]
+        negated = [at(-d, self._negated) for d in range(4)]
+
+        # valence of sentiment-laden words, with ALL CAPS emphasis
+        valence = at(0, self._valence)
+        emphasized = at(0, self._upper) & cap_diff
+        valence = np.where(emphasized, np.where(valence > 0, valence + c.C_INCR, valence - c.C_INCR), valence)
+
+        # boosters, dampeners and negations among the 3 preceding words, then idioms
+        for start_i in range(3):
+            d = start_i + 1
+            applies = (pos > start_i) & ~in_lexicon[d]
+            scalar = at(-d, self._booster)
+            scalar = np.where(valence < 0, -scalar, scalar)
+            capped = (scalar != 0) & at(-d, self._upper) & cap_diff
+            scalar = np.where(capped, np.where(valence > 0, scalar + c.C_INCR, scalar - c.C_INCR), scalar)
+            if start_i == 1:
+                scalar = np.where(scalar != 0, scalar * 0.95, scalar)
+            elif start_i == 2:
+                scalar = np.where(scalar != 0, scalar * 0.9, scalar)
+            new_valence = valence + scalar
+            if start_i == 0:
+                new_valence = np.where(negated[1], new_valence * c.N_SCALAR, new_valence)
+            elif start_i == 1:
+                never_so = (exact_code[2] == _NEVER) & ((exact_code[1] == _SO) | (exact_code[1] == _THIS))
+                new_valence = np.where(never_so, new_valence * 1.5,
+                                       np.where(negated[2], new_valence * c.N_SCALAR, new_valence))
+            else:
+                never_so = (exact_code[3] == _NEVER) & ((exact_code[2] == _SO) | (exact_code[2] == _THIS))
+                never_so |= (exact_code[1] == _SO) | (exact_code[1] == _THIS)
+                new_valence = np.where(never_so, new_valence * 1.25,
+                                       np.where(negated[3], new_valence * c.N_SCALAR, new_valence))
+                new_valence = self._idioms_check(new_valence, at, pos, length)
+            valence = np.where(applies, new_valence, valence)
+
+        # negation by a preceding 'least', unless in 'at least' or 'very least'
+        least = (pos > 1) & ~in_lexicon[1] & (lower_code[1] == _LEAST)
+        negate = least & (lower_code[2] != _AT) & (lower_code[2] != _VERY)
+        negate |= ~least & (pos == 1) & ~in_lexicon[1] & (lower_code[1] == _LEAST)
+        valence = np.where(negate, valence * c.N_SCALAR, valence)
+
+        # boosters and the 'kind' of 'kind of' carry no sentiment, as well as words out of the lexicon
+        kind_of = (lower_code[0] == _KIND) & (pos < length - 1) & (at(1, self._lower_code) == _OF)
+        neutral = ~in_lexicon[0] | (at(0, self._booster) != 0) | kind_of | ~valid
+        valence = np.where(neutral, 0.0, valence)
+
+        # polarity_scores evaluates each token at the position of its first occurrence in the text
+        flat_valence = valence[rows, cols]
+        _, first, inverse = np.unique(rows * len(self._tokens) + flat_ids, return_index=True, return_inverse=True)
+        sentiments = np.zeros((n, width))
+        sentiments[rows, cols] = flat_valence[first[inverse.reshape(-1)]]
+
+        # words before the first 'but' are dampened, words after it are emphasized
+        is_but = (lower_code[0] == _BUT) & valid
+        has_but = is_but.any(axis=1)[:, None]
+        but = np.argmax(is_but, axis=1)[:, None]
+        sentiments = np.where(has_but & (pos < but), sentiments * 0.5,
+                              np.where(has_but & (pos > but), sentiments * 1.5, sentiments))
+
+        return self._score_valence(texts, sentiments, lengths, valid)
+
+    def _match(self, match, at, offsets, tokens):
+        # restrict match to the words around which the tokens are found at the given offsets
+        for offset, token in zip(offsets, tokens):
+            match = match & (at(offset) == self._ids[token])
+        return match
+
+    def _idioms_check(self, valence, at, pos, length):
+        # sequences before the word, as offsets from it, in the order they are checked by _idioms_check
+        before = [(-1, 0), (-2, -1, 0), (-2, -1), (-3, -2, -1), (-3, -2)]
+        matched = np.zeros(valence.shape, dtype=bool)
+        idiom_valence = np.zeros(valence.shape)
+        for offsets in before:
+            for tokens, value in self._idioms_of_length(len(offsets)):
+                match = self._match(~matched, at, offsets, tokens)
+                idiom_valence = np.where(match, value, idiom_valence)
+                matched |= match
+        valence = np.where(matched, idiom_valence, valence)
+        # sequences starting at the word override the previous ones
+        for offsets, fits in (((0, 1), pos < length - 1), ((0, 1, 2), pos < length - 2)):
+            for tokens, value in self._idioms_of_length(len(offsets)):
+                valence = np.where(self._match(fits, at, offsets, tokens), value, valence)
+        # multi-word dampeners such as 'kind of'
+        dampened = np.zeros(valence.shape, dtype=bool)
+        for offsets in ((-3, -2), (-2, -1)):
+            for tokens in self._bigram_boosters:
+                dampened |= self._match(np.ones(valence.shape, dtype=bool), at, offsets, tokens)
+        return np.where(dampened, valence + self.constants.B_DECR, valence)
+
+    def _idioms_of_length(self, n):
+        return [(tokens, value) for tokens, value in self._idioms if len(tokens) == n]
+
+    def _score_valence(self, texts, sentiments, lengths, valid):
+        sum_s = _row_sums(sentiments)
+        ep_count = np.array([min(text.count('!'), 4) for text in texts], dtype=np.float64)
+        qm_count = np.array([text.count('?') for text in texts], dtype=np.float64)
+        qm_amplifier = np.where(qm_count > 1, np.where(qm_count <= 3, qm_count * 0.18, 0.96), 0.0)
+        amplifier = ep_count * 0.292 + qm_amplifier
+        sum_s = np.where(sum_s > 0, sum_s + amplifier, np.where(sum_s < 0, sum_s - amplifier, sum_s))
+        compound = sum_s / np.sqrt((sum_s * sum_s) + 15)
+
+        pos_sum = np.zeros(len(texts))
+        neg_sum = np.zeros(len(texts))
+        for k in range(sentiments.shape[1]):
+            column = sentiments[:, k]
+            pos_sum = np.where(column > 0, pos_sum + (column + 1), pos_sum)
+            neg_sum = np.where(column < 0, neg_sum + (column - 1), neg_sum)
+        neu_count = ((sentiments == 0) & valid).sum(axis=1)
+        pos_larger = pos_sum > np.fabs(neg_sum)
+        neg_larger = pos_sum < np.fabs(neg_sum)
+        pos_sum = np.where(pos_larger, pos_sum + amplifier, pos_sum)
+        neg_sum = np.where(neg_larger, neg_sum - amplifier, neg_sum)
+        total = pos_sum + np.fabs(neg_sum) + neu_count
+        empty = lengths == 0
+        total = np.where(empty, 1.0, total)
+        pos = np.where(empty, 0.0, np.fabs(pos_sum / total))
+        neg = np.where(empty, 0.0, np.fabs(neg_sum / total))
+        neu = np.where(empty, 0.0, np.fabs(neu_count / total))
+        compound = np.where(empty, 0.0, compound)
+        # np.round rounds binary values differently from the builtin round used by polarity_scores
+        return [{'neg': round(ng, 3), 'neu': round(nu, 3), 'pos': round(ps, 3), 'compound': round(cp, 4)}
+                for ng, nu, ps, cp in zip(neg.tolist(), neu.tolist(), pos.tolist(), compound.tolist())]
@@ -25,6 +25,11 @@ setuptools.setup(
         "tqdm~=4.62.3",
         "tweepy~=4.9.0",
     ],
+    extras_require={
+        "parquet": ["pyarrow>=7.0"],
+        "fast": ["numpy>=1.20"],
+        "zstd": ["zstandard>=0.15"],
+    },
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
@@ -1,8 +1,32 @@
 # TODO: add more tests
+import asyncio
+import datetime
+import json
+import math
+import threading
+
 import pytest
+import snscrape.modules.twitter as sntwitter
 
+from bsi_sentiment.analyzers import get_analyzer
 from bsi_sentiment.twitter import *
 
+TEXTS = ["I love this wonderful day!",
+         "This is the worst service ever, terrible.",
+         "RT @someone the meeting is at 5pm https://t.co/xyz #update",
+         "Not bad at all, quite good actually :)"]
+
+
+def make_sn_tweet(i, text, date=datetime.datetime(2020, 11, 1, 12, tzinfo=datetime.timezone.utc)):
+    return sntwitter.Tweet(url=f"https://twitter.com/user{i}/status/{i}", date=date, content=text,
+                           renderedContent=text, id=i, user=sntwitter.User(username=f"user{i}", id=i),
+                           replyCount=0, retweetCount=0, likeCount=0, quoteCount=0, conversationId=i,
+                           lang="en", source=None)
+
+
+def make_tweets(n=len(TEXTS)):
+    return [make_sn_tweet(n - k, TEXTS[k % len(TEXTS)]) for k in range(n)]
+
 
 class TestSerchTweetsSn:
     def test_correct_query(self):
@@ -23,3 +47,773 @@ class TestSerchTweetsSn:
         assert hasattr(t, "username")
         assert hasattr(t, "text")
         assert hasattr(t, "date")
+
+
+class TestGetSentiment:
+    def test_shared_analyzer(self):
+        assert get_analyzer("textblob-pa") is get_analyzer("textblob-pa")
+        with pytest.raises(ValueError):
+            get_analyzer("unknown")
+
+    def test_textblob_pa(self):
+        tweets = NLPTweetList(make_tweets(), quiet=True)
+        tweets.get_sentiment(method="textblob-pa", quiet=True)
+        assert tweets[0].polarity > 0
+        assert tweets[1].polarity < 0
+        assert all(0.0 <= t.subjectivity <= 1.0 for t in tweets)
+
+    def test_parallel_matches_serial(self):
+        serial = NLPTweetList(make_tweets(50), quiet=True)
+        serial.get_sentiment(method="textblob-pa", quiet=True)
+        parallel = NLPTweetList(make_tweets(50), quiet=True)
+        parallel.get_sentiment(method="textblob-pa", quiet=True, workers=2, chunksize=7)
+        assert [t.to_dict() for t in parallel] == [t.to_dict() for t in serial]
+
+    def test_multiple_methods(self, tmp_path):
+        from bsi_sentiment.cache import SentimentCache
+        singles = {}
+        for method in ("vader", "textblob-pa"):
+            tweets = NLPTweetList(make_tweets(), quiet=True)
+            tweets.get_sentiment(method=method, quiet=True)
+            singles[method] = tweets
+        with SentimentCache(tmp_path) as cache:
+            for _ in range(2):
+                combined = NLPTweetList(make_tweets(), quiet=True)
+                combined.get_sentiment(method=["vader", "textblob-pa"], quiet=True, cache=cache)
+            assert cache.stats()['hits'] == len(TEXTS)
+        assert combined[0].keys()[-6:] == ['vader_polarity', 'vader_pos_w', 'vader_neu_w', 'vader_neg_w',
+                                          'textblob_pa_polarity', 'textblob_pa_subjectivity']
+        for tweet, vader, pattern in zip(combined, singles["vader"], singles["textblob-pa"]):
+            assert tweet.vader_polarity == vader.polarity and tweet.vader_neg_w == vader.neg_w
+            assert tweet.textblob_pa_polarity == pattern.polarity
+            assert "polarity" not in tweet
+
+
+class TestBatchVader:
+    def test_matches_polarity_scores(self):
+        import random
+        pytest.importorskip("numpy")
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+        from bsi_sentiment.vader import BatchVader
+        reference = SentimentIntensityAnalyzer()
+        rng = random.Random(0)
+        phrases = list(VaderConstants.BOOSTER_DICT) + list(VaderConstants.SPECIAL_CASE_IDIOMS)
+        words = rng.sample(sorted(reference.lexicon), 300) + sorted(VaderConstants.NEGATE)
+        words += [w for phrase in phrases for w in phrase.split()]
+        words += ["but", "least", "at", "very", "never", "so", "this", "the", "cat", ":)", "<3", "I"]
+
+        def word():
+            w = rng.choice(words)
+            w = w.upper() if rng.random() < 0.15 else w
+            return w + rng.choice(["", "", "", "!", "?", ",", "'", "!!", "?!?", "..."])
+
+        texts = TEXTS + ["", "a !", "GOOD day but BAD night!!", "the least good", "at least good", "kind of good",
+                         "never so good", "good good bad", "yeah right, great", "cut the mustard ok"]
+        texts += [" ".join(word() for _ in range(rng.randint(0, 40))) + rng.choice(["", "!!!!!", "???"])
+                  for _ in range(2000)]
+        batch = BatchVader(reference, chunk_size=300)
+        assert batch.polarity_scores(texts) == [reference.polarity_scores(text) for text in texts]
+
+
+class TestNormalizer:
+    def test_default_matches_clean_text(self):
+        import re
+        from bsi_sentiment.preprocess import TextNormalizer
+        texts = TEXTS + ["RT  @a_b: #Good news http://x.y/z ok", "#", "@", "RTRT x"]
+        for text in texts:
+            assert TextNormalizer()(text) == re.sub(r'(#)|(^RT[\s]+)|(https?:\S+)|(@[A-Za-z0-9_]+)', '', text)
+
+    def test_extra_rules(self):
+        from bsi_sentiment.preprocess import TextNormalizer
+        text = "RT @someone so  happy \U0001F600 see https://t.co/xyz #win"
+        assert TextNormalizer(emoji="remove", fold_whitespace=True)(text) == "so happy see win"
+        assert TextNormalizer(url_token="URL", emoji="name", fold_whitespace=True)(text) == \
+            "so happy grinning face see URL win"
+
+    def test_normalized_once(self, monkeypatch):
+        from bsi_sentiment.preprocess import TextNormalizer
+        tweets = NLPTweetList(make_tweets(), quiet=True)
+        tweets.normalize(TextNormalizer(url_token="URL"))
+        assert tweets[2].normalized.strip() == "the meeting is at 5pm URL update"
+        assert "normalized" not in tweets[2].keys()
+        calls = []
+        monkeypatch.setattr(TextNormalizer, "__call__", lambda self, text: calls.append(text))
+        tweets.get_sentiment(method=["vader", "textblob-pa"], quiet=True)
+        assert calls == []
+
+
+SPAM = "Huge giveaway today only, retweet and follow to win a brand new phone, hurry up and join now"
+
+
+class TestDedup:
+    def make_tweets(self):
+        texts = [SPAM, "I love this wonderful day!", "RT @bot1 " + SPAM + " #win", SPAM + " please",
+                 "I love this wonderful day!", "This is the worst service ever, terrible."]
+        return [NLPTweet(make_sn_tweet(len(texts) - i, text)) for i, text in enumerate(texts)]
+
+    def test_similarity(self):
+        from bsi_sentiment.dedup import similarity, sketch
+        assert similarity(sketch(SPAM), sketch(SPAM)) == 1
+        assert similarity(sketch(SPAM), sketch(SPAM.upper() + " please")) > 0.8
+        assert similarity(sketch(SPAM), sketch(TEXTS[1] + " " + TEXTS[3])) == 0
+
+    def test_exact(self, monkeypatch):
+        from bsi_sentiment.dedup import Deduplicator
+        expected = NLPTweetList(self.make_tweets(), quiet=True)
+        expected.get_sentiment(quiet=True)
+        analyzer = get_analyzer("vader")
+        scored = []
+        score_batch = analyzer.score_batch
+        monkeypatch.setattr(analyzer, "score_batch", lambda texts: scored.extend(texts) or score_batch(texts))
+        tweets = NLPTweetList(self.make_tweets(), quiet=True)
+        tweets.get_sentiment(quiet=True, dedup=Deduplicator())
+        assert len(scored) == 5
+        assert [t.dup_group for t in tweets] == [6, 5, 4, 3, 5, 1]
+        assert [t.polarity for t in tweets] == [t.polarity for t in expected]
+
+    def test_near_across_batches(self):
+        from bsi_sentiment.dedup import Deduplicator
+        from bsi_sentiment.pipeline import stream_sentiment
+        dedup = Deduplicator(near=True)
+        batches = list(stream_sentiment(self.make_tweets(), batch_size=2, quiet=True, dedup=dedup))
+        tweets = [tweet for batch in batches for tweet in batch]
+        assert [t.dup_group for t in tweets] == [6, 5, 6, 6, 5, 1]
+        assert tweets[2].polarity == tweets[3].polarity == tweets[0].polarity
+        assert dedup.stats() == {"tweets": 6, "groups": 3, "duplicate_rate": 0.5}
+
+    def test_without_ids(self):
+        from bsi_sentiment.dedup import Deduplicator
+        tweets = NLPTweetList([NLPTweet.from_dict({"text": tweet.text}) for tweet in self.make_tweets()], quiet=True)
+        tweets.get_sentiment(quiet=True, dedup=Deduplicator())
+        assert [t.dup_group for t in tweets] == [1, 2, 3, 4, 2, 5]
+
+    def test_bounded_memory(self):
+        from bsi_sentiment.dedup import Deduplicator
+        dedup = Deduplicator(near=True, max_groups=2)
+        tweets = NLPTweetList(self.make_tweets() * 3, quiet=True)
+        tweets.get_sentiment(quiet=True, dedup=dedup)
+        assert len(dedup._exact) <= 2 and len(dedup._groups) <= 2
+        assert {group for candidates in dedup._index.values() for _, group in candidates} <= set(dedup._groups)
+
+
+class TestNaiveBayes:
+    def test_matches_nltk(self, tmp_path):
+        import random
+        from nltk.classify import NaiveBayesClassifier
+        from bsi_sentiment.nb import NaiveBayesModel, train_model
+        rng = random.Random(0)
+        words = {"pos": ["good", "great", "love", "fun", "the", "movie"], "neg": ["bad", "awful", "hate", "dull", "the", "movie"]}
+        documents = [(rng.sample(words[label], 3) + ["plot"], label) for label in ("neg", "pos") for _ in range(20)]
+        expected = NaiveBayesClassifier.train([({word: True for word in doc}, label) for doc, label in documents])
+        model = NaiveBayesModel(train_model(documents, tmp_path / "nb.model"))
+        texts = [["good", "movie"], ["awful", "plot", "fun"], ["unknown"], [], ["hate", "hate", "love", "bad"]]
+        for batch in (model.prob_classify_batch(texts), [model.prob_classify_batch([text])[0] for text in texts]):
+            for text, (classification, probs) in zip(texts, batch):
+                dist = expected.prob_classify({word: True for word in text})
+                assert classification == dist.max()
+                assert math.isclose(probs["pos"], dist.prob("pos"), rel_tol=1e-9)
+                assert math.isclose(probs["neg"], dist.prob("neg"), rel_tol=1e-9)
+        batch = model.prob_classify_batch(texts)
+        model._matrix = None  # numpy is not installed
+        for (classification, probs), (expected_classification, expected_probs) in zip(model.prob_classify_batch(texts), batch):
+            assert classification == expected_classification
+            assert probs == pytest.approx(expected_probs, rel=1e-12)
+
+
+class TestAggregate:
+    def test_running_stats(self):
+        import random
+        import statistics
+        from bsi_sentiment.aggregate import RunningStats
+        rng = random.Random(0)
+        values = [max(-1.0, min(1.0, rng.gauss(0.2, 0.4))) for _ in range(5000)]
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        assert stats.count == 5000 and stats.min == min(values) and stats.max == max(values)
+        assert math.isclose(stats.mean, statistics.mean(values), abs_tol=1e-12)
+        assert math.isclose(stats.variance, statistics.variance(values), rel_tol=1e-9)
+        for q, exact in zip((0.25, 0.5, 0.75), statistics.quantiles(values, n=4)):
+            assert abs(stats.quantile(q) - exact) <= 0.01
+
+    def test_value_range(self):
+        from bsi_sentiment.aggregate import Aggregator, RunningStats
+        stats = RunningStats()
+        for value in (10, 20, 30, 40, 50):
+            stats.add(value)
+        assert stats.n_outside == 5 and stats.quantile(0.5) is None and (stats.min, stats.max, stats.mean) == (10, 50, 30)
+        stats = RunningStats(value_range=(0, 100))
+        for value in (10, 20, 30, 40, 50):
+            stats.add(value)
+        assert abs(stats.quantile(0.5) - 30) <= 0.5
+        with pytest.raises(ValueError, match="value_range"):
+            Aggregator(value_range=(1, -1))
+
+    def test_groups(self, tmp_path):
+        from bsi_sentiment.aggregate import aggregate_file
+        tweets = NLPTweetList([make_sn_tweet(i, text, date=datetime.datetime(2020, 11, 1, 10 + i // 2, 30, tzinfo=datetime.timezone.utc))
+                               for i, text in enumerate(["#A good", "#a #b ok", "#B bad", "none"])], quiet=True)
+        for tweet, polarity in zip(tweets, [0.5, 0.1, -0.5, None]):
+            tweet.polarity = polarity
+        rows = list(tweets.aggregate(by="hour").results())
+        assert [(r["hour"], r["count"], r["mean"]) for r in rows] == [("2020-11-01 10:00", 2, 0.3), ("2020-11-01 11:00", 1, -0.5)]
+        assert rows[0]["std"] == pytest.approx(math.sqrt(0.08)) and rows[1]["std"] is None
+        hashtags = tweets.aggregate(by="hashtag", quantiles=[0.5])
+        assert [(r["hashtag"], r["count"], r["mean"]) for r in hashtags.results()] == [("a", 2, pytest.approx(0.3)), ("b", 2, pytest.approx(-0.2))]
+        assert hashtags.n_skipped == 1
+
+        tweets.to_csv(tmp_path / "tweets.csv", quiet=True)
+        from_file = aggregate_file(tmp_path / "tweets.csv", by="hashtag", quantiles=[0.5], quiet=True)
+        assert list(from_file.results()) == list(hashtags.results())
+
+
+class TestPipeline:
+    def test_batched(self):
+        from bsi_sentiment.pipeline import batched
+        assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+    def test_stream_matches_list(self, tmp_path):
+        from bsi_sentiment.pipeline import stream_sentiment, stream_to_csv
+        expected = NLPTweetList(make_tweets(10), quiet=True)
+        expected.get_sentiment(method="textblob-pa", quiet=True)
+        expected.to_csv(tmp_path / "list.csv", quiet=True)
+        batches = stream_sentiment(map(NLPTweet, make_tweets(10)), method="textblob-pa", batch_size=3, quiet=True)
+        assert stream_to_csv(batches, tmp_path / "stream.csv", quiet=True) == 10
+        assert (tmp_path / "stream.csv").read_text() == (tmp_path / "list.csv").read_text()
+
+    def test_read_csv(self, tmp_path):
+        from bsi_sentiment.pipeline import iter_csv
+        tweets = NLPTweetList(make_tweets(5), quiet=True)
+        tweets.get_sentiment(method=["vader", "textblob-pa"], quiet=True)
+        tweets.to_csv(tmp_path / "tweets.csv", quiet=True)
+        read = NLPTweetList.from_csv(tmp_path / "tweets.csv")
+        assert isinstance(read, NLPTweetList) and [t.to_dict() for t in read] == [t.to_dict() for t in tweets]
+        batches = list(iter_csv(tmp_path / "tweets.csv", columns=["id", "text"], batch_size=2))
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert batches[0][0].keys() == ["id", "text"] and batches[0][0].id == 5
+        with pytest.raises(ValueError, match="no column"):
+            next(iter_csv(tmp_path / "tweets.csv", columns=["id", "likes"]))
+        read = NLPTweetList.from_csv(tmp_path / "tweets.csv", columns=["id", "text"])
+        read.get_sentiment(method="textblob-pa", quiet=True)
+        assert read.column("polarity") == tweets.column("textblob_pa_polarity")
+
+    def test_analyze_file(self, tmp_path):
+        from bsi_sentiment.bsi_sentiment import run_command
+        from bsi_sentiment.parser import parser
+        from bsi_sentiment.pipeline import analyze_file
+        tweets = NLPTweetList(make_tweets(7), quiet=True)
+        tweets.to_csv(tmp_path / "raw.csv", quiet=True)
+        assert analyze_file(tmp_path / "raw.csv", tmp_path / "vader.csv", batch_size=3, workers=2, quiet=True) == 7
+        tweets.get_sentiment(quiet=True)
+        assert NLPTweetList.from_csv(tmp_path / "vader.csv").tweets[0].to_dict() == \
+            {col: tweets[0][col] for col in ("id", "polarity", "pos_w", "neu_w", "neg_w")}
+        run_command(parser.parse_args(["analyze", str(tmp_path / "pa.csv"), "--input", str(tmp_path / "raw.csv"),
+                                       "-a", "textblob-pa", "--dedup", "exact", "--quiet"]))
+        assert (tmp_path / "pa.csv").read_text().split("\n")[0] == "id,polarity,subjectivity,dup_group"
+        with pytest.raises(ValueError, match="--input cannot be used"):
+            run_command(parser.parse_args(["download", str(tmp_path / "out.csv"), "--input", str(tmp_path / "raw.csv")]))
+
+
+class FakeScraper:
+    """
+    Stand-in for sntwitter.TwitterSearchScraper returning tweets from make_tweets, failing after 'fail_after' tweets.
+    """
+    def __init__(self, n=20, fail_after=None):
+        self.n = n
+        self.fail_after = fail_after
+        self.criteria = []
+
+    def __call__(self, criteria):
+        self.criteria.append(criteria)
+        return self
+
+    def get_items(self):
+        for i, tweet in enumerate(make_tweets(self.n)):
+            if i == self.fail_after:
+                raise ConnectionError("scraper died")
+            yield tweet
+
+
+class TestCheckpoint:
+    def test_resume(self, tmp_path):
+        from bsi_sentiment.checkpoint import Checkpoint
+        from bsi_sentiment.pipeline import batched, stream_to_csv
+        args = {"q": "test", "since": "2020-11-01", "until": "2020-11-02"}
+        stream_to_csv(batched(iter_tweets_sn(**args, scraper=FakeScraper()), 3), tmp_path / "full.csv", quiet=True)
+
+        dest = tmp_path / "resumed.csv"
+        checkpoint = Checkpoint(tmp_path / "state.json")
+        tweets = iter_tweets_sn(**args, scraper=FakeScraper(fail_after=7), checkpoint=checkpoint)
+        with pytest.raises(ConnectionError):
+            stream_to_csv(batched(tweets, 3), dest, quiet=True, checkpoint=checkpoint)
+        checkpoint = Checkpoint(tmp_path / "state.json")
+        scraper = FakeScraper()
+        n_tweets = stream_to_csv(batched(iter_tweets_sn(**args, scraper=scraper, checkpoint=checkpoint), 3), dest,
+                                 quiet=True, checkpoint=checkpoint)
+        assert n_tweets == 14
+        assert scraper.criteria[0].endswith(" max_id:14")
+        assert checkpoint.done and checkpoint.n_tweets == 20
+        assert dest.read_text() == (tmp_path / "full.csv").read_text()
+
+    def test_resume_on_later_day(self, tmp_path, monkeypatch):
+        from bsi_sentiment.checkpoint import Checkpoint
+        from bsi_sentiment.pipeline import batched, stream_to_csv
+
+        def download(today, scraper, q="test"):
+            class Today(datetime.date):
+                @classmethod
+                def today(cls):
+                    return today
+            monkeypatch.setattr(datetime, "date", Today)
+            checkpoint = Checkpoint(tmp_path / "state.json")
+            tweets = iter_tweets_sn(q, scraper=scraper, checkpoint=checkpoint)
+            return stream_to_csv(batched(tweets, 3), tmp_path / "out.csv", quiet=True, checkpoint=checkpoint)
+
+        with pytest.raises(ConnectionError):
+            download(datetime.date(2020, 11, 2), FakeScraper(fail_after=7))
+        scraper = FakeScraper()
+        assert download(datetime.date(2020, 11, 5), scraper) == 14
+        assert scraper.criteria[0].startswith("test since:2020-10-26 until:2020-11-02 ")
+        with pytest.raises(FileExistsError, match="no state for this search"):
+            download(datetime.date(2020, 11, 5), FakeScraper(), q="other")
+        assert len((tmp_path / "out.csv").read_text().splitlines()) == 21
+
+
+class TestIncremental:
+    def test_polls(self, tmp_path):
+        import csv
+        from bsi_sentiment.index import TweetIndex
+        from bsi_sentiment.pipeline import batched, stream_to_csv
+        args = {"q": "test", "since": "2020-10-01", "until": "2020-11-02"}
+        dest = tmp_path / "out.csv"
+
+        def poll(scraper, batch_size=3):
+            with TweetIndex(tmp_path / "index.sqlite") as index:
+                tweets = iter_tweets_sn(**args, scraper=scraper, index=index)
+                return stream_to_csv(batched(tweets, batch_size), dest, quiet=True, append=True, index=index)
+
+        assert poll(FakeScraper(n=10)) == 10
+        scraper = FakeScraper(n=15)
+        assert poll(scraper) == 5
+        assert "since:2020-11-01" in scraper.criteria[0] and scraper.criteria[0].endswith(" since_id:10")
+        with pytest.raises(ConnectionError):
+            poll(FakeScraper(n=20, fail_after=2), batch_size=1)
+        assert poll(FakeScraper(n=20)) == 3
+        with open(dest, newline='') as f:
+            ids = [int(row['id']) for row in csv.DictReader(f)]
+        assert sorted(ids) == list(range(1, 21))
+
+
+class DateRangeScraper:
+    """
+    Stand-in for sntwitter.TwitterSearchScraper returning 3 tweets per day of the since/until range of its criteria.
+    """
+    def __init__(self, criteria):
+        fields = dict(token.split(":", 1) for token in criteria.split() if ":" in token)
+        self.since = datetime.datetime.strptime(fields["since"], "%Y-%m-%d")
+        self.until = datetime.datetime.strptime(fields["until"], "%Y-%m-%d")
+
+    def get_items(self):
+        day = self.until
+        while day > self.since:
+            day -= datetime.timedelta(days=1)
+            for k in range(3, 0, -1):
+                yield make_sn_tweet(day.toordinal() * 10 + k, TEXTS[k], day.replace(tzinfo=datetime.timezone.utc))
+
+
+class TestSharding:
+    args = {"q": "test", "since": "2020-10-01", "until": "2020-11-01", "scraper": DateRangeScraper}
+
+    def test_date_shards(self):
+        assert date_shards("2020-10-01", "2020-10-16", 7) == [
+            ("2020-10-09", "2020-10-16"), ("2020-10-02", "2020-10-09"), ("2020-10-01", "2020-10-02")]
+
+    def test_ordered_matches_unsharded(self):
+        expected = [t.id for t in iter_tweets_sn(**self.args)]
+        assert len(expected) == 93
+        assert [t.id for t in iter_tweets_sn(**self.args, shard_days=7, shard_workers=3)] == expected
+        assert [t.id for t in iter_tweets_sn(**self.args, max_tweets=10, shard_days=1)] == expected[:10]
+
+    def test_unordered(self):
+        ids = [t.id for t in iter_tweets_sn(**self.args, shard_days=2, shard_workers=8, ordered=False)]
+        assert sorted(ids, reverse=True) == [t.id for t in iter_tweets_sn(**self.args)]
+        assert len(list(iter_tweets_sn(**self.args, max_tweets=10, shard_days=2, ordered=False))) == 10
+
+
+class TestNLPTweet:
+    def test_slots(self):
+        tweet = NLPTweet(make_sn_tweet(1, TEXTS[0]))
+        assert not hasattr(tweet, "__dict__")
+        assert tweet.keys() == ["id", "permalink", "username", "text", "date", "time"]
+        assert tweet["username"] == "user1" and not hasattr(tweet, "to")
+        with pytest.raises(KeyError):
+            tweet["to"]
+        tweet.update({"polarity": 0.5, "custom_score": 3})
+        assert tweet.custom_score == 3 and tweet["custom_score"] == 3
+        assert NLPTweet.from_dict(tweet.to_dict()).to_dict() == tweet.to_dict()
+        assert "custom_score" in tweet and "to" not in tweet and tweet.get("to", "-") == "-"
+        assert "keys" not in tweet and "update" not in tweet and tweet.get("keys") is None
+        with pytest.raises(KeyError):
+            tweet["_extra"]
+
+    def test_column(self):
+        tweets = NLPTweetList(make_tweets(3), quiet=True)
+        tweets[1].polarity = 0.5
+        assert tweets.column("id") == [3, 2, 1]
+        assert list(tweets.column("id", "q")) == [3, 2, 1]
+        polarity = tweets.column("polarity", "d")
+        assert polarity[1] == 0.5 and math.isnan(polarity[0])
+
+
+class TestCSVWriter:
+    def test_format_rows(self):
+        import csv
+        import io
+        from bsi_sentiment.csvfile import format_rows
+        values = ["a,b", 'say "hi"', "line\nbreak", "", None, 0, 1.5, True, {"coordinates": [1, 2]}]
+        tweets = [NLPTweet.from_dict({"id": i, "text": value, "extra": value}) for i, value in enumerate(values)]
+        tweets.append(NLPTweet.from_dict({"id": len(values)}))
+        for columns, delimiter in ((["id", "text", "extra", "polarity"], ","), (["text"], ";")):
+            expected = io.StringIO()
+            csv.writer(expected, delimiter=delimiter).writerows([[t.get(col) for col in columns] for t in tweets])
+            assert format_rows(tweets, columns, delimiter) == expected.getvalue()
+
+    def test_mixed_backends(self, tmp_path):
+        tweets = NLPTweetList(make_tweets(2) + [make_status(1, TEXTS[0])], quiet=True)
+        assert tweets.columns == output_columns(["sn", "tweepy"])
+        tweets.get_sentiment(method=["vader", "textblob-pa"], quiet=True)
+        assert tweets.columns == output_columns(["sn", "tweepy"], method=["vader", "textblob-pa"])
+        tweets.to_csv(tmp_path / "tweets.csv", quiet=True)
+        read = NLPTweetList.from_csv(tmp_path / "tweets.csv")
+        assert read.columns == tweets.columns
+        assert [t.retweets for t in read] == [None, None, 0]
+        assert [t.vader_polarity for t in read] == [t.vader_polarity for t in tweets]
+
+    @pytest.mark.parametrize("suffix", [".csv.gz", ".csv.zst"])
+    def test_compressed_append(self, tmp_path, suffix):
+        from bsi_sentiment.pipeline import iter_csv, stream_to_csv
+        path = tmp_path / f"tweets{suffix}"
+        tweets = NLPTweetList(make_tweets(5), quiet=True)
+        tweets.to_csv(path, quiet=True)
+        assert stream_to_csv([tweets.tweets[:2]], path, append=True, quiet=True) == 2
+        read = [t.to_dict() for batch in iter_csv(path, batch_size=3) for t in batch]
+        assert read == [t.to_dict() for t in tweets.tweets + tweets.tweets[:2]]
+        with pytest.raises(ValueError, match="uncompressed"):
+            from bsi_sentiment.checkpoint import Checkpoint
+            stream_to_csv([tweets.tweets], path, checkpoint=Checkpoint(tmp_path / "state.json"), quiet=True)
+
+
+class TestParquet:
+    def test_roundtrip(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        tweets = NLPTweetList(make_tweets(10), quiet=True)
+        tweets.get_sentiment(method="textblob-pa", quiet=True)
+        tweets.to_parquet(tmp_path / "tweets.parquet", row_group_size=3, quiet=True)
+        read = NLPTweetList.from_parquet(tmp_path / "tweets.parquet")
+        assert isinstance(read, NLPTweetList)
+        assert [t.to_dict() for t in read] == [t.to_dict() for t in tweets]
+        assert isinstance(read[0].polarity, float)
+        assert NLPTweetList.from_parquet(tmp_path / "tweets.parquet", columns=["id", "polarity"])[0].keys() == ["id", "polarity"]
+
+    def test_mixed_backends(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        from bsi_sentiment.parquet import iter_parquet, stream_to_parquet
+        batches = [[NLPTweet(t) for t in make_tweets(3)], [NLPTweet(make_status(i, TEXTS[i])) for i in range(2)]]
+        batches[1][0].id = "a1"
+        path = tmp_path / "tweets.parquet"
+        assert stream_to_parquet(iter(batches), path, columns=output_columns(["sn", "tweepy"]), quiet=True) == 5
+        assert [t.id for batch in iter_parquet(path) for t in batch] == [3, 2, 1, "a1", 1]
+
+
+class TestSentimentCache:
+    def test_hits_and_eviction(self, tmp_path):
+        from bsi_sentiment.cache import SentimentCache
+        expected = NLPTweetList(make_tweets(8), quiet=True)
+        expected.get_sentiment(method="textblob-pa", quiet=True)
+        with SentimentCache(tmp_path, max_entries=3) as cache:
+            tweets = NLPTweetList(make_tweets(8), quiet=True)
+            tweets.get_sentiment(method="textblob-pa", quiet=True, cache=cache)
+            assert cache.stats()["hits"] == 0 and len(cache) == 3
+            tweets = NLPTweetList(make_tweets(8), quiet=True)
+            tweets.get_sentiment(method="textblob-pa", quiet=True, cache=cache)
+            assert [t.to_dict() for t in tweets] == [t.to_dict() for t in expected]
+            assert cache.hits == 6 and cache.misses == 10  # 4 distinct texts, 3 of which are still cached
+
+
+class TestPipelineStats:
+    def test_stages(self, tmp_path):
+        from bsi_sentiment.cache import SentimentCache
+        from bsi_sentiment.pipeline import stream_sentiment, stream_to_csv
+        from bsi_sentiment.stats import PipelineStats, timed
+        args = {"q": "test", "since": "2020-11-01", "until": "2020-11-02"}
+        tweets = make_tweets(3)
+        assert timed("scrape", tweets) is tweets
+        with SentimentCache(tmp_path) as cache, PipelineStats() as stats:
+            for _ in range(2):
+                batches = stream_sentiment(iter_tweets_sn(**args, scraper=FakeScraper()), batch_size=8, quiet=True, cache=cache)
+                stream_to_csv(batches, tmp_path / "out.csv", quiet=True)
+        report = stats.to_dict()
+        assert {name: stage["items"] for name, stage in report["stages"].items()} == \
+            {"scrape": 40, "construct": 40, "normalize": 40, "cache": 40, "analyze": 8, "write": 40}
+        assert report["stages"]["scrape"]["calls"] == 2 and report["stages"]["write"]["calls"] == 6
+        assert sum(stage["seconds"] for stage in report["stages"].values()) <= report["wall_seconds"]
+        # the 4 texts of the first batch are scored twice each, then found in the cache
+        assert report["counters"] == {"cache_hits": 32, "cache_misses": 8}
+        stats.to_json(tmp_path / "stats.json", command="analyze")
+        assert json.loads((tmp_path / "stats.json").read_text())["command"] == "analyze"
+
+
+class TestStartup:
+    # seconds; importing Snscrape, Tweepy and NLTK alone takes well over this
+    CONFIGURE_BUDGET = 0.5
+
+    def test_configure_imports(self, tmp_path):
+        import subprocess
+        import sys
+        script = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            f"sys.argv = ['sentiment', 'configure', {str(tmp_path / 'config.ini')!r}]\n"
+            "from bsi_sentiment.bsi_sentiment import main\n"
+            "main()\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(m for m in ('snscrape', 'tweepy', 'nltk', 'textblob', 'tqdm') if m in sys.modules))\n"
+        )
+        elapsed, heavy_modules = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True,
+                                                text=True).stdout.split("\n")[:2]
+        assert heavy_modules == ""
+        assert float(elapsed) < self.CONFIGURE_BUDGET
+        assert (tmp_path / "config.ini").is_file()
+
+
+def make_status(i, text):
+    import tweepy as tw
+    return tw.models.Status.parse(None, {
+        "id": i, "id_str": str(i), "full_text": text, "user": {"screen_name": f"user{i}"},
+        "in_reply_to_screen_name": None, "created_at": "Sun Nov 01 12:00:00 +0000 2020", "retweet_count": 0,
+        "favorite_count": 0, "entities": {"user_mentions": [], "hashtags": []}, "geo": None})
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.reason = "Too Many Requests" if status_code == 429 else "OK"
+        self.headers = headers
+
+    def json(self):
+        return {}
+
+
+class FakeAPI:
+    """
+    Stand-in for tweepy.API serving 'n' tweets, allowing 'budget' requests per 15 minutes window of 'clock'.
+    """
+    def __init__(self, clock, n=25, budget=2, headers=True):
+        self.clock = clock
+        self.n = n
+        self.budget = budget
+        self.headers = headers
+        self.calls = []
+
+    def _headers(self, window):
+        used = sum(1 for t in self.calls if t // 900 == window)
+        return {"x-rate-limit-remaining": str(self.budget - used), "x-rate-limit-reset": str((window + 1) * 900)}
+
+    def search_tweets(self, q, count=100, max_id=None, **kwargs):
+        import tweepy as tw
+        window = int(self.clock.now) // 900
+        if self._headers(window)["x-rate-limit-remaining"] == "0":
+            raise tw.TooManyRequests(FakeResponse(429, self._headers(window)))
+        self.calls.append(self.clock.now)
+        self.last_response = FakeResponse(200, self._headers(window) if self.headers else {})
+        first = self.n if max_id is None else min(max_id, self.n)
+        return [make_status(i, TEXTS[i % len(TEXTS)]) for i in range(first, max(first - count, 0), -1)]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimitScheduler:
+    def test_rotation_and_wait(self):
+        from bsi_sentiment.ratelimit import RateLimitScheduler
+        clock = FakeClock()
+        apis = [FakeAPI(clock), FakeAPI(clock)]
+        scheduler = RateLimitScheduler(apis, quiet=True, clock=clock, sleep=clock.sleep)
+        until = datetime.date.today().strftime("%Y-%m-%d")
+        tweets = list(iter_tweets_tweepy("test", until=until, max_tweets=23, quiet=True, scheduler=scheduler))
+        assert [t.id for t in tweets] == [str(i) for i in range(25, 2, -1)]
+        # each API serves 2 pages of 100 per window
+        apis = [FakeAPI(clock, n=1000), FakeAPI(clock, n=1000)]
+        scheduler = RateLimitScheduler(apis, quiet=True, clock=clock, sleep=clock.sleep)
+        assert len(list(iter_tweets_tweepy("test", until=until, max_tweets=500, quiet=True, scheduler=scheduler))) == 500
+        assert [len(api.calls) for api in apis] == [3, 2] or [len(api.calls) for api in apis] == [2, 3]
+        assert scheduler.n_rate_limited == 0 and 0 < scheduler.wait_time <= 901
+
+    def test_rate_limit_error(self):
+        from bsi_sentiment.ratelimit import RateLimitScheduler
+        clock = FakeClock()
+        api = FakeAPI(clock, n=1000, headers=False)
+        scheduler = RateLimitScheduler([api], quiet=True, clock=clock, sleep=clock.sleep)
+        until = datetime.date.today().strftime("%Y-%m-%d")
+        assert len(list(iter_tweets_tweepy("test", until=until, max_tweets=300, quiet=True, scheduler=scheduler))) == 300
+        assert scheduler.n_rate_limited == 1 and scheduler.wait_time == 901
+
+
+class TestBatch:
+    def test_read_batch_config(self, tmp_path):
+        from bsi_sentiment.utils import read_batch_config, read_queries
+        config = tmp_path / "config.ini"
+        config.write_text("[bsi-sentiment]\nmax_tweets = 5\nquiet = True\n\n"
+                          "[bsi-sentiment:acme]\nq = acme\n\n[bsi-sentiment:../globex]\nq = globex\nmax_tweets = 7\n")
+        searches = read_batch_config(config)
+        assert [(name, args['q'], args['max_tweets'], tweepy) for name, args, tweepy in searches] == \
+            [("acme", "acme", 5, False), ("globex", "globex", 7, False)]
+        queries = tmp_path / "queries.txt"
+        queries.write_text("acme corp\n\nacme corp\n#globex\n")
+        assert [(name, args['q']) for name, args in read_queries(queries, {'max_tweets': 5})] == \
+            [("acme_corp", "acme corp"), ("acme_corp_2", "acme corp"), ("globex", "#globex")]
+        queries.write_text("\n  \n")
+        with pytest.raises(ValueError, match="contains no query"):
+            read_queries(queries, {'max_tweets': 5})
+
+    def test_run_batch(self, tmp_path, monkeypatch):
+        import csv
+        import bsi_sentiment.twitter
+        from bsi_sentiment.batch import run_batch
+
+        def fake_search(q, max_tweets, quiet=False):
+            if q == "fail":
+                raise RuntimeError("boom")
+            return NLPTweetList(make_tweets(max_tweets), quiet=True)
+        monkeypatch.setattr(bsi_sentiment.twitter, "search_tweets_sn", fake_search)
+        searches = [("a", {'q': "a", 'max_tweets': 3}, False), ("b", {'q': "b", 'max_tweets': 5}, False)]
+
+        assert run_batch(searches, tmp_path / "all.csv", method="textblob-pa", quiet=True) == {"a": 3, "b": 5}
+        with open(tmp_path / "all.csv", newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert sorted(row['query'] for row in rows) == ["a"] * 3 + ["b"] * 5
+        assert all(row['polarity'] != '' for row in rows)
+
+        run_batch(searches, tmp_path / "out", quiet=True)
+        assert sorted(p.name for p in (tmp_path / "out").iterdir()) == ["a.csv", "b.csv"]
+
+        with pytest.raises(Exception, match="1 of 2 searches failed"):
+            run_batch(searches[:1] + [("c", {'q': "fail", 'max_tweets': 1}, False)], tmp_path / "out", quiet=True)
+
+
+class EndlessScraper:
+    """
+    Stand-in for sntwitter.TwitterSearchScraper returning tweets until it is closed.
+    """
+    def __init__(self):
+        self.n_scraped = 0
+        self.closed = threading.Event()
+
+    def __call__(self, criteria):
+        return self
+
+    def get_items(self):
+        try:
+            for i in range(10 ** 9, 0, -1):
+                self.n_scraped += 1
+                yield make_sn_tweet(i, "so happy")
+        finally:
+            self.closed.set()
+
+
+class TestAsync:
+    def test_concurrent_searches(self):
+        from bsi_sentiment.aio import asearch_tweets_sn
+        args = {"since": "2020-11-01", "until": "2020-11-02"}
+
+        async def collect(q, n):
+            return [tweet.id async for tweet in asearch_tweets_sn(q, buffer_size=2, scraper=FakeScraper(n), **args)]
+
+        async def main():
+            return await asyncio.gather(collect("a", 20), collect("b", 5))
+
+        expected = [tweet.id for tweet in iter_tweets_sn("a", scraper=FakeScraper(20), **args)]
+        assert asyncio.run(main()) == [expected, expected[-5:]]
+
+    def test_backpressure_and_cancellation(self):
+        from bsi_sentiment.aio import asearch_tweets_sn
+        scraper = EndlessScraper()
+
+        async def main():
+            tweets = asearch_tweets_sn("test", buffer_size=5, scraper=scraper)
+            assert (await tweets.__anext__()).text == "so happy"
+            await asyncio.sleep(0.2)
+            n_scraped = scraper.n_scraped
+            await tweets.aclose()
+            return n_scraped
+
+        # one tweet consumed, 5 waiting in the queue and one waiting to be put
+        assert asyncio.run(main()) <= 7
+        assert scraper.closed.wait(timeout=5)
+
+    def test_errors(self):
+        from bsi_sentiment.aio import asearch_tweets_sn
+
+        async def main():
+            return [tweet async for tweet in asearch_tweets_sn("test", scraper=FakeScraper(fail_after=3))]
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(main())
+
+
+class TestReplay:
+    def test_sn_round_trip(self, tmp_path):
+        from bsi_sentiment.replay import Replay, write_fixture
+        args = {"since": "2020-11-01", "until": "2020-11-02"}
+        pages = tmp_path / "pages.jsonl.gz"
+        assert write_fixture(pages, make_tweets(25), "sn", sn_criteria("test", **args), page_size=10) == 3
+        replay = Replay(pages)
+        tweets = search_tweets_sn("test", scraper=replay.sn_scraper, quiet=True, **args)
+        expected = NLPTweetList(make_tweets(25), quiet=True)
+        assert [t.to_dict() for t in tweets] == [t.to_dict() for t in expected]
+        assert replay.n_requests == 3
+        with pytest.raises(LookupError):
+            list(iter_tweets_sn("other", scraper=replay.sn_scraper, **args))
+
+    def test_sn_rate_limit_errors(self, tmp_path):
+        import snscrape.base
+        from bsi_sentiment.replay import Replay, write_fixture
+        args = {"since": "2020-11-01", "until": "2020-11-02"}
+        pages = tmp_path / "pages.jsonl.gz"
+        write_fixture(pages, make_tweets(25), "sn", sn_criteria("test", **args), page_size=10, seconds=2.0)
+        clock = FakeClock()
+        replay = Replay(pages, speed=4, latency=0.1, error_rate=0.3, seed=1, clock=clock, sleep=clock.sleep)
+        assert len(list(iter_tweets_sn("test", scraper=replay.sn_scraper, **args))) == 25
+        assert replay.n_rate_limited > 0
+        # 3 pages of 0.5 seconds, plus the latency and backoff of each request
+        assert clock.now >= 3 * 0.5 + 0.1 * replay.n_requests
+        replay = Replay(pages, error_rate=1, clock=clock, sleep=clock.sleep)
+        with pytest.raises(snscrape.base.ScraperException):
+            list(iter_tweets_sn("test", scraper=replay.sn_scraper, **args))
+
+    def test_tweepy_record_and_replay(self, tmp_path):
+        from bsi_sentiment.ratelimit import RateLimitScheduler
+        from bsi_sentiment.replay import Recorder, Replay
+        until = datetime.date.today().strftime("%Y-%m-%d")
+        clock = FakeClock()
+        pages = tmp_path / "pages.jsonl.gz"
+        with Recorder(pages) as recorder:
+            scheduler = RateLimitScheduler([recorder.tweepy_api(FakeAPI(clock, n=250, budget=10))], quiet=True,
+                                           clock=clock, sleep=clock.sleep)
+            recorded = search_tweets_tweepy("test", until=until, max_tweets=1000, quiet=True, scheduler=scheduler)
+        assert recorder.n_pages == 4
+
+        # 2 requests per window, as enforced by the scheduler from the headers of the replayed responses
+        replay = Replay(pages, rate_limit=2, clock=clock, sleep=clock.sleep)
+        scheduler = RateLimitScheduler([replay.tweepy_api()], quiet=True, clock=clock, sleep=clock.sleep)
+        tweets = search_tweets_tweepy("test", until=until, max_tweets=1000, quiet=True, scheduler=scheduler)
+        assert [t.to_dict() for t in tweets] == [t.to_dict() for t in recorded]
+        assert replay.n_requests == 4 and replay.n_rate_limited == 0 and scheduler.wait_time > 900